@@ -71,57 +71,79 @@ def get_sentence_table_length(prefixes, pc):
         reduction(result)
 
 
-def get_hyperedge_table_length(prefixes, pc):
+def get_hyperedge_table_length(prefixes, pc, snapshot=None):
     """
     Compares the number of entries in the tables.
     :param prefixes: (list) List of prefixes for table names to compare.
+    :param snapshot: (Snapshot) If specified, the tables are read from the snapshot instead of Postgres.
     :return: None. Prints output
     """
     result = []
     for i, prefix in enumerate(prefixes):
-        with pc as open_pc:
-            table = prefix+"hyperedges"
-            open_pc.cursor.execute("SELECT COUNT(*) FROM {}".format(table))
-            result.append(open_pc.cursor.fetchall()[0][0])
-            print("Number of hyperedge occurrences in {}: {}".format(table, result[i]))
+        table = prefix+"hyperedges"
+        if snapshot is not None:
+            result.append(len(snapshot.column(table, "edge_id")))
+        else:
+            with pc as open_pc:
+                open_pc.cursor.execute("SELECT COUNT(*) FROM {}".format(table))
+                result.append(open_pc.cursor.fetchall()[0][0])
+        print("Number of hyperedge occurrences in {}: {}".format(table, result[i]))
 
     if len(result) == 2:
         reduction(result)
 
 
-def analyze_edge_size(prefixes, pc):
+def count_values(column):
+    """
+    Same as SELECT COUNT(*) ... GROUP BY on a snapshot column.
+    :param column: (np.array) Integer values of the column.
+    :return: (np.array) Number of occurrences of every value that occurs at least once.
+    """
+    counts = np.bincount(column)
+    return counts[counts > 0]
+
+
+def analyze_edge_size(prefixes, pc, snapshot=None):
     """
     Compares the number of entries per edge in the tables.
     :param prefixes: (list) List of prefixes for table names to compare.
+    :param snapshot: (Snapshot) If specified, the tables are read from the snapshot instead of Postgres.
     :return: None. Prints output
     """
     result = []
     print("Edge size analysis")
     for i, prefix in enumerate(prefixes):
-        with pc as open_pc:
-            table = prefix+"hyperedges"
-            open_pc.cursor.execute("SELECT COUNT(*) as c FROM {} GROUP BY edge_id".format(table))
+        table = prefix+"hyperedges"
+        if snapshot is not None:
+            result.append(count_values(snapshot.column(table, "edge_id")))
+        else:
+            with pc as open_pc:
+                open_pc.cursor.execute("SELECT COUNT(*) as c FROM {} GROUP BY edge_id".format(table))
 
-            result.append([el[0] for el in open_pc.cursor.fetchall()])
+                result.append([el[0] for el in open_pc.cursor.fetchall()])
 
         print("Results for {}".format(table))
         print_result(result[i])
 
 
-def analyze_term_frequency(prefixes, pc):
+def analyze_term_frequency(prefixes, pc, snapshot=None):
     """
     Compares the number of entries per edge in the tables.
     :param prefixes: (list) List of prefixes for table names to compare.
+    :param snapshot: (Snapshot) If specified, the tables are read from the snapshot instead of Postgres.
     :return: None. Prints output.
     """
     result = []
     print("Term frequency analysis (in edges)")
     for i, prefix in enumerate(prefixes):
-        with pc as open_pc:
-            table = prefix+"hyperedges"
-            open_pc.cursor.execute("SELECT COUNT(*) as c FROM {} GROUP BY term_id".format(table))
-
-            result.append([el[0] for el in open_pc.cursor.fetchall()])
+        table = prefix+"hyperedges"
+        if snapshot is not None:
+            result.append(count_values(snapshot.column(table, "term_id")))
+        else:
+            with pc as open_pc:
+                open_pc.cursor.execute("SELECT COUNT(*) as c FROM {} GROUP BY term_id".format(table))
+
+                result.append([el[0] for el in open_pc.cursor.fetchall()])
 
         print("Results for {}".format(table))
         print_result(result[i])
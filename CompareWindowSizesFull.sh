@@ -1,8 +1,4 @@
 #!/bin/bash
 
-
-for window in 0 1 2 5;
-do
-    python3 GenerateNewSchema.py --window-size $window --entities-only false --prefix full
-done;
-
+# generates the tables for all window sizes in a single pass over the term occurrences.
+python3 GenerateNewSchema.py --window-sizes 0 1 2 5 --entities-only false --prefix full
@@ -0,0 +1,222 @@
+"""
+Library interface for term co-occurrence queries across the different storage models.
+Supposed goals:
+- Single implementation of the co-occurrence queries (see Queries.md), instead of string templates in every script.
+- Terms and window sizes are passed as query parameters, so no text is ever spliced into the SQL.
+- Every query is prepared once per connection (PREPARE/EXECUTE), so the plan is not re-parsed for every call.
+- Automatically picks the best available table for a model, e.g. an entity-only hyperedge table if only entities
+  are requested, or the aggregated co-occurrence matrix instead of the dyadic table.
+"""
+
+import logging
+import os
+
+from PostgresConnector import PostgresConnector
+from utils import set_up_logger
+
+MODELS = ("implicit", "explicit", "dyadic")
+# order in which the models are tried for model="auto", fastest first.
+AUTO_ORDER = ("dyadic", "explicit", "implicit")
+
+QUERIES = {
+    "implicit": """
+        WITH s AS (SELECT term_id FROM terms
+                   WHERE term_text = $1),
+             q AS (SELECT toc.document_id,
+                          toc.sentence_id - $2 AS start,
+                          toc.sentence_id + $2 AS end
+                   FROM {table} toc
+                   WHERE toc.term_id = (SELECT s.term_id FROM s))
+        SELECT term_text, counts.freq FROM terms t,
+               (SELECT term_id, COUNT(*) AS freq
+                FROM {table} toc, q
+                WHERE toc.document_id = q.document_id
+                  AND toc.sentence_id BETWEEN q.start AND q.end
+                GROUP BY toc.term_id) AS counts
+        WHERE counts.term_id = t.term_id
+          AND counts.term_id != (SELECT term_id FROM s) {entity_filter}
+        ORDER BY counts.freq DESC, term_text""",
+    "explicit": """
+        WITH s AS (SELECT term_id FROM terms
+                   WHERE term_text = $1),
+             q AS (SELECT edge_id FROM {table} eh
+                   WHERE eh.term_id = (SELECT s.term_id FROM s))
+        SELECT term_text, counts.freq FROM terms t,
+              (SELECT term_id, COUNT(*) AS freq
+               FROM {table} eh
+               WHERE eh.edge_id = ANY(ARRAY(SELECT * FROM q))
+               GROUP BY term_id) AS counts
+        WHERE counts.term_id = t.term_id
+          AND counts.term_id != (SELECT term_id FROM s) {entity_filter}
+        ORDER BY counts.freq DESC, term_text""",
+    "dyadic": """
+        WITH s AS (SELECT term_id FROM terms
+                   WHERE term_text = $1),
+             q AS (SELECT ed.target_id FROM {table} ed
+                   WHERE ed.source_id = (SELECT s.term_id FROM s))
+        SELECT t.term_text, counts.freq FROM terms t,
+              (SELECT target_id, COUNT(*) AS freq FROM q
+               GROUP BY target_id) AS counts
+        WHERE counts.target_id = t.term_id
+          AND counts.target_id != (SELECT term_id FROM s) {entity_filter}
+        ORDER BY counts.freq DESC, term_text""",
+    # aggregated dyadic model, see SchemaCreator.create_cooccurrence_matrix().
+    "matrix": """
+        SELECT t.term_text, c.weight AS freq FROM {table} c, terms t
+        WHERE c.source_id = (SELECT term_id FROM terms WHERE term_text = $1)
+          AND c.target_id = t.term_id {entity_filter}
+        ORDER BY freq DESC, term_text"""
+}
+
+# names of the prepared statements per server connection, identified by the connection and its backend process.
+# Shared by all instances, since pooled connections (and their prepared statements) are handed to any connector.
+PREPARED = {}
+
+
+class Cooccurrence:
+    def __init__(self,
+                 pc=None,
+                 term_occurrence_table_name="term_occurrence",
+                 log_file=os.path.join(os.path.dirname(__file__), "logs/Cooccurrence.log"),
+                 log_level=logging.INFO,
+                 log_verbose=True):
+        """
+        Sets up the query interface.
+        :param pc: (PostgresConnector) Connector to the database. Defaults to the standard local container.
+        :param term_occurrence_table_name: (str) Name of the term occurrence table, used for the implicit model.
+        :param log_file: (os.path) Path to the file containing the logs.
+        :param log_level: (logging.LEVEL) Specifies the level to be logged.
+        :param log_verbose: (boolean) Specifies whether or not to look to stdout as well.
+        """
+        self.logger = set_up_logger(__name__, log_file, log_level, log_verbose)
+        self.pc = pc if pc is not None else PostgresConnector(port=5435)
+        self.term_occurrence_table_name = term_occurrence_table_name
+
+        # existing tables, retrieved on first use.
+        self.tables = None
+
+    def get_tables(self, open_pc):
+        """
+        Retrieves (once) the names of all tables in the public schema.
+        :param open_pc: (PostgresConnector) Connector with an open connection.
+        :return: (set) Table names.
+        """
+        if self.tables is None:
+            open_pc.cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'")
+            self.tables = {row[0] for row in open_pc.cursor}
+        return self.tables
+
+    def refresh(self):
+        """
+        Forgets the known tables, e.g. after new hyperedge tables have been created.
+        :return: (None)
+        """
+        self.tables = None
+
+    def get_representation(self, open_pc, model, window, entities_only):
+        """
+        Picks the table that answers the query for a model with the least amount of data.
+        :param open_pc: (PostgresConnector) Connector with an open connection.
+        :param model: (str) One of MODELS.
+        :param window: (int) Window size.
+        :param entities_only: (boolean) Whether only entities are requested.
+        :return: (tuple) Query template (key of QUERIES), table name, and whether the result still has to be restricted
+                 to entities. None if the model is not available for the window size.
+        """
+        tables = self.get_tables(open_pc)
+        if model == "implicit":
+            if self.term_occurrence_table_name in tables:
+                return model, self.term_occurrence_table_name, entities_only
+            return None
+
+        if model == "explicit":
+            suffixes = [("explicit", "hyperedges")]
+        else:
+            # the aggregated matrix answers the dyadic query without any counting.
+            suffixes = [("matrix", "cooccurrence"), ("dyadic", "dyadic")]
+
+        candidates = []
+        for template, suffix in suffixes:
+            # entity tables only contain entities, and are therefore smaller. Only usable if nothing else is requested.
+            if entities_only:
+                candidates.append((template, "entity_{}_{}".format(window, suffix), False))
+            candidates.append((template, "full_{}_{}".format(window, suffix), entities_only))
+
+        for template, table, filter_entities in candidates:
+            if table in tables:
+                return template, table, filter_entities
+        return None
+
+    def prepare(self, open_pc, model, table, filter_entities):
+        """
+        Prepares the statement for a model and table on the current connection, if that has not happened yet.
+        :param open_pc: (PostgresConnector) Connector with an open connection.
+        :param model: (str) Query template, i.e. one of MODELS or "matrix".
+        :param table: (str) Table to query.
+        :param filter_entities: (boolean) Whether the result is restricted to entities.
+        :return: (str) Name of the prepared statement.
+        """
+        name = "cooccurrence_{}_{}{}".format(model, table, "_entities" if filter_entities else "")
+        connection_key = (id(open_pc.connection), open_pc.connection.get_backend_pid())
+        prepared = PREPARED.setdefault(connection_key, set())
+
+        if name not in prepared:
+            entity_filter = "AND t.is_entity = true" if filter_entities else ""
+            # the limit is always the last parameter. LIMIT NULL returns all rows.
+            if model == "implicit":
+                query = QUERIES[model].format(table=table, entity_filter=entity_filter) + " LIMIT $3"
+                parameters = "(text, integer, bigint)"
+            else:
+                query = QUERIES[model].format(table=table, entity_filter=entity_filter) + " LIMIT $2"
+                parameters = "(text, bigint)"
+            open_pc.cursor.execute("PREPARE {} {} AS {}".format(name, parameters, query))
+            prepared.add(name)
+
+        return name
+
+    def query(self, term, window, model="auto", entities_only=False, limit=None):
+        """
+        Retrieves the terms co-occurring with a given term.
+        :param term: (str) Text of the term.
+        :param window: (int) Window size, i.e. number of sentences in each direction.
+        :param model: (str) Storage model to use: "implicit", "explicit", "dyadic", or "auto" for the fastest one that
+               is available for the window size.
+        :param entities_only: (boolean) Whether only co-occurring entities are returned.
+        :param limit: (int) Maximum number of returned terms. All terms are returned if not specified.
+        :return: (list) Tuples of (term_text, freq), ordered by descending frequency.
+        """
+        if model != "auto" and model not in MODELS:
+            raise ValueError("Model has to be one of {}, or auto!".format(MODELS))
+
+        with self.pc as open_pc:
+            for current_model in (AUTO_ORDER if model == "auto" else [model]):
+                representation = self.get_representation(open_pc, current_model, window, entities_only)
+                if representation is not None:
+                    break
+            else:
+                self.logger.error("No table found for model {} with window size {}!".format(model, window))
+                return []
+
+            template, table, filter_entities = representation
+            name = self.prepare(open_pc, template, table, filter_entities)
+            # the limit is part of the statement, so that Postgres only has to sort the top rows.
+            if current_model == "implicit":
+                open_pc.cursor.execute("EXECUTE {} (%s, %s, %s)".format(name), (term, window, limit))
+            else:
+                open_pc.cursor.execute("EXECUTE {} (%s, %s)".format(name), (term, limit))
+            return open_pc.cursor.fetchall()
+
+
+# default instances per connector, so that prepared statements are re-used between calls.
+INSTANCES = {}
+
+
+def cooccurrence(term, window, model="auto", entities_only=False, limit=None, pc=None):
+    """
+    Convenience function for Cooccurrence.query(), see there for the parameters.
+    :param pc: (PostgresConnector) Connector to the database. Defaults to the standard local container.
+    :return: (list) Tuples of (term_text, freq), ordered by descending frequency.
+    """
+    if id(pc) not in INSTANCES:
+        INSTANCES[id(pc)] = Cooccurrence(pc)
+    return INSTANCES[id(pc)].query(term, window, model=model, entities_only=entities_only, limit=limit)
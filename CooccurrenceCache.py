@@ -0,0 +1,252 @@
+"""
+Result cache in front of the co-occurrence queries (see Cooccurrence.py).
+Results are kept in memory in LRU order, and expire after a fixed time. Optionally, they are also stored in a Postgres
+table, so they survive restarts and are shared between processes.
+Results are keyed by (term_id, window, model, entities_only). Since the co-occurrences of a term only change if the
+term itself occurs in newly added documents, incremental ingestion (see CreateAllTables.append_documents()) logs the
+IDs of all terms in the new documents to an invalidation table, once all tables are updated. Every cache polls that
+table regularly.
+"""
+
+import time
+
+from collections import OrderedDict
+from psycopg2.extras import Json
+
+from Cooccurrence import Cooccurrence
+
+
+def create_cache_tables(open_pc, cache_table_name="cooccurrence_cache",
+                        invalidation_table_name="cooccurrence_invalidations"):
+    """
+    Creates the tables for the persistent cache tier and the invalidation log, if they do not exist yet.
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :param cache_table_name: (str) Name of the table storing the cached results.
+    :param invalidation_table_name: (str) Name of the table logging the invalidated terms.
+    :return: (None)
+    """
+    open_pc.cursor.execute("CREATE TABLE IF NOT EXISTS {} (term_id integer, window_size integer, model text, "
+                           "entities_only boolean, result jsonb, created timestamp DEFAULT now(), "
+                           "PRIMARY KEY (term_id, window_size, model, entities_only))".format(cache_table_name))
+    open_pc.cursor.execute("CREATE TABLE IF NOT EXISTS {} (invalidation_id serial PRIMARY KEY, term_id integer, "
+                           "invalidated timestamp DEFAULT now())".format(invalidation_table_name))
+
+
+def invalidate_terms(open_pc, term_ids, cache_table_name="cooccurrence_cache",
+                     invalidation_table_name="cooccurrence_invalidations"):
+    """
+    Invalidates the cached results of the given terms, both in the persistent tier and (via the invalidation log) in
+    the memory of all running caches. Runs in the transaction of the connector, so it becomes visible together with
+    the changes that caused it.
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :param term_ids: (list) IDs of the terms whose co-occurrences have changed.
+    :param cache_table_name: (str) Name of the table storing the cached results.
+    :param invalidation_table_name: (str) Name of the table logging the invalidated terms.
+    :return: (None)
+    """
+    create_cache_tables(open_pc, cache_table_name, invalidation_table_name)
+    term_ids = [int(term_id) for term_id in term_ids]
+    open_pc.cursor.execute("DELETE FROM {} WHERE term_id = ANY(%s)".format(cache_table_name), (term_ids,))
+    open_pc.cursor.execute("INSERT INTO {} (term_id) SELECT unnest(%s::integer[])".format(invalidation_table_name),
+                           (term_ids,))
+
+
+class CooccurrenceCache:
+    def __init__(self,
+                 cooccurrence=None,
+                 max_size=1024,
+                 ttl=3600,
+                 persistent=False,
+                 check_interval=10,
+                 create_tables=True,
+                 term_table_name="terms",
+                 cache_table_name="cooccurrence_cache",
+                 invalidation_table_name="cooccurrence_invalidations"):
+        """
+        Sets up the cache.
+        :param cooccurrence: (Cooccurrence) Query interface whose results are cached. Created with the default
+               connector if not specified.
+        :param max_size: (int) Maximum number of results kept in memory. The least recently used ones are evicted.
+        :param ttl: (int) Time in seconds after which a result is recomputed. 0 means results never expire.
+        :param persistent: (boolean) Whether results are additionally stored in a Postgres table.
+        :param check_interval: (int) Minimum time in seconds between two checks of the invalidation log.
+        :param create_tables: (boolean) Whether to create the cache tables. If False, they have to exist already, and
+               the database is only accessed once the first query is made.
+        :param term_table_name: (str) Name of the term table, used to look up term IDs.
+        :param cache_table_name: (str) Name of the table storing the cached results.
+        :param invalidation_table_name: (str) Name of the table logging the invalidated terms.
+        """
+        self.cooccurrence = cooccurrence if cooccurrence is not None else Cooccurrence()
+        self.pc = self.cooccurrence.pc
+        self.logger = self.cooccurrence.logger
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persistent = persistent
+        self.check_interval = check_interval
+        self.term_table_name = term_table_name
+        self.cache_table_name = cache_table_name
+        self.invalidation_table_name = invalidation_table_name
+
+        # (term_id, window, model, entities_only) -> (insertion time, result), in LRU order.
+        self.results = OrderedDict()
+        self.term_ids = {}
+        self.hits = 0
+        self.misses = 0
+
+        if create_tables:
+            with self.pc as open_pc:
+                create_cache_tables(open_pc, self.cache_table_name, self.invalidation_table_name)
+        # retrieved with the first check, which happens before anything is cached.
+        self.last_invalidation_id = None
+        self.last_check = None
+
+    def __len__(self):
+        return len(self.results)
+
+    def get_term_id(self, open_pc, term):
+        """
+        :param open_pc: (PostgresConnector) Connector with an open connection.
+        :param term: (str) Text of the term.
+        :return: (int) ID of the term, or None if it does not exist.
+        """
+        if term not in self.term_ids:
+            open_pc.cursor.execute("SELECT term_id FROM {} WHERE term_text = %s".format(self.term_table_name), (term,))
+            row = open_pc.cursor.fetchone()
+            if row is None:
+                return None
+            self.term_ids[term] = row[0]
+
+        return self.term_ids[term]
+
+    def query(self, term, window, model="auto", entities_only=False, limit=None):
+        """
+        Retrieves the terms co-occurring with a given term, from the cache if possible.
+        See Cooccurrence.query() for the parameters.
+        :return: (list) Tuples of (term_text, freq), ordered by descending frequency.
+        """
+        self.check_invalidations()
+
+        with self.pc as open_pc:
+            term_id = self.get_term_id(open_pc, term)
+            if term_id is None:
+                return []
+            key = (term_id, window, model, entities_only)
+
+            result = self.get_memory(key)
+            if result is None and self.persistent:
+                result = self.get_persistent(open_pc, key)
+                if result is not None:
+                    self.put_memory(key, result)
+
+        if result is None:
+            self.misses += 1
+            result = self.cooccurrence.query(term, window, model=model, entities_only=entities_only)
+            self.put_memory(key, result)
+            if self.persistent:
+                with self.pc as open_pc:
+                    self.put_persistent(open_pc, key, result)
+        else:
+            self.hits += 1
+
+        if limit is not None:
+            return result[:limit]
+        return result
+
+    def get_memory(self, key):
+        """
+        :param key: (tuple) Cache key.
+        :return: (list) Cached result, or None if it is not present or expired.
+        """
+        if key not in self.results:
+            return None
+
+        created, result = self.results[key]
+        if self.ttl and time.monotonic() - created > self.ttl:
+            del self.results[key]
+            return None
+
+        self.results.move_to_end(key)
+        return result
+
+    def put_memory(self, key, result):
+        """
+        Stores a result in memory, and evicts the least recently used results if the cache is full.
+        :param key: (tuple) Cache key.
+        :param result: (list) Result to store.
+        :return: (None)
+        """
+        self.results[key] = (time.monotonic(), result)
+        self.results.move_to_end(key)
+        while len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+
+    def get_persistent(self, open_pc, key):
+        """
+        :param open_pc: (PostgresConnector) Connector with an open connection.
+        :param key: (tuple) Cache key.
+        :return: (list) Cached result from the Postgres table, or None if it is not present or expired.
+        """
+        query = "SELECT result FROM {} WHERE term_id = %s AND window_size = %s AND model = %s " \
+                "AND entities_only = %s".format(self.cache_table_name)
+        if self.ttl:
+            query += " AND created > now() - interval '{} seconds'".format(int(self.ttl))
+
+        open_pc.cursor.execute(query, key)
+        row = open_pc.cursor.fetchone()
+        if row is None:
+            return None
+        return [tuple(el) for el in row[0]]
+
+    def put_persistent(self, open_pc, key, result):
+        """
+        :param open_pc: (PostgresConnector) Connector with an open connection.
+        :param key: (tuple) Cache key.
+        :param result: (list) Result to store.
+        :return: (None)
+        """
+        open_pc.cursor.execute("INSERT INTO {} (term_id, window_size, model, entities_only, result) "
+                               "VALUES (%s, %s, %s, %s, %s) "
+                               "ON CONFLICT (term_id, window_size, model, entities_only) "
+                               "DO UPDATE SET result = EXCLUDED.result, created = now()".format(self.cache_table_name),
+                               key + (Json(result),))
+
+    def check_invalidations(self, force=False):
+        """
+        Removes all results of terms that were invalidated since the last check.
+        :param force: (boolean) Check even if the last check happened less than check_interval seconds ago.
+        :return: (None)
+        """
+        if not force and self.last_check is not None and time.monotonic() - self.last_check < self.check_interval:
+            return None
+
+        with self.pc as open_pc:
+            if self.last_invalidation_id is None:
+                # earlier invalidations are irrelevant, since nothing is cached yet.
+                open_pc.cursor.execute("SELECT COALESCE(MAX(invalidation_id), 0) FROM {}"
+                                       .format(self.invalidation_table_name))
+                self.last_invalidation_id = open_pc.cursor.fetchone()[0]
+                self.last_check = time.monotonic()
+                return None
+
+            open_pc.cursor.execute("SELECT invalidation_id, term_id FROM {} WHERE invalidation_id > %s"
+                                   .format(self.invalidation_table_name), (self.last_invalidation_id,))
+            rows = open_pc.cursor.fetchall()
+        self.last_check = time.monotonic()
+
+        if rows:
+            self.last_invalidation_id = max(row[0] for row in rows)
+            self.invalidate(row[1] for row in rows)
+
+    def invalidate(self, term_ids=None):
+        """
+        Removes the results of the given terms from memory.
+        :param term_ids: (iterable) IDs of the terms. If None, the whole cache is cleared.
+        :return: (None)
+        """
+        if term_ids is None:
+            self.results.clear()
+            return None
+
+        term_ids = set(term_ids)
+        for key in [key for key in self.results if key[0] in term_ids]:
+            del self.results[key]
@@ -6,9 +6,13 @@ from DocumentGenerator import DocumentGenerator
 from TermGenerator import TermGenerator
 from HyperedgeGenerator import HyperedgeGenerator
 from GenerateNewSchema import SchemaCreator
+from DocumentSource import LocalDocumentSource, MongoDocumentSource
+from PostgresConnector import PostgresConnector
+from CooccurrenceCache import invalidate_terms
 
 from subprocess import run
 import argparse
+import sys
 import time
 
 
@@ -43,6 +47,16 @@ def get_parser():
     args.add_argument("-v", "--volume", type=str2bool, nargs="?", const=True, default=True,
                       help="Whether the attached data should be stored in a volume or not.")
     args.add_argument("-s", "--shm", type=str, default="256M")
+    args.add_argument("-j", "--n-process", type=int, default=1,
+                      help="Number of processes used for tokenizing the sentences.")
+    args.add_argument("--incremental", type=str2bool, nargs="?", const=True, default=False,
+                      help="Only append new articles to the existing tables, instead of rebuilding everything. "
+                           "Skips the docker set up.")
+    args.add_argument("-w", "--window-sizes", type=int, nargs="+", default=[2],
+                      help="Window sizes for which the entity hyperedge tables are generated.")
+    args.add_argument("--local-export", type=str, default=None,
+                      help="Directory with local JSONL/Parquet exports of articles, sentences and entities, which are "
+                           "used instead of the MongoDB.")
 
     return args
 
@@ -65,12 +79,61 @@ def set_up(opts):
         print("Finished setting up Docker instance.")
 
 
+def get_source(opts):
+    """
+    :param opts: (argparse.Namespace) Parsed command line options.
+    :return: (DocumentSource) Local export, if specified, and MongoDB otherwise.
+    """
+    if opts.local_export:
+        return LocalDocumentSource(opts.local_export)
+    return MongoDocumentSource()
+
+
+def append_documents(opts):
+    """
+    Appends newly available articles to the existing tables, instead of rebuilding everything from scratch.
+    Term IDs of already known terms are re-used, and hyperedges are only generated for the new documents.
+    :param opts: (argparse.Namespace) Parsed command line options.
+    :return: (None)
+    """
+    print("Appending new documents to the existing tables...")
+    source = get_source(opts)
+    dg = DocumentGenerator(port=opts.port, incremental=True, source=source)
+    dg.stream()
+
+    tg = TermGenerator(num_distinct_documents=0, port=opts.port, n_process=opts.n_process, incremental=True,
+                       source=source)
+    tg.parse()
+    tg.push_sentences()
+    tg.push_terms()
+    tg.push_entities()
+    tg.push_term_occurrences()
+
+    hg = HyperedgeGenerator(port=opts.port, incremental=True)
+    hg.create_edges()
+
+    sc = SchemaCreator(port=opts.port, incremental=True)
+    sc.create_multiple(opts.window_sizes)
+    sc.create_cooccurrence_matrices(opts.window_sizes)
+
+    # only invalidate once all representations contain the new documents, otherwise caches could re-fetch results
+    # from the outdated hyperedge or matrix tables in the meantime.
+    touched_terms = tg.touched_terms()
+    with PostgresConnector(port=opts.port) as open_pc:
+        invalidate_terms(open_pc, touched_terms)
+    print("Invalidated cached co-occurrences of {} terms.".format(len(touched_terms)))
+
+
 if __name__ == "__main__":
 
     # set up parser
     parser = get_parser()
     opts = parser.parse_args()
 
+    if opts.incremental:
+        append_documents(opts)
+        sys.exit(0)
+
     # create new docker instance, if needed.
     set_up(opts)
 
@@ -79,8 +142,9 @@ if __name__ == "__main__":
 
     # Create all generators
     print("Starting with generation of all relevant documents...")
-    dg = DocumentGenerator(port=opts.port, num_distinct_documents=opts.number_of_documents)
-    tg = TermGenerator(num_distinct_documents=opts.number_of_documents, port=opts.port)
+    source = get_source(opts)
+    dg = DocumentGenerator(port=opts.port, num_distinct_documents=opts.number_of_documents, source=source)
+    tg = TermGenerator(num_distinct_documents=opts.number_of_documents, port=opts.port, source=source)
     hg = HyperedgeGenerator(port=opts.port)
 
     # Clear all tables.
@@ -95,21 +159,22 @@ if __name__ == "__main__":
     dg.clear()
 
     # insert from scratch.
-    dg.retrieve()
-    dg.push()
+    dg.stream()
     dg.remove_spike()
 
     # re-initialize due to the fact that previously the documents haven't been inserted!
     print("Pushing new documents...")
-    tg = TermGenerator(num_distinct_documents=opts.number_of_documents, port=opts.port)
+    tg = TermGenerator(num_distinct_documents=opts.number_of_documents, port=opts.port, n_process=opts.n_process,
+                       source=source)
     tg.parse()
     tg.push_sentences()
     tg.push_terms()
     tg.push_entities()
     tg.push_term_occurrences()
 
-    hg.create_edges_naively()
+    hg.create_edges()
 
-    # additionally serve an entity-only table.
+    # additionally serve entity-only tables.
     sc = SchemaCreator(port=opts.port)
-    sc.create()
+    sc.create_multiple(opts.window_sizes)
+    sc.create_cooccurrence_matrices(opts.window_sizes)
@@ -7,17 +7,17 @@ Some words on the naming convention: The name from the 'articles' table in Mongo
 this is the common phrase used in the paper, as well as the context of 'document collections'.
 """
 
-from MongoConnector import MongoConnector
+from DocumentSource import MongoDocumentSource
 from PostgresConnector import PostgresConnector
 
-from utils import set_up_logger, check_table_existence
-from psycopg2 import ProgrammingError, IntegrityError
-from psycopg2.extras import execute_values
+from utils import set_up_logger, check_table_existence, insert_into_table, take
 
 import os
 import time
 import logging
+import threading
 from collections import OrderedDict
+from queue import Queue
 
 
 class DocumentGenerator:
@@ -31,6 +31,11 @@ class DocumentGenerator:
                                      }),
                  num_distinct_documents=0,
                  document_table_name="documents",
+                 batch_size=10000,
+                 prefetch_batches=2,
+                 incremental=False,
+                 watermark="document_id",
+                 source=None,
                  database="postgres",
                  user="postgres",
                  password="postgres",
@@ -48,6 +53,15 @@ class DocumentGenerator:
         :param num_distinct_documents: (int) As the name indicates, the number of distinct articles that should be used.
                Mainly for debugging purposes. 0 means all documents will be used, in accordance with MongoDB standards.
         :param document_table_name: (str) Name of the Postgres table that should contain the documents
+        :param batch_size: (int) Number of documents that are pulled from MongoDB and pushed to Postgres at once when
+               using .stream(). Determines the peak memory consumption of the streaming mode.
+        :param prefetch_batches: (int) Number of batches that may be retrieved ahead of the current insertion, so that
+               retrieval and insertion overlap in time.
+        :param incremental: (boolean) If set, only documents that are newer than the already inserted ones (according to
+               the watermark column) will be retrieved, so that new articles can be appended without a full rebuild.
+        :param watermark: (str) Column of the document table that determines whether a document is new, i.e.
+               "document_id" or "published". Has to be part of the specified fields.
+        :param source: (DocumentSource) Source from which the documents are read. Defaults to the MongoDB.
         :param database: (str) database name.
         :param user: (str) User name to get access to the Postgres database.
         :param password: (str) Corresponding user password.
@@ -62,17 +76,17 @@ class DocumentGenerator:
         self.logger = set_up_logger(__name__, log_file, log_level, log_verbose)
         self.logger.info("Successfully registered logger to DocumentGenerator.")
 
-        # register a MongoConnector
-        self.mc = MongoConnector()
-        self.logger.info("Successfully registered MongoConnector to DocumentGenerator.")
+        # register the document source, by default a MongoConnector
+        self.source = source if source is not None else MongoDocumentSource()
+        self.logger.info("Successfully registered {} to DocumentGenerator.".format(type(self.source).__name__))
 
         self.num_distinct_documents = num_distinct_documents
         # get the distinct IDs for the documents so we can match against them later
         if self.num_distinct_documents != 0:
             self.logger.info("Non-zero limit detected. Fetching first N distinct document IDs now...")
-            with self.mc as open_mc:
-                documents = open_mc.client[open_mc.news].articles
-                self.first_documents = list(documents.find().limit(self.num_distinct_documents))
+            with self.source as open_source:
+                self.first_documents = list(open_source.find("articles", fields=["_id"],
+                                                             limit=self.num_distinct_documents))
                 # for small enough number, and large enough document collection, this is more efficient:
                 self.first_documents = [el["_id"] for el in self.first_documents]
                 self.logger.info("Successfully registered relevant document IDs.")
@@ -88,13 +102,16 @@ class DocumentGenerator:
         self.fields = fields
         if not self.fields:
             self.logger.error("No fields for MongoDB table specified!")
-        self.values_to_retrieve = {key: 1 for key in self.fields.keys()}
-        # suppress _id if not wanted, as it is returned by default.
-        if "_id" not in self.values_to_retrieve.keys():
-            self.values_to_retrieve["_id"] = 0
+        self.values_to_retrieve = list(self.fields.keys())
         # TODO
         self.sql_format = ", ".join([value for value in self.fields.values()])
         self.document_table_name = document_table_name
+        self.batch_size = batch_size
+        self.prefetch_batches = prefetch_batches
+        self.incremental = incremental
+        self.watermark = watermark
+        if self.incremental and self.watermark not in self.fields.values():
+            self.logger.error("Watermark column {} is not part of the retrieved fields!".format(self.watermark))
 
         # preparation for later. According to PEP8
         self.data = []
@@ -111,19 +128,129 @@ class DocumentGenerator:
         self.logger.info("Starting to retrieve documents from MongoDB...")
         start_time = time.time()
 
-        with self.mc as open_mc:
-            documents = open_mc.client[open_mc.news].articles
-            if self.first_documents:
-                self.data = list(documents.find({"_id": {"$in": self.first_documents}}, self.values_to_retrieve))
-            else:
-                # self.first_documents will be empty if no limit is specified!
-                self.data = list(documents.find({}, self.values_to_retrieve))
+        with self.source as open_source:
+            self.data = list(open_source.find("articles", fields=self.values_to_retrieve, **self.get_filter()))
             # get out of dictionary key structure:
             self.data = [list(el.values()) for el in self.data]
 
         end_time = time.time()
         self.logger.info("Successfully retrieved relevant documents in {:.4f} s.".format(end_time - start_time))
 
+    def get_filter(self):
+        """
+        Builds the filter for the relevant documents, in the form of arguments for DocumentSource.find().
+        :return: (dict) Filter restricting to the first N distinct documents (if a limit is set), as well as to
+                 documents newer than the current watermark (in incremental mode).
+        """
+        query = {}
+        # self.first_documents will be empty if no limit is specified!
+        if self.first_documents:
+            query["doc_ids"] = self.first_documents
+
+        if self.incremental:
+            watermark = self.get_watermark()
+            if watermark is not None:
+                # translate the Postgres column back to the MongoDB field.
+                field = {value: key for key, value in self.fields.items()}[self.watermark]
+                query["greater_than"] = (field, watermark)
+                self.logger.info("Only retrieving documents with {} > {}.".format(field, watermark))
+
+        return query
+
+    def get_watermark(self):
+        """
+        Retrieves the maximum value of the watermark column among the already inserted documents.
+        :return: Maximum value of the watermark column, or None if the document table is empty.
+        """
+        with self.pc as open_pc:
+            if not check_table_existence(self.logger, open_pc, self.document_table_name):
+                return None
+            open_pc.cursor.execute("SELECT MAX({}) FROM {}".format(self.watermark, self.document_table_name))
+            return open_pc.cursor.fetchone()[0]
+
+    def stream(self, batch_size=None):
+        """
+        Alternative to the combination of .retrieve() and .push(), which never holds the full document collection in
+        memory. Documents are pulled from the document source in batches by a separate thread, and every batch is
+        inserted into Postgres as soon as it arrives. At most prefetch_batches + 1 batches are held at any time,
+        so the peak memory is independent of the collection size.
+        All documents are inserted in a single transaction, which is rolled back if any of the batches fails.
+        :param batch_size: (int) Overrides the batch size specified at initialization, if given.
+        :return: (int) Number of inserted documents, or 0 if the insertion failed.
+        """
+        if batch_size is None:
+            batch_size = self.batch_size
+
+        self.logger.info("Starting to stream documents from MongoDB into Postgres...")
+        start_time = time.time()
+
+        # bounded queue, so that the retrieval blocks if the insertion can't keep up.
+        batches = Queue(maxsize=self.prefetch_batches)
+        stop = threading.Event()
+        # determine the filter beforehand, since the watermark requires the PostgresConnector.
+        query = self.get_filter()
+
+        def retrieve_batches():
+            try:
+                with self.source as open_source:
+                    cursor = open_source.find("articles", fields=self.values_to_retrieve, batch_size=batch_size,
+                                              **query)
+                    try:
+                        while not stop.is_set():
+                            batch = [list(el.values()) for el in take(cursor, batch_size)]
+                            if not batch:
+                                break
+                            batches.put(batch)
+                    finally:
+                        cursor.close()
+            except Exception as err:
+                # hand the error over to the inserting thread, which re-raises it.
+                batches.put(err)
+            finally:
+                # sentinel to signal the end of the collection
+                batches.put(None)
+
+        retriever = threading.Thread(target=retrieve_batches, daemon=True)
+        retriever.start()
+
+        inserted = 0
+        try:
+            with self.pc as open_pc:
+                if not check_table_existence(self.logger, open_pc, self.document_table_name):
+                    return 0
+                self.logger.info("Found document table.")
+
+                try:
+                    while True:
+                        batch = batches.get()
+                        if batch is None:
+                            break
+                        if isinstance(batch, Exception):
+                            raise batch
+
+                        if not insert_into_table(open_pc, self.document_table_name, self.sql_format, batch,
+                                                 self.logger):
+                            # discard the previous batches as well, so that a failed run can simply be repeated.
+                            open_pc.rollback()
+                            return 0
+
+                        inserted += len(batch)
+                        self.logger.info("Inserted {} documents so far.".format(inserted))
+                except Exception:
+                    open_pc.rollback()
+                    raise
+        finally:
+            # make sure the retrieving thread does not stay blocked on a full queue.
+            stop.set()
+            while retriever.is_alive():
+                while not batches.empty():
+                    batches.get()
+                retriever.join(timeout=0.1)
+
+        end_time = time.time()
+        self.logger.info("Successfully streamed {} documents in {:.4f} s.".format(inserted, end_time - start_time))
+        return inserted
+
     def push(self):
         """
         Pushes a previously collected series of documents from the local store to a Postgres table, as per the defined
@@ -145,17 +272,12 @@ class DocumentGenerator:
 
             # build query
             start_time = time.time()
-            try:
-                execute_values(open_pc.cursor,
-                               "INSERT INTO {} ({}) VALUES %s".format(self.document_table_name, self.sql_format),
-                               self.data)
-
-                end_time = time.time()
-                self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
-            except IntegrityError as err:
-                self.logger.error("Values with previously inserted primary key detected!\n {}".format(err))
+            if not insert_into_table(open_pc, self.document_table_name, self.sql_format, self.data, self.logger):
                 return 0
 
+            end_time = time.time()
+            self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
+
     def clear(self):
         """
         Deletes previously inserted documents from the table.
@@ -194,8 +316,5 @@ class DocumentGenerator:
 
 if __name__ == "__main__":
     dg = DocumentGenerator()
-    dg.retrieve()
-    # print(dg.data)
-    print(dg.data[0])
     dg.clear()
-    dg.push()
+    dg.stream()
@@ -0,0 +1,233 @@
+"""
+Defines the sources from which the DocumentGenerator and TermGenerator read the articles, sentences and entities.
+Supposed goals:
+- Common interface, so that the generators do not depend on a specific storage.
+- MongoDocumentSource reads from the (remote) MongoDB, via the MongoConnector.
+- LocalDocumentSource reads from local JSONL or Parquet exports of the collections, which allows running and
+  benchmarking the ingestion offline, without the SSH tunnel.
+All sources iterate lazily over the results, and restrict to the relevant documents as early as possible.
+"""
+
+import datetime
+import gzip
+import json
+import os
+
+from itertools import islice
+
+
+# field that contains the document ID, per collection.
+DOC_ID_FIELDS = {"articles": "_id", "sentences": "doc_id", "entities": "doc_id"}
+
+
+class DocumentSource:
+    """
+    Interface for all document sources. Sources are used as context managers, similar to the MongoConnector, and
+    results can only be retrieved within the context.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        return None
+
+    def find(self, collection, doc_ids=None, fields=None, greater_than=None, sort=None, limit=0, batch_size=1000):
+        """
+        Retrieves the entries of a collection.
+        :param collection: (str) Name of the collection, i.e. "articles", "sentences" or "entities".
+        :param doc_ids: (list) If given, only entries belonging to these documents are returned.
+        :param fields: (list) Fields to be returned, in this order. All fields are returned if not specified.
+        :param greater_than: (tuple) Optional (field, value) pair. Only entries with a larger value are returned.
+        :param sort: (list) Optional list of fields by which the results are sorted (ascending).
+        :param limit: (int) Maximum number of returned entries. 0 means no limit.
+        :param batch_size: (int) Number of entries that are retrieved from the storage at once.
+        :return: (generator) Yields the entries as dictionaries.
+        """
+        raise NotImplementedError
+
+
+def project(entry, fields):
+    """
+    Restricts an entry to the given fields, in the given order. Missing fields are set to None.
+    :param entry: (dict) Entry of a collection.
+    :param fields: (list) Fields to be returned. If None, the entry is returned unchanged.
+    :return: (dict) Projected entry.
+    """
+    if fields is None:
+        return entry
+    return {field: entry.get(field) for field in fields}
+
+
+class MongoDocumentSource(DocumentSource):
+    def __init__(self, mc=None):
+        """
+        Reads from the MongoDB news database.
+        :param mc: (MongoConnector) Connector to use. A default MongoConnector is created if not specified.
+        """
+        if mc is None:
+            # only required for this source, so that local sources also work without pymongo and sshtunnel.
+            from MongoConnector import MongoConnector
+            mc = MongoConnector()
+        self.mc = mc
+        self.open_mc = None
+
+    def __enter__(self):
+        self.open_mc = self.mc.__enter__()
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        self.open_mc = None
+        return self.mc.__exit__(exception_type, exception_value, traceback)
+
+    def find(self, collection, doc_ids=None, fields=None, greater_than=None, sort=None, limit=0, batch_size=1000):
+        query = {}
+        if doc_ids:
+            query[DOC_ID_FIELDS[collection]] = {"$in": doc_ids}
+        if greater_than is not None:
+            query.setdefault(greater_than[0], {})["$gt"] = greater_than[1]
+
+        projection = None
+        if fields is not None:
+            projection = {field: 1 for field in fields}
+            # suppress _id if not wanted, as it is returned by default.
+            if "_id" not in projection:
+                projection["_id"] = 0
+
+        cursor = self.open_mc.client[self.open_mc.news][collection].find(query, projection, no_cursor_timeout=True)
+        if sort:
+            cursor = cursor.sort([(field, 1) for field in sort])
+
+        with cursor.limit(limit).batch_size(batch_size) as cursor:
+            for entry in cursor:
+                yield project(entry, fields)
+
+
+def decode_extended_json(value):
+    """
+    Object hook for json.load(), which converts the extended JSON types of mongoexport ($date, $oid, $numberLong)
+    back to their Python equivalents.
+    :param value: (dict) Decoded JSON object.
+    :return: Converted value.
+    """
+    if len(value) != 1:
+        return value
+
+    key, content = next(iter(value.items()))
+    if key == "$date":
+        if isinstance(content, dict):
+            content = int(content["$numberLong"])
+        if isinstance(content, int):
+            return datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=content)
+        return datetime.datetime.fromisoformat(content.replace("Z", "+00:00")).replace(tzinfo=None)
+    if key == "$oid":
+        return content
+    if key == "$numberLong":
+        return int(content)
+
+    return value
+
+
+class LocalDocumentSource(DocumentSource):
+    def __init__(self, path, presorted=True):
+        """
+        Reads from local exports of the collections. Every collection is stored in the given directory as
+        <collection>.parquet, <collection>.jsonl or <collection>.jsonl.gz (as created with mongoexport).
+        :param path: (os.path) Directory containing the exports.
+        :param presorted: (boolean) Whether the exports are already sorted in the order that is requested, which allows
+               streaming. The order is checked during iteration. If False, sorted results are loaded into memory.
+        """
+        self.path = path
+        self.presorted = presorted
+
+    def get_file(self, collection):
+        """
+        :param collection: (str) Name of the collection.
+        :return: (os.path) Path of the export of the collection.
+        """
+        for extension in [".parquet", ".jsonl", ".jsonl.gz"]:
+            file_path = os.path.join(self.path, collection + extension)
+            if os.path.exists(file_path):
+                return file_path
+
+        raise FileNotFoundError("No export found for collection {} in {}!".format(collection, self.path))
+
+    def find(self, collection, doc_ids=None, fields=None, greater_than=None, sort=None, limit=0, batch_size=1000):
+        file_path = self.get_file(collection)
+        id_field = DOC_ID_FIELDS[collection]
+        if file_path.endswith(".parquet"):
+            entries = self.read_parquet(file_path, id_field, doc_ids, fields, greater_than, sort, batch_size)
+        else:
+            entries = self.read_jsonl(file_path, id_field, doc_ids, greater_than)
+
+        if sort:
+            if self.presorted:
+                entries = check_order(entries, sort)
+            else:
+                entries = iter(sorted(entries, key=lambda entry: tuple(entry[field] for field in sort)))
+
+        if limit:
+            entries = islice(entries, limit)
+
+        for entry in entries:
+            yield project(entry, fields)
+
+    @staticmethod
+    def read_jsonl(file_path, id_field, doc_ids, greater_than):
+        """
+        Streams a JSONL export line by line, and filters the entries directly after decoding.
+        :return: (generator) Yields the matching entries.
+        """
+        doc_ids = set(doc_ids) if doc_ids else None
+        opener = gzip.open if file_path.endswith(".gz") else open
+        with opener(file_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line, object_hook=decode_extended_json)
+                if doc_ids is not None and entry.get(id_field) not in doc_ids:
+                    continue
+                if greater_than is not None and not entry.get(greater_than[0]) > greater_than[1]:
+                    continue
+                yield entry
+
+    @staticmethod
+    def read_parquet(file_path, id_field, doc_ids, fields, greater_than, sort, batch_size):
+        """
+        Streams a Parquet export in record batches. The filters are passed to pyarrow, which can skip whole row groups
+        based on their statistics, and only the required columns are read.
+        :return: (generator) Yields the matching entries.
+        """
+        # optional dependency, only required for Parquet exports.
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(file_path, format="parquet")
+        expression = None
+        if doc_ids:
+            expression = ds.field(id_field).isin(list(doc_ids))
+        if greater_than is not None:
+            condition = ds.field(greater_than[0]) > greater_than[1]
+            expression = condition if expression is None else expression & condition
+
+        columns = None
+        if fields is not None:
+            # sort keys have to be read as well, even if they are not returned.
+            columns = [field for field in dataset.schema.names if field in fields or field in (sort or [])]
+
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+            yield from batch.to_pylist()
+
+
+def check_order(entries, sort):
+    """
+    Passes entries through, but makes sure that they are actually sorted by the given fields.
+    :param entries: (iterable) Entries as dictionaries.
+    :param sort: (list) Fields by which the entries should be sorted.
+    :return: (generator) Yields the unchanged entries.
+    """
+    previous = None
+    for entry in entries:
+        key = tuple(entry[field] for field in sort)
+        if previous is not None and key < previous:
+            raise ValueError("Export is not sorted by {}! Use presorted=False instead.".format(sort))
+        previous = key
+        yield entry
@@ -0,0 +1,210 @@
+"""
+Term -> hyperedge index for the Explicit Model, stored as Roaring bitmaps (pyroaring).
+Instead of materializing the edge IDs of a term as an array, as in eh.edge_id = ANY(ARRAY(SELECT * FROM q)), every
+term has a compressed bitmap of its hyperedges. Queries over several terms, or restricted to a subset of the
+documents (e.g. a single feed), then become intersections and unions of bitmaps:
+    index.all_of(["Hillary Clinton", "Donald Trump"])       # edges containing both terms
+    index.cooccurrence("Hillary Clinton", restrict=feed_edges(pc, "entity_2", "WP"))
+The bitmaps of all terms are serialized into a single blob, which can be stored on disk and memory-mapped. Bitmaps are
+only deserialized when they are used for the first time.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from HypergraphCSR import HypergraphCSR, top_counts
+
+# version of the on-disk format, stored in the header.
+VERSION = 1
+
+
+def bitmap(values=()):
+    """
+    :param values: (iterable) Initial values.
+    :return: (pyroaring.BitMap) New bitmap.
+    """
+    # optional dependency, only required for the bitmap index.
+    from pyroaring import BitMap
+
+    return BitMap(values)
+
+
+def feed_edges(pc, prefix, feedname, document_table_name="documents"):
+    """
+    Retrieves the hyperedges of all documents of a feed, to restrict queries to that feed.
+    :param pc: (PostgresConnector) Object for communication.
+    :param prefix: (str) Prefix of the hyperedge tables, e.g. entity_2.
+    :param feedname: (str) Name of the feed.
+    :param document_table_name: (str) Name of the document table.
+    :return: (pyroaring.BitMap) IDs of the hyperedges.
+    """
+    with pc as open_pc:
+        open_pc.cursor.execute("SELECT hd.edge_id FROM {}_hyperedge_document hd, {} d "
+                               "WHERE hd.document_id = d.document_id AND d.feedname = %s"
+                               .format(prefix, document_table_name), (feedname,))
+        return bitmap(row[0] for row in open_pc.cursor)
+
+
+class EdgeBitmapIndex:
+    def __init__(self, blob, offsets, csr=None):
+        """
+        Wraps serialized bitmaps. Use EdgeBitmapIndex.from_csr() or EdgeBitmapIndex.load() to create one.
+        :param blob: (np.array of uint8) Serialized bitmaps of all terms, concatenated in term ID order.
+        :param offsets: (np.array of int64) Start of every bitmap in the blob, plus the total length at the end.
+        :param csr: (HypergraphCSR) Hyperedges of the same table. Required to query by term text, and for
+               cooccurrence().
+        """
+        self.blob = blob
+        self.offsets = offsets
+        self.csr = csr
+        # deserialized bitmaps, by term ID.
+        self.bitmaps = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_csr(cls, csr):
+        """
+        Builds the bitmaps from the term -> edges incidences of a CSR hypergraph.
+        :param csr: (HypergraphCSR) Hyperedges to index.
+        :return: (EdgeBitmapIndex) Index with the CSR attached.
+        """
+        serialized = []
+        for term_id in range(csr.num_terms):
+            edges = csr.term_edges[csr.term_pointers[term_id]:csr.term_pointers[term_id + 1]]
+            serialized.append(bitmap(csr.edge_ids[edges].astype(np.uint32)).serialize())
+
+        offsets = np.zeros(len(serialized) + 1, dtype=np.int64)
+        np.cumsum([len(el) for el in serialized], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(serialized), dtype=np.uint8), offsets, csr)
+
+    @classmethod
+    def from_postgres(cls, pc, hyperedge_table_name="entity_2_hyperedges", term_table_name="terms"):
+        """
+        Loads a hyperedge table and indexes it.
+        :param pc: (PostgresConnector) Object for communication.
+        :param hyperedge_table_name: (str) Name of the hyperedge table.
+        :param term_table_name: (str) Name of the term table.
+        :return: (EdgeBitmapIndex) Index with the CSR attached.
+        """
+        return cls.from_csr(HypergraphCSR.from_postgres(pc, hyperedge_table_name, term_table_name))
+
+    def save(self, path):
+        """
+        Stores the serialized bitmaps in a directory, as .npy files plus a small JSON header.
+        :param path: (os.path) Directory to store the index in. Will be created if necessary.
+        :return: (None)
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "blob.npy"), self.blob)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        with open(os.path.join(path, "header.json"), "w") as f:
+            json.dump({"version": VERSION, "terms": len(self)}, f)
+
+    @classmethod
+    def load(cls, path, csr=None, mmap=True):
+        """
+        Loads an index that was previously stored with save().
+        :param path: (os.path) Directory containing the index.
+        :param csr: (HypergraphCSR) Hyperedges of the same table, see __init__().
+        :param mmap: (boolean) Whether to memory-map the bitmaps instead of reading them into memory.
+        :return: (EdgeBitmapIndex) Loaded index.
+        """
+        with open(os.path.join(path, "header.json"), "r") as f:
+            header = json.load(f)
+        if header["version"] != VERSION:
+            raise ValueError("Unsupported bitmap index version {}!".format(header["version"]))
+
+        mmap_mode = "r" if mmap else None
+        return cls(np.load(os.path.join(path, "blob.npy"), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, "offsets.npy"), mmap_mode=mmap_mode), csr)
+
+    def term_id(self, term):
+        """
+        :param term: (str or int) Text or ID of a term.
+        :return: (int) ID of the term, or None if it does not exist.
+        """
+        if isinstance(term, str):
+            if self.csr is None:
+                raise ValueError("Querying by text requires the hyperedges (csr) of the index!")
+            return self.csr.term_lookup.get(term)
+        return int(term)
+
+    def edges(self, term):
+        """
+        :param term: (str or int) Text or ID of a term.
+        :return: (pyroaring.BitMap) IDs of the hyperedges containing the term. Must not be modified.
+        """
+        term_id = self.term_id(term)
+        if term_id is None or not 0 <= term_id < len(self):
+            return bitmap()
+
+        if term_id not in self.bitmaps:
+            from pyroaring import BitMap
+            self.bitmaps[term_id] = BitMap.deserialize(
+                self.blob[self.offsets[term_id]:self.offsets[term_id + 1]].tobytes())
+        return self.bitmaps[term_id]
+
+    def all_of(self, terms):
+        """
+        :param terms: (list) Texts or IDs of the terms.
+        :return: (pyroaring.BitMap) IDs of the hyperedges containing all of the terms.
+        """
+        # the smallest bitmaps first, so that the intermediate results stay small.
+        bitmaps = sorted([self.edges(term) for term in terms], key=len)
+        if not bitmaps:
+            return bitmap()
+
+        result = bitmaps[0].copy()
+        for other in bitmaps[1:]:
+            result &= other
+        return result
+
+    def any_of(self, terms):
+        """
+        :param terms: (list) Texts or IDs of the terms.
+        :return: (pyroaring.BitMap) IDs of the hyperedges containing at least one of the terms.
+        """
+        return bitmap().union(*[self.edges(term) for term in terms])
+
+    def count(self, terms, restrict=None):
+        """
+        :param terms: (list) Texts or IDs of the terms.
+        :param restrict: (pyroaring.BitMap) If specified, only these hyperedges are counted, e.g. from feed_edges().
+        :return: (int) Number of hyperedges containing all of the terms.
+        """
+        edges = self.all_of(terms)
+        if restrict is not None:
+            return edges.intersection_cardinality(restrict)
+        return len(edges)
+
+    def cooccurrence(self, terms, restrict=None, limit=None, entities_only=False):
+        """
+        Retrieves the terms co-occurring with (all of) the given terms, same as HypergraphCSR.query() for a single term.
+        :param terms: (str or list) Text of a term, or texts or IDs of several terms.
+        :param restrict: (pyroaring.BitMap) If specified, only these hyperedges are considered, e.g. from feed_edges().
+        :param limit: (int) Maximum number of returned terms. All terms are returned if not specified.
+        :param entities_only: (boolean) Whether only co-occurring entities are returned.
+        :return: (list) Tuples of (term_text, freq), ordered by descending frequency.
+        """
+        if self.csr is None:
+            raise ValueError("Counting co-occurrences requires the hyperedges (csr) of the index!")
+        if isinstance(terms, str):
+            terms = [terms]
+
+        edges = self.all_of(terms)
+        if restrict is not None:
+            edges &= restrict
+
+        edge_ids = np.frombuffer(edges.to_array(), dtype=np.uint32)
+        counts = self.csr.count_members(np.searchsorted(self.csr.edge_ids, edge_ids), entities_only=entities_only)
+        for term in terms:
+            term_id = self.term_id(term)
+            if term_id is not None and term_id < len(counts):
+                counts[term_id] = 0
+
+        ids, freqs = top_counts(counts, self.csr.term_ranks, limit)
+        return list(zip(self.csr.term_texts[ids].tolist(), freqs.tolist()))
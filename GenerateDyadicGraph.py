@@ -3,158 +3,199 @@ As the name indicates, generates a "simple" dyadic Graph based on the term co-oc
 We skip parts of the LOAD model, as for example the direct linking of sentences and documents, and instead
 treat that part as "further available meta-information", but restrict our graph specifically to the terms, or respectively
 entities.
+Every hyperedge is expanded into a clique. Instead of looping over every single pair in Python, all hyperedges of the
+same size are expanded at once with NumPy index arithmetic, and the resulting edges are streamed to Postgres (binary
+COPY) or to a file, batch by batch.
 """
 
 import numpy as np
 import os
 
 from PostgresConnector import PostgresConnector
-from psycopg2 import IntegrityError
-from psycopg2.extras import execute_values
+from utils import copy_columns_into_table, set_up_logger
 
 
-def load_hyperedges(pc, table_name):
+def load_hyperedges(pc, table_name, block_size=1000000, snapshot=None):
     """
-    Returns the hyperedge list from the Postgres table.
+    Returns the hyperedge list from the Postgres table. The rows are streamed through a server-side cursor, and
+    stored as a compact array instead of a list of tuples.
     :param pc: (PostgresConnector) Object for communication.
     :param table_name: (string) Where to retrieve the values from
-    :return: (list) Tuple values for (edge_id, term_id)
+    :param block_size: (int) Number of rows that are fetched at once.
+    :param snapshot: (Snapshot) If specified, the table is read from the snapshot (see HypergraphSnapshot.py) instead.
+           Note that this copies both columns into a single array in private memory. Use snapshot.hyperedges() to
+           work on the shared memory-mapped columns directly.
+    :return: (np.array) Array of shape (rows, 2) with the values (edge_id, term_id), sorted by edge_id.
+    """
+    if snapshot is not None:
+        return np.column_stack(snapshot.hyperedges(table_name))
+
+    with pc as open_pc:
+        blocks = list(open_pc.stream_blocks("SELECT edge_id, term_id FROM {} ORDER BY edge_id".format(table_name),
+                                            block_size=block_size, dtype=np.int32))
+
+    if not blocks:
+        return np.zeros((0, 2), dtype=np.int32)
+    return np.concatenate(blocks)
+
+
+def stream_hyperedges(pc, table_name, block_size=1000000):
+    """
+    Streams the hyperedge list from the Postgres table in blocks, without ever loading the whole table.
+    Blocks are cut at hyperedge boundaries, so every hyperedge is contained in exactly one block.
+    :param pc: (PostgresConnector) Object for communication.
+    :param table_name: (string) Where to retrieve the values from
+    :param block_size: (int) Number of rows that are fetched at once.
+    :return: (generator) Yields arrays of shape (rows, 2) with the values (edge_id, term_id), sorted by edge_id.
     """
     with pc as open_pc:
-        open_pc.cursor.execute("SELECT * FROM {}".format(table_name))
-        data = open_pc.cursor.fetchall()
+        carry = np.zeros((0, 2), dtype=np.int32)
+        for block in open_pc.stream_blocks("SELECT edge_id, term_id FROM {} ORDER BY edge_id".format(table_name),
+                                           block_size=block_size, dtype=np.int32):
+            block = np.concatenate([carry, block])
+            # the last hyperedge might continue in the next block, so hold it back.
+            cut = np.searchsorted(block[:, 0], block[-1, 0], side="left")
+            carry = block[cut:]
+            if cut > 0:
+                yield block[:cut]
+
+        if len(carry):
+            yield carry
 
-    return data
+
+def split_batches(hyperedges, batch_size=0):
+    """
+    Splits a sorted hyperedge list into batches, without splitting up any hyperedge between two batches.
+    :param hyperedges: (np.array) Array of shape (rows, 2) with the values (edge_id, term_id), sorted by edge_id.
+    :param batch_size: (int) Approximate number of rows per batch. 0 means a single batch.
+    :return: (generator) Yields the batches as arrays of the same structure.
+    """
+    if batch_size == 0:
+        batch_size = max(len(hyperedges), 1)
+
+    start = 0
+    while start < len(hyperedges):
+        end = start + batch_size
+        if end < len(hyperedges):
+            # extend the batch up to the end of the hyperedge it would otherwise split.
+            end = np.searchsorted(hyperedges[:, 0], hyperedges[end - 1, 0], side="right")
+        yield hyperedges[start:end]
+        start = end
 
 
-def generate_dyadic_edges(hyperedges, pc, fn="./data/dyadic_edges.csv", batch_size=0):
+def expand_cliques(hyperedges, symmetric=True):
+    """
+    Expands hyperedges into all pairs of their (distinct) terms. Hyperedges are grouped by their number of terms k,
+    and all hyperedges of the same size are expanded at once with the pair indices of np.triu_indices(k, 1).
+    :param hyperedges: (np.array) Array of shape (rows, 2) with the values (edge_id, term_id), sorted by edge_id.
+    :param symmetric: (boolean) Whether every pair is returned in both directions, which is how they are stored in
+           Postgres. Otherwise, only (smaller_id, larger_id) is returned.
+    :return: (tuple of np.array) Edge IDs, source IDs and target IDs of all pairs, grouped by hyperedge size.
+    """
+    if len(hyperedges) == 0:
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty, empty
+
+    # sort the terms within every hyperedge, and remove duplicates (the same term at several positions).
+    hyperedges = np.unique(hyperedges, axis=0)
+    edge_ids, term_ids = hyperedges[:, 0], hyperedges[:, 1]
+
+    starts = np.flatnonzero(np.r_[True, edge_ids[1:] != edge_ids[:-1]])
+    sizes = np.diff(np.r_[starts, len(edge_ids)])
+
+    edges, sources, targets = [], [], []
+    for size in np.unique(sizes[sizes > 1]):
+        group_starts = starts[sizes == size]
+        rows, columns = np.triu_indices(size, 1)
+        # (number of hyperedges, number of pairs) matrices of positions in term_ids.
+        edges.append(np.repeat(edge_ids[group_starts], len(rows)))
+        sources.append(term_ids[group_starts[:, None] + rows[None, :]].ravel())
+        targets.append(term_ids[group_starts[:, None] + columns[None, :]].ravel())
+
+    if not edges:
+        empty = np.zeros(0, dtype=np.int32)
+        return empty, empty, empty
+
+    edges, sources, targets = np.concatenate(edges), np.concatenate(sources), np.concatenate(targets)
+    if symmetric:
+        return np.r_[edges, edges], np.r_[sources, targets], np.r_[targets, sources]
+    return edges, sources, targets
+
+
+def generate_dyadic_edges(hyperedges, pc, fn=None, batch_size=0, dyadic_table_name="entity_dyadic", logger=None):
     """
     Generates a dyadic edge list from a list of hyperedges.
     Note that this assumes the input hyperedges are in sorted order.
-    :param hyperedges: (list) List of tuples with structure (edge_id, term_id).
-    :param pc: (PostgresConnector) Used for inserting into postgres.
-    :param fn: (string) File name for the edge_list
+    :param hyperedges: (np.array or iterable) Array of shape (rows, 2) with the values (edge_id, term_id), or an
+           iterable of such blocks, e.g. from stream_hyperedges(). Hyperedges must not be split between blocks.
+    :param pc: (PostgresConnector) Used for inserting into postgres. If None, nothing is inserted.
+    :param fn: (string) File name for the edge_list. Files ending in .bin store int32 (source, target) pairs,
+           everything else is written as text. If None, no file is written.
     :param batch_size: (int) If non-zero, after that many elements a file write will be executed, to make sure
            that not too much RAM will be used by the program.
-    :return: ? Not sure yet
+    :param dyadic_table_name: (str) Name of the Postgres table for the dyadic edges.
+    :param logger: (logging.Logger) Logger to report to.
+    :return: (int) Number of generated dyadic edges, i.e. (smaller_id, larger_id) pairs.
     """
+    if logger is None:
+        logger = set_up_logger(__name__, os.path.join(os.path.dirname(__file__), "logs/GenerateDyadicGraph.log"))
 
-    # convenience function, since 0 is easier to input.
-    if batch_size == 0:
-        batch_size = len(hyperedges)
+    if isinstance(hyperedges, np.ndarray):
+        batches = split_batches(hyperedges, batch_size)
+    else:
+        batches = hyperedges
 
     # touch file at the beginning to overwrite, since we are later appending
     # https://stackoverflow.com/questions/2769061/how-to-erase-the-file-contents-of-text-file-in-python
-    open(fn, "w").close()
-
-    # starting edge index
-    curr_id = 1
-
-    start_ind = 0
-    end_ind = batch_size
-
-    while start_ind < len(hyperedges):
-
-        # avoid IndexError. This should only slightly increase the batch_size
-        if not end_ind >= len(hyperedges):
-            # correct break so that no edge gets split up by overlapping two batches.
-            while hyperedges[end_ind][1] == hyperedges[end_ind+1][1]:
-                end_ind += 1
-                # further way to avoid error...
-                if end_ind == len(hyperedges):
-                    break
-
-        edges, curr_id = handle_batch(hyperedges[start_ind:end_ind], curr_id)
-        # append_edges(edges, fn)
-        start_ind = end_ind
-        end_ind += batch_size
-
-
-def handle_batch(hyper_batch, curr_id):
-    """
-    What should be done within one iteration happens here.
-    :param hyper_batch: (list) List of batch_size tuples of structure (edge_id, term_id)
-    :param curr_id: (int) First identifier in this batch. Relevant if more than one batch to continue properly.
-    :return: Returns list of generated dyadic edges
-    """
-    edge_dict = []
-    postgres_dict = []
-    expected_size = 0
-    curr_hyperedge = []
-    for i, edge in enumerate(hyper_batch):
-
-        # edge is over. Actually append all the combinations.
-        if curr_id != edge[0]:
-            # generate
-            edge_set, postgres_set = explode_hyperedge(curr_hyperedge, curr_id)
-            edge_dict.extend(edge_set)
-            postgres_dict.extend(postgres_set)
-            expected_size += gaus(len(curr_hyperedge)-1)
-            # also reset
-            curr_id = edge[0]
-            curr_hyperedge = [edge[1]]
-
-        # just add this to the current hyperedge.
-        else:
-            curr_hyperedge.append(edge[1])
+    if fn is not None:
+        open(fn, "w").close()
+    if pc is not None:
+        with pc as open_pc:
+            create_table(open_pc, dyadic_table_name)
+
+    num_edges = 0
+    for batch in batches:
+        # the file only stores (smaller_id, larger_id), Postgres stores both directions.
+        edges, sources, targets = expand_cliques(batch, symmetric=False)
+        num_edges += len(edges)
 
-    if expected_size != len(edge_dict):
-        raise ValueError("Size mismatch between theoretical prediction and actual length!")
+        if pc is not None:
+            insert_edges((np.r_[edges, edges], np.r_[sources, targets], np.r_[targets, sources]), pc,
+                         dyadic_table_name, logger)
+        if fn is not None:
+            append_edges(sources, targets, fn)
 
-    insert_edges(postgres_dict, pc)
+        logger.info("Generated {} dyadic edges so far.".format(num_edges))
 
-    return edge_dict, curr_id
+    return num_edges
 
 
-def explode_hyperedge(hyperedge, hyperedge_id):
+def create_table(open_pc, dyadic_table_name="entity_dyadic"):
     """
-    Takes a hyperedge set, and generates all the dyadic connections for a similar regular edge.
-    :param hyperedge: (list) List of participating terms.
-    :param hyperedge_id: (int) Identifier for the hyperedge, used for postgres.
-    :return: (list) List of connection tuples
+    Creates the table for the dyadic edges, if it does not exist yet.
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :param dyadic_table_name: (str)
+    :return: None
     """
+    if not check_table(open_pc, dyadic_table_name):
+        open_pc.cursor.execute("CREATE TABLE {} ( edge_id integer, source_id integer, target_id integer, "
+                               "PRIMARY KEY (edge_id, source_id, target_id), "
+                               "FOREIGN KEY (source_id) REFERENCES terms (term_id),"
+                               "FOREIGN KEY (target_id) REFERENCES terms (term_id)"
+                               "ON DELETE CASCADE)".format(dyadic_table_name))
 
-    # We'll sort, so we have a clear idea of how many of the same edge we have, since it will always be
-    # of the form (smaller_id, larger_id).
-    hyperedge = sorted(hyperedge)
-    edge_set = []
-    postgres_set = []
-    # essentially build connections to all "vertices after". This guarantees we don't do edges twice.
-    for i, _ in enumerate(hyperedge):
-        for j in range(i+1, len(hyperedge)):
-            edge_set.append((hyperedge[i], hyperedge[j]))
-            # postgres performs better with duplicate edges, so we manually correct this here
-            postgres_set.append((hyperedge_id, hyperedge[i], hyperedge[j]))
-            postgres_set.append((hyperedge_id, hyperedge[j], hyperedge[i]))
-
-    return edge_set, postgres_set
 
-
-def insert_edges(postgres_set, pc, dyadic_table_name="entity_dyadic"):
+def insert_edges(columns, pc, dyadic_table_name="entity_dyadic", logger=None):
     """
-    Inserts a batch of dyadic edges into a postgres table.
-    :param postgres_set: (list of tuples) Form of (id, source, target)
+    Inserts a batch of dyadic edges into a postgres table via binary COPY.
+    :param columns: (tuple of np.array) Edge IDs, source IDs and target IDs.
     :param pc: (PostgresConnector)
     :param dyadic_table_name: (str)
-    :return: None
+    :param logger: (logging.Logger) Logger to report to.
+    :return: (int) 1 if successful, 0 otherwise.
     """
     with pc as open_pc:
-        if not check_table(open_pc, dyadic_table_name):
-            open_pc.cursor.execute("CREATE TABLE {} ( edge_id integer, source_id integer, target_id integer, "
-                                   "PRIMARY KEY (edge_id, source_id, target_id), "
-                                   "FOREIGN KEY (source_id) REFERENCES terms (term_id),"
-                                   "FOREIGN KEY (target_id) REFERENCES terms (term_id)"
-                                   "ON DELETE CASCADE)".format(dyadic_table_name))
-
-        try:
-            execute_values(open_pc.cursor,
-                           "INSERT INTO {} (edge_id, source_id, target_id) VALUES %s".format(dyadic_table_name),
-                           postgres_set)
-
-        except IntegrityError as err:
-            print("Values with previously inserted primary key detected!\n {}".format(err))
-
-    return 0
+        return copy_columns_into_table(open_pc, dyadic_table_name, "edge_id, source_id, target_id", columns, logger)
 
 
 def check_table(connector, table_name):
@@ -164,32 +205,25 @@ def check_table(connector, table_name):
     return connector.cursor.fetchone()[0]
 
 
-def gaus(n):
-    return n * (n + 1) / 2
-
-
-def append_edges(edges, fn):
+def append_edges(sources, targets, fn):
     """
     Writes them to a file. Appending, since it is done in batches.
-    :param edges: (list) list of edges, still including duplicates
-    :param fn: (string) File name.
+    :param sources: (np.array) Source IDs of the edges, still including duplicates
+    :param targets: (np.array) Corresponding target IDs.
+    :param fn: (string) File name. Files ending in .bin are written as raw int32 pairs, others as text.
     :return: (None)
     """
-    # TODO: This creates a bug!
-    # edges = Counter(edges)
-    # edges = np.array([(k[0], k[1], v) for k,v in edges.items()])
-
-    edges = np.array(edges)
+    edges = np.column_stack([sources, targets]).astype(np.int32)
 
     with open(fn, "ab") as f:
-        np.savetxt(f, edges, delimiter=" ", fmt="%i")
+        if fn.endswith(".bin"):
+            edges.tofile(f)
+        else:
+            np.savetxt(f, edges, delimiter=" ", fmt="%i")
 
 
 if __name__ == "__main__":
     pc = PostgresConnector(port=5436)
-    hyperedges = load_hyperedges(pc, "entity_hyperedges")
     folder = os.path.dirname(os.path.abspath(__file__))
-    fn = os.path.join(folder, "data/hyperedges_subset2.csv")
-    generate_dyadic_edges(hyperedges, pc=pc, fn=fn, batch_size=50000)
-    # hyperedges = load_hyperedges(pc, "entity_hyperedges")
-    # generate_dyadic_edges(hyperedges, fn="./data/dyadic_edges.csv", batch_size=0)
+    fn = os.path.join(folder, "data/hyperedges_subset2.bin")
+    generate_dyadic_edges(stream_hyperedges(pc, "entity_hyperedges"), pc=pc, fn=fn)
@@ -12,6 +12,7 @@ import argparse
 import logging
 import os
 import sys
+import time
 
 def str2bool(v):
     if v.lower() in ('yes', 'true', 't', 'y', '1'):
@@ -37,6 +38,14 @@ def get_parser():
                       help="Whether or not only entities should be processed.")
     args.add_argument("-w", "--window-size", type=int, default=2,
                       help="The window size for the processed documents.")
+    args.add_argument("--window-sizes", type=int, nargs="+", default=None,
+                      help="Generates the tables for all given window sizes in a single pass. Overrides --window-size.")
+    args.add_argument("--engine", type=str, default="sql", choices=["naive", "sql", "streaming"],
+                      help="Which engine to use for generating the hyperedges.")
+    args.add_argument("-i", "--incremental", type=str2bool, nargs="?", const=True, default=False,
+                      help="Only append hyperedges for documents that do not have any yet.")
+    args.add_argument("-c", "--cooccurrence", type=str2bool, nargs="?", const=True, default=False,
+                      help="Additionally build the aggregated co-occurrence matrix tables.")
 
     parsed = args.parse_args()
     return parsed
@@ -48,6 +57,8 @@ class SchemaCreator:
                  prefix="entity",
                  window_size=2,
                  entities_only=True,
+                 engine="sql",
+                 incremental=False,
                  port=5436,
                  log_file=os.path.join(os.path.dirname(__file__), "logs/SchemaCreator.log"),
                  log_level=logging.INFO,
@@ -56,6 +67,10 @@ class SchemaCreator:
         """
         Set up.
         :param prefix: (str) Prefix to the table names.
+        :param window_size: (int) Window size of the generated hyperedges.
+        :param entities_only: (boolean) Whether or not only entities are considered for the hyperedges.
+        :param engine: (str) Engine used to generate the hyperedges, see HyperedgeGenerator.create_edges().
+        :param incremental: (boolean) Whether to only append hyperedges for documents that do not have any yet.
         :param port: (int) Used to connect to the Postgres tables.
         :param log_file: (os.path) Path to the file containing the logs.
         :param log_level: (logging.LEVEL) Specifies the level to be logged.
@@ -63,8 +78,11 @@ class SchemaCreator:
         """
         self.logger = set_up_logger(__name__, log_file, log_level, log_verbose)
         self.window_size = window_size
+        self.base_prefix = prefix
         self.prefix = prefix + "_" + str(self.window_size)
         self.entities_only = entities_only
+        self.engine = engine
+        self.incremental = incremental
         self.names = self.get_names(self.prefix)
         self.port = port
         self.pc = PostgresConnector(port=port)
@@ -80,13 +98,161 @@ class SchemaCreator:
 
     def create(self):
         """
+        Creates the hyperedge tables for the window size specified at initialization, and fills them.
+        :return: (None)
+        """
+        self.create_tables(self.prefix, self.names)
 
-        :return:
+        hg = HyperedgeGenerator(entities_only=self.entities_only,
+                                incremental=self.incremental,
+                                window_size=self.window_size,
+                                hyperedge_table_name=self.names[0],
+                                hyperedge_document_table_name=self.names[1],
+                                hyperedge_sentence_table_name=self.names[2], port=self.port)
+        hg.create_edges(self.engine)
+
+    def create_multiple(self, window_sizes, batch_size=50000, itersize=20000):
+        """
+        Creates and fills the hyperedge tables for several window sizes at once. Instead of re-scanning the sentences
+        and term occurrences for every window size, the documents are streamed only once (see
+        HyperedgeGenerator.stream_documents()), and the edges of each document are generated for all window sizes.
+        This always uses the sliding window approach, independent of the specified engine. In incremental mode, the
+        new documents are determined from the tables of the first window size, which assumes that all tables are
+        in sync.
+        :param window_sizes: (list) Window sizes for which tables should be generated.
+        :param batch_size: (int) Number of hyper edges per window size after which rows are copied into Postgres.
+        :param itersize: (int) Number of rows fetched from the server-side cursors at once.
+        :return: (None)
         """
-        self.logger.info("Starting to create new {} hyperedge tables.".format(self.prefix))
+        generators = []
+        for window_size in window_sizes:
+            prefix = self.base_prefix + "_" + str(window_size)
+            names = self.get_names(prefix)
+            self.create_tables(prefix, names)
+
+            generators.append(HyperedgeGenerator(entities_only=self.entities_only,
+                                                 incremental=self.incremental,
+                                                 window_size=window_size,
+                                                 hyperedge_table_name=names[0],
+                                                 hyperedge_document_table_name=names[1],
+                                                 hyperedge_sentence_table_name=names[2], port=self.port))
+
+        self.logger.info("Starting to generate hyperedges for window sizes {} in a single pass..."
+                         .format(", ".join([str(el) for el in window_sizes])))
+        start_time = time.time()
+
+        with self.pc as open_pc:
+            for i, (document_id, sentence_ids, terms) in enumerate(generators[0].stream_documents(open_pc, itersize)):
+                for hg in generators:
+                    hg.add_document_edges(document_id, sentence_ids, terms)
+                    if len(hg.hyperedge_document) >= batch_size:
+                        hg.flush_edges(open_pc)
+
+                if i % 100000 == 0 and i != 0:
+                    self.logger.info("Processed {} documents so far.".format(i))
+
+            for hg in generators:
+                hg.flush_edges(open_pc)
+
+        end_time = time.time()
+        self.logger.info("Successfully generated hyperedges for all window sizes in {:.4f} s."
+                         .format(end_time - start_time))
+
+    def create_cooccurrence_matrices(self, window_sizes):
+        """
+        Builds the aggregated co-occurrence matrix for several window sizes, see create_cooccurrence_matrix().
+        :param window_sizes: (list) Window sizes whose hyperedge tables should be aggregated.
+        :return: (None)
+        """
+        for window_size in window_sizes:
+            self.create_cooccurrence_matrix(self.base_prefix + "_" + str(window_size))
+
+    def create_cooccurrence_matrix(self, prefix, watermark_table_name="cooccurrence_watermarks"):
+        """
+        Aggregates a hyperedge table into a weighted co-occurrence matrix with rows (source_id, target_id, weight),
+        where the weight is the number of term pairs in common hyperedges, i.e. the same as COUNT(*) on the dyadic
+        table. The table is clustered on its primary key, so all co-occurrences of a term can be retrieved with a
+        single index range scan.
+        In incremental mode, only hyperedges with a larger edge ID than the last aggregated one are added to the
+        existing weights.
+        :param prefix: (str) Prefix of the hyperedge table, e.g. "entity_2".
+        :param watermark_table_name: (str) Name of the table that stores the last aggregated edge ID per matrix.
+        :return: (None)
+        """
+        hyperedge_table_name = prefix + "_hyperedges"
+        matrix_table_name = prefix + "_cooccurrence"
+        self.logger.info("Starting to build co-occurrence matrix {}...".format(matrix_table_name))
+        start_time = time.time()
+
+        with self.pc as open_pc:
+            if not check_table_existence(self.logger, open_pc, hyperedge_table_name):
+                self.logger.error("No hyperedge table {} found!".format(hyperedge_table_name))
+                return
+            open_pc.cursor.execute("CREATE TABLE IF NOT EXISTS {} (table_name text PRIMARY KEY, last_edge_id integer)"
+                                   .format(watermark_table_name))
+
+            rebuild = True
+            if self.incremental and check_table_existence(self.logger, open_pc, matrix_table_name):
+                open_pc.cursor.execute("SELECT last_edge_id FROM {} WHERE table_name = %s"
+                                       .format(watermark_table_name), (matrix_table_name,))
+                row = open_pc.cursor.fetchone()
+                if row is not None:
+                    last_edge_id = row[0]
+                    rebuild = False
+                else:
+                    # without a watermark, it is unknown which edges are already counted.
+                    self.logger.warning("No watermark found for {}. Rebuilding it...".format(matrix_table_name))
+
+            if rebuild:
+                open_pc.cursor.execute("DROP TABLE IF EXISTS {}".format(matrix_table_name))
+                open_pc.cursor.execute("CREATE TABLE {} ( "
+                                       "source_id integer, "
+                                       "target_id integer, "
+                                       "weight integer, "
+                                       "PRIMARY KEY (source_id, target_id)"
+                                       ");".format(matrix_table_name))
+                last_edge_id = 0
+
+            # fix the upper bound, so that concurrently added edges are not counted twice later on.
+            open_pc.cursor.execute("SELECT COALESCE(MAX(edge_id), 0) FROM {}".format(hyperedge_table_name))
+            max_edge_id = open_pc.cursor.fetchone()[0]
+            if max_edge_id <= last_edge_id:
+                self.logger.info("No new hyperedges found for {}.".format(matrix_table_name))
+                return
+
+            open_pc.cursor.execute("INSERT INTO {matrix} (source_id, target_id, weight) "
+                                   "SELECT eh1.term_id, eh2.term_id, COUNT(*) FROM {edges} as eh1, {edges} as eh2 "
+                                   "WHERE eh1.edge_id = eh2.edge_id AND eh1.term_id != eh2.term_id "
+                                   "AND eh1.edge_id > %s AND eh1.edge_id <= %s "
+                                   "GROUP BY eh1.term_id, eh2.term_id "
+                                   "ON CONFLICT (source_id, target_id) "
+                                   "DO UPDATE SET weight = {matrix}.weight + EXCLUDED.weight"
+                                   .format(matrix=matrix_table_name, edges=hyperedge_table_name),
+                                   (last_edge_id, max_edge_id))
+            open_pc.cursor.execute("INSERT INTO {} (table_name, last_edge_id) VALUES (%s, %s) "
+                                   "ON CONFLICT (table_name) DO UPDATE SET last_edge_id = EXCLUDED.last_edge_id"
+                                   .format(watermark_table_name), (matrix_table_name, max_edge_id))
+
+            # incremental additions are appended to the end; the physical order is only restored on a rebuild.
+            if rebuild:
+                open_pc.cursor.execute("CLUSTER {} USING {}_pkey".format(matrix_table_name, matrix_table_name))
+            open_pc.cursor.execute("ANALYZE {}".format(matrix_table_name))
+
+        end_time = time.time()
+        self.logger.info("Successfully built co-occurrence matrix {} in {:.4f} s."
+                         .format(matrix_table_name, end_time - start_time))
+
+    def create_tables(self, prefix, names):
+        """
+        Creates the hyperedge tables, if they do not exist yet.
+        :param prefix: (str) Prefix of the table names, used for logging.
+        :param names: (list) Names of the hyperedge, hyperedge document and hyperedge sentence tables.
+        :return: (None)
+        """
+        self.logger.info("Starting to create new {} hyperedge tables.".format(prefix))
         with self.pc as open_pc:
             # create hyperedge table
-            if not check_table_existence(self.logger, open_pc, self.names[0]):
+            if not check_table_existence(self.logger, open_pc, names[0]):
                 self.logger.info("No hyperedge table found. Creating new one...")
                 open_pc.cursor.execute("CREATE TABLE {} ( "
                                        "edge_id integer, "
@@ -94,18 +260,18 @@ class SchemaCreator:
                                        "pos integer, "
                                        "PRIMARY KEY (edge_id, term_id, pos), "
                                        "FOREIGN KEY (term_id) REFERENCES terms(term_id) ON DELETE CASCADE"
-                                       ");".format(self.names[0]))
+                                       ");".format(names[0]))
 
-            if not check_table_existence(self.logger, open_pc, self.names[1]):
+            if not check_table_existence(self.logger, open_pc, names[1]):
                 self.logger.info("No hyperedge document table found. Creating new one...")
                 open_pc.cursor.execute("CREATE TABLE {} ( "
                                        "edge_id integer, "
                                        "document_id integer, "
                                        "PRIMARY KEY (edge_id, document_id), "
                                        "FOREIGN KEY (document_id) REFERENCES documents (document_id) ON DELETE CASCADE"
-                                       ");".format(self.names[1]))
+                                       ");".format(names[1]))
 
-            if not check_table_existence(self.logger, open_pc, self.names[2]):
+            if not check_table_existence(self.logger, open_pc, names[2]):
                 self.logger.info("No hyperedge sentence table found. Creating new one...")
                 open_pc.cursor.execute("CREATE TABLE {} ( "
                                        "edge_id integer, "
@@ -115,20 +281,20 @@ class SchemaCreator:
                                        "PRIMARY KEY (edge_id, document_id, sentence_id, pos), "
                                        "FOREIGN KEY (document_id, sentence_id) "
                                        "REFERENCES sentences (document_id, sentence_id) "
-                                       "ON DELETE CASCADE);".format(self.names[2]))
-
-        hg = HyperedgeGenerator(entities_only=self.entities_only,
-                                window_size=self.window_size,
-                                hyperedge_table_name=self.names[0],
-                                hyperedge_document_table_name=self.names[1],
-                                hyperedge_sentence_table_name=self.names[2], port=self.port)
-        hg.create_edges_naively()
+                                       "ON DELETE CASCADE);".format(names[2]))
 
 
 if __name__ == "__main__":
     args = get_parser()
-    print(args.prefix, args.window_size, args.entities_only)
+    print(args.prefix, args.window_sizes or args.window_size, args.entities_only)
     sys.stdout.flush()
-    sc = SchemaCreator(prefix=args.prefix, window_size=args.window_size, entities_only=args.entities_only, port=args.port)
-    sc.create()
+    sc = SchemaCreator(prefix=args.prefix, window_size=args.window_size, entities_only=args.entities_only,
+                       engine=args.engine, incremental=args.incremental, port=args.port)
+    if args.window_sizes:
+        sc.create_multiple(args.window_sizes)
+    else:
+        sc.create()
+
+    if args.cooccurrence:
+        sc.create_cooccurrence_matrices(args.window_sizes or [args.window_size])
 
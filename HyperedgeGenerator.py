@@ -13,6 +13,8 @@ from utils import set_up_logger, check_table_existence, insert_into_table
 import logging
 import os
 import time
+import itertools as itt
+from collections import deque
 
 
 class HyperedgeGenerator:
@@ -20,6 +22,7 @@ class HyperedgeGenerator:
                  window_size=2,
                  limit_edges=False,
                  entities_only=False,
+                 incremental=False,
                  document_table_name="documents",
                  sentence_table_name="sentences",
                  entity_table_name="entities",
@@ -47,6 +50,8 @@ class HyperedgeGenerator:
                only be useful in context with other theoretical results.
         :param entities_only: (boolean) Indicating whether or not we should only take into account entity terms,
                and not the entirety of all term occurrences for the edges.
+        :param incremental: (boolean) If set, hyper edges are only generated for documents that do not have any yet,
+               and appended to the existing ones.
         :param document_table_name: (str) Name of the table where documents are stored.
         :param sentence_table_name: (str) Name of the table containing the sentences and their content.
         :param entity_table_name: (str) Name of the table containing the entity information and their properties.
@@ -75,6 +80,7 @@ class HyperedgeGenerator:
         self.window_size = window_size
         self.limit_edges = limit_edges
         self.entities_only = entities_only
+        self.incremental = incremental
 
         # table names
         self.document_table_name = document_table_name
@@ -101,13 +107,31 @@ class HyperedgeGenerator:
 
         # set up the "hyper edge ID counter", which is simply consecutive from 1.
         with self.pc as open_pc:
-            if not check_table_existence(self.logger, open_pc, self.hyperedge_table_name):
+            if not check_table_existence(self.logger, open_pc, self.hyperedge_document_table_name):
                 return 0
 
             self.logger.info("Retrieving current hyper edge ID key...")
-            open_pc.cursor.execute("SELECT COUNT(DISTINCT h.edge_id) FROM {} as h".format(self.hyperedge_table_name))
-            # either start with 1 or get the current maximum
-            self.hyperedge_ID = max(1, open_pc.cursor.fetchone()[0])
+            # every edge has a document, even if it does not contain any terms.
+            open_pc.cursor.execute("SELECT COALESCE(MAX(hd.edge_id), 0) + 1 FROM {} as hd"
+                                   .format(self.hyperedge_document_table_name))
+            # either start with 1 or continue after the current maximum
+            self.hyperedge_ID = open_pc.cursor.fetchone()[0]
+
+    def create_edges(self, engine="sql"):
+        """
+        Creates all hyper edges with the specified engine.
+        :param engine: (str) One of "naive" (two queries per sentence, see create_edges_naively()), "sql"
+               (set-based on the server, see create_edges_sql()), or "streaming" (single scan with a sliding window,
+               see create_edges_streaming()).
+        :return: (None) Fills the hyper edge tables in Postgres.
+        """
+        engines = {"naive": self.create_edges_naively,
+                   "sql": self.create_edges_sql,
+                   "streaming": self.create_edges_streaming}
+        if engine not in engines:
+            raise ValueError("Unknown engine {}! Must be one of {}.".format(engine, ", ".join(engines.keys())))
+
+        return engines[engine]()
 
     def create_edges_naively(self):
         """
@@ -117,30 +141,219 @@ class HyperedgeGenerator:
 
         self.logger.info("Starting to generate hyperedges...")
         start_time = time.time()
-        sentences = self.get_sentences()
-
         with self.pc as open_pc:
+            # the sentences are streamed, so only the number of sentences is known upfront.
+            open_pc.cursor.execute("SELECT COUNT(*) FROM {} as s WHERE {}"
+                                   .format(self.sentence_table_name, self.new_documents_condition("s")))
+            num_sentences = open_pc.cursor.fetchone()[0]
+
             # now create a hyperedge for every sentence
-            for i, row in enumerate(sentences):
+            for i, row in enumerate(self.get_sentences()):
                 # enable "batching"
-                if i % int(len(sentences)/5) == 0 and i != 0:
-                    self.logger.info("Done with {:.2f}% of hyperedges.".format(i*100 / len(sentences)))
+                if i % max(int(num_sentences/5), 1) == 0 and i != 0:
+                    self.logger.info("Done with {:.2f}% of hyperedges.".format(i*100 / num_sentences))
                     self.insert_edges_naively(open_pc)
 
                 self.generate_everything_from_sentence(row, open_pc)
 
             # final commit if something is left to commit.
             if self.hyperedge:
-                self.logger.info("Done with {:.2f}% of hyperedges.".format(i * 100 / len(sentences)))
+                self.logger.info("Done with {:.2f}% of hyperedges.".format(100))
                 self.insert_edges_naively(open_pc)
 
         end_time = time.time()
         self.logger.info("Successfully generated all hyper edges in {:.4f} s.".format(end_time - start_time))
 
-    def get_sentences(self):
+    def create_edges_sql(self):
+        """
+        Set-based alternative to create_edges_naively(), which generates all hyper edges directly on the server,
+        with a single INSERT ... SELECT per hyper edge table instead of two queries per sentence.
+        Every sentence is the center of exactly one hyper edge, and edge IDs are handed out consecutively in order of
+        (document_id, sentence_id), starting from the current hyper edge ID. The output is identical to the naive
+        approach, which follows the same (physical) order of the sentence table.
+        :return: (None) Fills the hyper edge tables in Postgres.
         """
+        self.logger.info("Starting to generate hyperedges via SQL...")
+        start_time = time.time()
 
-        :return:
+        with self.pc as open_pc:
+            if not (check_table_existence(self.logger, open_pc, self.hyperedge_table_name) and
+                    check_table_existence(self.logger, open_pc, self.hyperedge_sentence_table_name) and
+                    check_table_existence(self.logger, open_pc, self.hyperedge_document_table_name)):
+                return 0
+            self.logger.info("Found all relevant hyper edge tables.")
+
+            # one hyper edge per sentence, numbered consecutively. This is materialized once, since all three tables
+            # depend on it (and in incremental mode, the new documents are no longer new after the first insert).
+            params = {"start": self.hyperedge_ID, "window": self.window_size}
+            open_pc.cursor.execute("CREATE TEMPORARY TABLE hyperedge_centers ON COMMIT DROP AS "
+                                   "SELECT ROW_NUMBER() OVER (ORDER BY s.document_id, s.sentence_id) + %(start)s - 1 "
+                                   "AS edge_id, s.document_id, s.sentence_id FROM {} as s WHERE {}"
+                                   .format(self.sentence_table_name, self.new_documents_condition("s")),
+                                   params)
+            # every sentence produces exactly one edge, so this is the number of new edges.
+            num_edges = open_pc.cursor.rowcount
+            open_pc.cursor.execute("ANALYZE hyperedge_centers")
+
+            self.logger.info("Inserting into {}...".format(self.hyperedge_table_name))
+            if not self.entities_only:
+                query = "INSERT INTO {} ({}) " \
+                        "SELECT e.edge_id, toc.term_id, toc.sentence_id - e.sentence_id " \
+                        "FROM hyperedge_centers as e, {} as toc " \
+                        "WHERE toc.document_id = e.document_id " \
+                        "AND toc.sentence_id BETWEEN e.sentence_id - %(window)s AND e.sentence_id + %(window)s" \
+                        .format(self.hyperedge_table_name,
+                                self.hyperedge_format,
+                                self.term_occurrence_table_name)
+            else:
+                query = "INSERT INTO {} ({}) " \
+                        "SELECT e.edge_id, toc.term_id, toc.sentence_id - e.sentence_id " \
+                        "FROM hyperedge_centers as e, {} as toc, {} as t " \
+                        "WHERE toc.document_id = e.document_id AND toc.term_id = t.term_id AND t.is_entity = true " \
+                        "AND toc.sentence_id BETWEEN e.sentence_id - %(window)s AND e.sentence_id + %(window)s" \
+                        .format(self.hyperedge_table_name,
+                                self.hyperedge_format,
+                                self.term_occurrence_table_name,
+                                self.term_table_name)
+            open_pc.cursor.execute(query, params)
+
+            self.logger.info("Inserting into {}...".format(self.hyperedge_document_table_name))
+            open_pc.cursor.execute("INSERT INTO {} ({}) SELECT e.edge_id, e.document_id FROM hyperedge_centers as e"
+                                   .format(self.hyperedge_document_table_name, self.hyperedge_document_format))
+
+            self.logger.info("Inserting into {}...".format(self.hyperedge_sentence_table_name))
+            query = "INSERT INTO {} ({}) " \
+                    "SELECT e.edge_id, sen.document_id, sen.sentence_id, sen.sentence_id - e.sentence_id " \
+                    "FROM hyperedge_centers as e, {} as sen WHERE sen.document_id = e.document_id " \
+                    "AND sen.sentence_id BETWEEN e.sentence_id - %(window)s AND e.sentence_id + %(window)s" \
+                    .format(self.hyperedge_sentence_table_name,
+                            self.hyperedge_sentence_format,
+                            self.sentence_table_name)
+            open_pc.cursor.execute(query, params)
+
+        self.hyperedge_ID += num_edges
+
+        end_time = time.time()
+        self.logger.info("Successfully generated {} hyper edges in {:.4f} s.".format(num_edges, end_time - start_time))
+
+    def create_edges_streaming(self, batch_size=50000, itersize=20000):
+        """
+        Creates all hyper edges with a single sorted scan over the sentences and term occurrences. Both are streamed
+        via server-side cursors, and the edges of each document are generated locally by sliding a window over its
+        sentences (see sliding_window()), instead of querying the window for every sentence. Edge IDs are assigned in
+        order of (document_id, sentence_id), like in create_edges_sql().
+        :param batch_size: (int) Number of hyper edges after which the generated rows are copied into Postgres.
+        :param itersize: (int) Number of rows fetched from the server-side cursors at once.
+        :return: (None) Fills the hyper edge tables in Postgres.
+        """
+        self.logger.info("Starting to generate hyperedges with a sliding window...")
+        start_time = time.time()
+
+        with self.pc as open_pc:
+            if not (check_table_existence(self.logger, open_pc, self.hyperedge_table_name) and
+                    check_table_existence(self.logger, open_pc, self.hyperedge_sentence_table_name) and
+                    check_table_existence(self.logger, open_pc, self.hyperedge_document_table_name)):
+                return 0
+            self.logger.info("Found all relevant hyper edge tables.")
+
+            num_edges = 0
+            for document_id, sentence_ids, terms in self.stream_documents(open_pc, itersize):
+                num_edges += self.add_document_edges(document_id, sentence_ids, terms)
+
+                if len(self.hyperedge_document) >= batch_size:
+                    self.logger.info("Generated {} hyper edges so far.".format(num_edges))
+                    self.flush_edges(open_pc)
+
+            self.flush_edges(open_pc)
+
+        end_time = time.time()
+        self.logger.info("Successfully generated {} hyper edges in {:.4f} s.".format(num_edges, end_time - start_time))
+
+    def stream_documents(self, open_pc, itersize=20000):
+        """
+        Streams the sentences and term occurrences, grouped by document. Both are read through named (server-side)
+        cursors in order of (document_id, sentence_id), so only a single document is held in memory at a time.
+        :param open_pc: (PostgresConnector) Connector with an open connection.
+        :param itersize: (int) Number of rows fetched from the server-side cursors at once.
+        :return: (generator) Yields (document_id, sentence_ids, terms), see iterate_documents().
+        """
+        sentences = open_pc.stream("SELECT s.document_id, s.sentence_id FROM {} as s WHERE {} "
+                                   "ORDER BY s.document_id, s.sentence_id"
+                                   .format(self.sentence_table_name, self.new_documents_condition("s")),
+                                   itersize=itersize)
+
+        if not self.entities_only:
+            occurrences = open_pc.stream("SELECT toc.document_id, toc.sentence_id, toc.term_id FROM {} as toc "
+                                         "WHERE {} ORDER BY toc.document_id, toc.sentence_id"
+                                         .format(self.term_occurrence_table_name,
+                                                 self.new_documents_condition("toc")),
+                                         itersize=itersize)
+        else:
+            occurrences = open_pc.stream("SELECT toc.document_id, toc.sentence_id, toc.term_id FROM {} as toc, {} as t "
+                                         "WHERE toc.term_id = t.term_id AND t.is_entity = true AND {} "
+                                         "ORDER BY toc.document_id, toc.sentence_id"
+                                         .format(self.term_occurrence_table_name, self.term_table_name,
+                                                 self.new_documents_condition("toc")),
+                                         itersize=itersize)
+
+        try:
+            for document in iterate_documents(sentences, occurrences):
+                yield document
+        finally:
+            sentences.close()
+            occurrences.close()
+
+    def add_document_edges(self, document_id, sentence_ids, terms):
+        """
+        Generates the hyper edges of a single document and stores the resulting rows, ready for insertion.
+        :param document_id: (int) ID of the document.
+        :param sentence_ids: (list) Sorted sentence IDs of the document.
+        :param terms: (dict) Term IDs per sentence ID.
+        :return: (int) Number of generated hyper edges.
+        """
+        num_edges = 0
+        for center, window in sliding_window(sentence_ids, terms, self.window_size):
+            for sentence_id, sentence_terms in window:
+                pos = sentence_id - center
+                self.all_hyperedges.extend([(self.hyperedge_ID, term_id, pos) for term_id in sentence_terms])
+                self.all_hyperedge_sentences.append((self.hyperedge_ID, document_id, sentence_id, pos))
+            self.hyperedge_document.append((self.hyperedge_ID, document_id))
+
+            self.hyperedge_ID += 1
+            num_edges += 1
+
+        return num_edges
+
+    def flush_edges(self, open_pc):
+        """
+        Copies the rows generated by add_document_edges() into Postgres, and resets the local buffers.
+        :param open_pc: (PostgresConnector) Connector with an open connection.
+        :return: (None)
+        """
+        self.insert_data(open_pc)
+
+        self.all_hyperedges = []
+        self.hyperedge_document = []
+        self.all_hyperedge_sentences = []
+
+    def new_documents_condition(self, alias):
+        """
+        SQL condition restricting to the documents that do not have any hyper edges yet. Only used in incremental mode.
+        :param alias: (str) Alias of the table whose document_id is checked.
+        :return: (str) Condition to be used in a WHERE clause. Always true outside of incremental mode.
+        """
+        if not self.incremental:
+            return "TRUE"
+
+        return "NOT EXISTS (SELECT 1 FROM {} as hd WHERE hd.document_id = {}.document_id)"\
+            .format(self.hyperedge_document_table_name, alias)
+
+    def get_sentences(self, itersize=20000):
+        """
+        Streams the (document_id, sentence_id) pairs of all relevant sentences through a server-side cursor.
+        Nested in an open context of self.pc, the same connection is used.
+        :param itersize: (int) Number of rows fetched from the server at once.
+        :return: (generator) Yields (document_id, sentence_id) tuples.
         """
         # iterate over every possible sentence
         with self.pc as open_pc:
@@ -148,12 +361,9 @@ class HyperedgeGenerator:
                 return 0
             self.logger.info("Found {} table.".format(self.sentence_table_name))
 
-            open_pc.cursor.execute("SELECT s.document_id, s.sentence_id FROM {} as s"
-                                   .format(self.sentence_table_name))
-            # TODO: Do we need the .fetchall() at all, or here, too?
-            sentences = list(open_pc.cursor)
-
-        return sentences
+            yield from open_pc.stream("SELECT s.document_id, s.sentence_id FROM {} as s WHERE {}"
+                                      .format(self.sentence_table_name, self.new_documents_condition("s")),
+                                      itersize=itersize)
 
     def generate_everything_from_sentence(self, row, open_pc):
         """
@@ -241,17 +451,18 @@ class HyperedgeGenerator:
             self.hyperedge_ID += 1
 
     def insert_data(self, open_pc):
+        # all hyper edge tables are purely integer-valued, so we can use the binary COPY format.
         # start with the pure hyper edges
         insert_into_table(open_pc, self.hyperedge_table_name, self.hyperedge_format,
-                          self.all_hyperedges, self.logger)
+                          self.all_hyperedges, self.logger, binary=True)
 
         # next are documents
         insert_into_table(open_pc, self.hyperedge_document_table_name, self.hyperedge_document_format,
-                          self.hyperedge_document, self.logger)
+                          self.hyperedge_document, self.logger, binary=True)
 
         # and lastly the sentences
         insert_into_table(open_pc, self.hyperedge_sentence_table_name, self.hyperedge_sentence_format,
-                          self.all_hyperedge_sentences, self.logger)
+                          self.all_hyperedge_sentences, self.logger, binary=True)
 
     def clear_table(self, table_name):
         """
@@ -280,8 +491,60 @@ class HyperedgeGenerator:
         self.clear_table(self.hyperedge_table_name)
 
 
+def iterate_documents(sentences, occurrences):
+    """
+    Merge-joins sentences and term occurrences into one group per document.
+    Both inputs have to be sorted by (document_id, sentence_id).
+    :param sentences: (iterable) Tuples of (document_id, sentence_id).
+    :param occurrences: (iterable) Tuples of (document_id, sentence_id, term_id).
+    :return: (generator) Yields (document_id, sentence_ids, terms), where sentence_ids is the sorted list of sentences
+             in the document, and terms maps each sentence ID to the list of its term IDs.
+    """
+    occurrences = iter(occurrences)
+    current = next(occurrences, None)
+
+    for document_id, group in itt.groupby(sentences, key=lambda row: row[0]):
+        sentence_ids = [row[1] for row in group]
+
+        # occurrences without a corresponding sentence can not be part of any hyper edge.
+        while current is not None and current[0] < document_id:
+            current = next(occurrences, None)
+
+        terms = {}
+        while current is not None and current[0] == document_id:
+            terms.setdefault(current[1], []).append(current[2])
+            current = next(occurrences, None)
+
+        yield document_id, sentence_ids, terms
+
+
+def sliding_window(sentence_ids, terms, window_size):
+    """
+    Slides a window of window_size sentences in each direction over the sentences of a single document.
+    Every sentence is the center of one window, which contains all sentences with an ID between
+    center - window_size and center + window_size.
+    :param sentence_ids: (list) Sorted sentence IDs of the document.
+    :param terms: (dict) Term IDs per sentence ID. Sentences without terms may be missing.
+    :param window_size: (int) Number of sentences in each direction.
+    :return: (generator) Yields (center, window), where window is a list of (sentence_id, term_ids) tuples.
+    """
+    window = deque()
+    upcoming = 0
+
+    for center in sentence_ids:
+        # extend the window to the right...
+        while upcoming < len(sentence_ids) and sentence_ids[upcoming] <= center + window_size:
+            window.append((sentence_ids[upcoming], terms.get(sentence_ids[upcoming], [])))
+            upcoming += 1
+        # ...and shrink it from the left.
+        while window[0][0] < center - window_size:
+            window.popleft()
+
+        yield center, list(window)
+
+
 if __name__ == "__main__":
     hg = HyperedgeGenerator()
 
     # hg.clear_all_tables()
-    hg.create_edges_naively()
+    hg.create_edges()
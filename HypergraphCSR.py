@@ -0,0 +1,185 @@
+"""
+Embedded query engine for the Explicit Model. Instead of sending every co-occurrence query to Postgres, a
+{prefix}_{w}_hyperedges table is loaded once into two compressed sparse row (CSR) incidence structures:
+- term -> edges: for every term, the (distinct) hyperedges it occurs in,
+- edge -> terms: for every hyperedge, all of its term occurrences.
+A query then gathers the members of all hyperedges of a term, and counts them with a single np.bincount().
+The results are the same as for the Explicit Model query in Queries.md.
+"""
+
+import numpy as np
+
+
+def build_csr(rows, columns, num_rows):
+    """
+    Builds a CSR structure from a list of (row, column) pairs.
+    :param rows: (np.array) Row index of every entry, in [0, num_rows).
+    :param columns: (np.array) Column value of every entry.
+    :param num_rows: (int) Number of rows.
+    :return: (tuple of np.array) Row pointers of length num_rows + 1, and the column values sorted by row.
+    """
+    order = np.argsort(rows, kind="stable")
+    pointers = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=pointers[1:])
+    return pointers, columns[order].astype(np.int32)
+
+
+def gather_ranges(values, starts, ends):
+    """
+    Concatenates several slices of an array, without a Python loop over the slices.
+    :param values: (np.array) Array to slice.
+    :param starts: (np.array) Start of every slice.
+    :param ends: (np.array) End (exclusive) of every slice.
+    :return: (np.array) Values of all slices.
+    """
+    lengths = ends - starts
+    # position of every gathered value within its slice, added to the start of the slice.
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return values[np.repeat(starts, lengths) + offsets]
+
+
+def gather(pointers, values, rows):
+    """
+    Concatenates the values of several CSR rows.
+    :param pointers: (np.array) Row pointers.
+    :param values: (np.array) Column values.
+    :param rows: (np.array) Rows to gather.
+    :return: (np.array) Values of all given rows.
+    """
+    return gather_ranges(values, pointers[rows], pointers[rows + 1])
+
+
+def top_counts(counts, ranks, limit=None):
+    """
+    Sorts the non-zero entries of a frequency array.
+    :param counts: (np.array) Frequency of every term ID.
+    :param ranks: (np.array) Alphabetical rank of every term ID, to break ties.
+    :param limit: (int) Maximum number of returned terms. All terms are returned if not specified.
+    :return: (tuple of np.array) Term IDs and their frequencies, ordered by descending frequency and term text.
+    """
+    ids = np.flatnonzero(counts)
+    if limit is not None and limit < len(ids):
+        # only the terms with at least the k-th largest frequency have to be sorted.
+        threshold = np.partition(counts[ids], len(ids) - limit)[len(ids) - limit]
+        ids = ids[counts[ids] >= threshold]
+
+    ids = ids[np.lexsort((ranks[ids], -counts[ids]))][:limit]
+    return ids, counts[ids]
+
+
+class HypergraphCSR:
+    def __init__(self, edge_ids, term_ids, term_texts=None, is_entity=None):
+        """
+        Builds the incidence structures from the rows of a hyperedge table.
+        :param edge_ids: (np.array) Edge ID of every row.
+        :param term_ids: (np.array) Term ID of every row. A term may occur several times in the same hyperedge.
+        :param term_texts: (dict) Mapping from term ID to term text. Required to query by text.
+        :param is_entity: (dict) Mapping from term ID to whether the term is an entity. Required for entities_only.
+        """
+        edge_ids = np.asarray(edge_ids)
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+
+        # edge IDs are not necessarily consecutive, so they are mapped to dense indices.
+        self.edge_ids, edge_index = np.unique(edge_ids, return_inverse=True)
+        edge_index = edge_index.astype(np.int32)
+        self.num_terms = int(max(term_ids.max(initial=-1), max(term_texts or [-1])) + 1)
+
+        self.edge_pointers, self.edge_terms = build_csr(edge_index, term_ids, len(self.edge_ids))
+        # only count every hyperedge once per term, as in ANY(ARRAY(...)) of the SQL query.
+        incidences = np.sort((term_ids.astype(np.int64) << 32) | edge_index)
+        incidences = incidences[np.diff(incidences, prepend=-1) != 0]
+        self.term_pointers, self.term_edges = build_csr((incidences >> 32).astype(np.int32),
+                                                        incidences & 0xFFFFFFFF, self.num_terms)
+
+        self.term_texts = np.empty(self.num_terms, dtype=object)
+        self.term_ranks = np.zeros(self.num_terms, dtype=np.int64)
+        self.term_lookup = {}
+        if term_texts is not None:
+            for term_id, text in term_texts.items():
+                self.term_texts[term_id] = text
+                self.term_lookup[text] = term_id
+            # rank of every term in alphabetical order, to break ties in the frequencies.
+            ids = np.fromiter(term_texts.keys(), dtype=np.int64, count=len(term_texts))
+            texts = np.array(list(term_texts.values()), dtype=object)
+            self.term_ranks[ids[np.argsort(texts, kind="stable")]] = np.arange(len(ids))
+
+        self.entities = np.zeros(self.num_terms, dtype=bool)
+        if is_entity is not None:
+            for term_id, entity in is_entity.items():
+                self.entities[term_id] = entity
+
+    @classmethod
+    def from_postgres(cls, pc, hyperedge_table_name="entity_2_hyperedges", term_table_name="terms",
+                      block_size=1000000):
+        """
+        Loads a hyperedge table, as well as the texts of all terms.
+        :param pc: (PostgresConnector) Object for communication.
+        :param hyperedge_table_name: (str) Name of the hyperedge table.
+        :param term_table_name: (str) Name of the term table.
+        :param block_size: (int) Number of rows that are fetched at once.
+        :return: (HypergraphCSR) Query engine for the table.
+        """
+        with pc as open_pc:
+            blocks = list(open_pc.stream_blocks("SELECT edge_id, term_id FROM {}".format(hyperedge_table_name),
+                                                block_size=block_size, dtype=np.int32))
+            term_texts, is_entity = {}, {}
+            for term_id, term_text, entity in open_pc.stream("SELECT term_id, term_text, is_entity FROM {}"
+                                                             .format(term_table_name), itersize=block_size):
+                term_texts[term_id] = term_text
+                is_entity[term_id] = entity
+
+        rows = np.concatenate(blocks) if blocks else np.zeros((0, 2), dtype=np.int32)
+        return cls(rows[:, 0], rows[:, 1], term_texts, is_entity)
+
+    def counts(self, term_id, entities_only=False):
+        """
+        Counts the occurrences of all terms in the hyperedges of a term.
+        :param term_id: (int) ID of the term.
+        :param entities_only: (boolean) Whether only entities are counted.
+        :return: (np.array) Frequency of every term ID, zero for the term itself.
+        """
+        if not 0 <= term_id < self.num_terms:
+            return np.zeros(self.num_terms, dtype=np.int64)
+
+        edges = self.term_edges[self.term_pointers[term_id]:self.term_pointers[term_id + 1]]
+        return self.count_members(edges, term_id, entities_only)
+
+    def count_members(self, edges, term_id=None, entities_only=False):
+        """
+        Counts the occurrences of all terms in a set of hyperedges.
+        :param edges: (np.array) Indices of the hyperedges, i.e. positions in self.edge_ids.
+        :param term_id: (int) ID of a term that is not counted, usually the queried one.
+        :param entities_only: (boolean) Whether only entities are counted.
+        :return: (np.array) Frequency of every term ID.
+        """
+        members = gather(self.edge_pointers, self.edge_terms, edges)
+        counts = np.bincount(members, minlength=self.num_terms)
+        if term_id is not None:
+            counts[term_id] = 0
+        if entities_only:
+            counts[~self.entities] = 0
+        return counts
+
+    def top_ids(self, term_id, limit=None, entities_only=False):
+        """
+        Retrieves the IDs of the terms co-occurring with a given term.
+        :param term_id: (int) ID of the term.
+        :param limit: (int) Maximum number of returned terms. All terms are returned if not specified.
+        :param entities_only: (boolean) Whether only co-occurring entities are returned.
+        :return: (tuple of np.array) Term IDs and their frequencies, ordered by descending frequency and term text.
+        """
+        return top_counts(self.counts(term_id, entities_only), self.term_ranks, limit)
+
+    def query(self, term, limit=None, entities_only=False):
+        """
+        Retrieves the terms co-occurring with a given term, same as Cooccurrence.query() for the explicit model.
+        :param term: (str) Text of the term.
+        :param limit: (int) Maximum number of returned terms. All terms are returned if not specified.
+        :param entities_only: (boolean) Whether only co-occurring entities are returned.
+        :return: (list) Tuples of (term_text, freq), ordered by descending frequency.
+        """
+        if term not in self.term_lookup:
+            return []
+
+        ids, freqs = self.top_ids(self.term_lookup[term], limit, entities_only)
+        return list(zip(self.term_texts[ids].tolist(), freqs.tolist()))
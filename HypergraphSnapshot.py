@@ -0,0 +1,212 @@
+"""
+Binary snapshots of the hypergraph tables, so that analysis tools do not have to reload everything from Postgres.
+A snapshot is a directory with one .npy file per column of every exported table, plus a small JSON header, which
+stores the format version, the row counts and the sort order of every table:
+    header.json
+    terms/                  (see TermDictionary.save())
+    term_occurrence/        document_id.npy, sentence_id.npy, term_id.npy
+    entity_2_hyperedges/    edge_id.npy, term_id.npy, pos.npy
+    ...
+All columns are memory-mapped when opening a snapshot, so opening it only takes milliseconds, and the pages are
+shared by all processes that work on the same snapshot.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from PostgresConnector import PostgresConnector
+from TermDictionary import TermDictionary
+
+# columns of the exported tables, and the order in which the rows are stored.
+TERM_OCCURRENCE_COLUMNS = (("document_id", "sentence_id", "term_id"), ("document_id", "sentence_id", "term_id"))
+HYPEREDGE_COLUMNS = {
+    "hyperedges": (("edge_id", "term_id", "pos"), ("edge_id", "term_id", "pos")),
+    "hyperedge_document": (("edge_id", "document_id"), ("edge_id", "document_id")),
+    "hyperedge_sentences": (("edge_id", "document_id", "sentence_id", "pos"),
+                            ("edge_id", "document_id", "sentence_id", "pos"))
+}
+
+
+def get_parser():
+    """
+    Creates an argument parser with the relevant options.
+    :return: (argparser) Argument handle.
+    """
+    args = argparse.ArgumentParser(description="Export the hypergraph tables into a binary snapshot.")
+
+    args.add_argument("-p", "--port", type=int, default=5436,
+                      help="Port of the Postgres container.")
+    args.add_argument("-o", "--output", type=str, default="./data/snapshot",
+                      help="Directory to store the snapshot in.")
+    args.add_argument("-f", "--prefixes", type=str, nargs="+", default=None,
+                      help="Prefixes of the hyperedge tables to export, e.g. entity_2. Exports all if not specified.")
+    args.add_argument("-b", "--block-size", type=int, default=1000000,
+                      help="Number of rows that are fetched from Postgres at once.")
+
+    return args
+
+
+def export_table(open_pc, table_name, columns, order_by, path, block_size=1000000):
+    """
+    Exports a table into one .npy file per column. The rows are streamed from Postgres and written directly into the
+    (memory-mapped) files, so the table never has to fit into memory.
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :param table_name: (str) Name of the table.
+    :param columns: (tuple) Names of the exported columns. All of them have to be integers.
+    :param order_by: (tuple) Columns by which the rows are sorted.
+    :param path: (os.path) Directory to store the columns in.
+    :param block_size: (int) Number of rows that are fetched at once.
+    :return: (int) Number of exported rows.
+    """
+    os.makedirs(path, exist_ok=True)
+    open_pc.cursor.execute("SELECT COUNT(*) FROM {}".format(table_name))
+    num_rows = open_pc.cursor.fetchone()[0]
+
+    files = [np.lib.format.open_memmap(os.path.join(path, column + ".npy"), mode="w+", dtype=np.int32,
+                                       shape=(num_rows,)) for column in columns]
+    position = 0
+    for block in open_pc.stream_blocks("SELECT {} FROM {} ORDER BY {}".format(", ".join(columns), table_name,
+                                                                           ", ".join(order_by)),
+                                       block_size=block_size, dtype=np.int32):
+        # the table could have grown since counting the rows.
+        block = block[:num_rows - position]
+        for i, f in enumerate(files):
+            f[position:position + len(block)] = block[:, i]
+        position += len(block)
+
+    for f in files:
+        f.flush()
+    del files
+
+    if position != num_rows:
+        raise ValueError("Table {} changed during the export! Expected {} rows, found {}."
+                         .format(table_name, num_rows, position))
+    return num_rows
+
+
+def get_hyperedge_prefixes(open_pc):
+    """
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :return: (list) Prefixes of all hyperedge tables in the database, e.g. entity_2.
+    """
+    open_pc.cursor.execute("SELECT table_name FROM information_schema.tables "
+                           "WHERE table_schema = 'public' AND table_name LIKE '%\\_hyperedges' ORDER BY table_name")
+    return [row[0][:-len("_hyperedges")] for row in open_pc.cursor.fetchall()]
+
+
+def create_snapshot(pc, path, prefixes=None, block_size=1000000):
+    """
+    Exports the term table, the term occurrences and the hyperedge tables into a snapshot.
+    The header is written last, so an interrupted export can not be opened by accident.
+    :param pc: (PostgresConnector) Object for communication.
+    :param path: (os.path) Directory to store the snapshot in. Will be created if necessary.
+    :param prefixes: (list) Prefixes of the hyperedge tables to export, e.g. ["entity_2"]. All if not specified.
+    :param block_size: (int) Number of rows that are fetched at once.
+    :return: (Snapshot) The opened snapshot.
+    """
+    os.makedirs(path, exist_ok=True)
+    if os.path.exists(os.path.join(path, "header.json")):
+        os.remove(os.path.join(path, "header.json"))
+
+    TermDictionary.from_postgres(pc).save(os.path.join(path, "terms"))
+
+    tables = {}
+    with pc as open_pc:
+        exports = [("term_occurrence",) + TERM_OCCURRENCE_COLUMNS]
+        if prefixes is None:
+            prefixes = get_hyperedge_prefixes(open_pc)
+        for prefix in prefixes:
+            for suffix, (columns, order_by) in HYPEREDGE_COLUMNS.items():
+                exports.append(("{}_{}".format(prefix, suffix), columns, order_by))
+
+        for table_name, columns, order_by in exports:
+            num_rows = export_table(open_pc, table_name, columns, order_by, os.path.join(path, table_name),
+                                    block_size)
+            tables[table_name] = {"columns": list(columns), "order_by": list(order_by), "rows": num_rows}
+
+    with open(os.path.join(path, "header.json"), "w") as f:
+        json.dump({"version": Snapshot.version, "created": time.strftime("%Y-%m-%d %H:%M:%S"), "tables": tables},
+                  f, indent=2)
+
+    return Snapshot(path)
+
+
+class Snapshot:
+    # version of the on-disk format, stored in the header.
+    version = 1
+
+    def __init__(self, path, mmap=True):
+        """
+        Opens a snapshot that was previously created with create_snapshot(). Columns are only opened on first access.
+        :param path: (os.path) Directory containing the snapshot.
+        :param mmap: (boolean) Whether to memory-map the columns instead of reading them into memory.
+        """
+        with open(os.path.join(path, "header.json"), "r") as f:
+            self.header = json.load(f)
+        if self.header["version"] != self.version:
+            raise ValueError("Unsupported snapshot version {}!".format(self.header["version"]))
+
+        self.path = path
+        self.mmap_mode = "r" if mmap else None
+        self.columns = {}
+        self._terms = None
+
+    def __contains__(self, table_name):
+        return table_name in self.header["tables"]
+
+    @property
+    def tables(self):
+        """
+        :return: (list) Names of all tables in the snapshot.
+        """
+        return list(self.header["tables"].keys())
+
+    @property
+    def terms(self):
+        """
+        :return: (TermDictionary) Term table of the snapshot.
+        """
+        if self._terms is None:
+            self._terms = TermDictionary.load(os.path.join(self.path, "terms"), mmap=self.mmap_mode is not None)
+        return self._terms
+
+    def column(self, table_name, column):
+        """
+        :param table_name: (str) Name of the table.
+        :param column: (str) Name of the column.
+        :return: (np.array) Values of the column, in the sort order of the table.
+        """
+        if table_name not in self:
+            raise KeyError("Table {} is not part of the snapshot!".format(table_name))
+        if (table_name, column) not in self.columns:
+            self.columns[(table_name, column)] = np.load(os.path.join(self.path, table_name, column + ".npy"),
+                                                         mmap_mode=self.mmap_mode)
+        return self.columns[(table_name, column)]
+
+    def table(self, table_name):
+        """
+        :param table_name: (str) Name of the table.
+        :return: (dict) Values of all columns of the table, by column name.
+        """
+        if table_name not in self:
+            raise KeyError("Table {} is not part of the snapshot!".format(table_name))
+        return {column: self.column(table_name, column) for column in self.header["tables"][table_name]["columns"]}
+
+    def hyperedges(self, table_name):
+        """
+        Returns the columns of a hyperedge table, without copying them out of the memory-mapped files.
+        :param table_name: (str) Name of the hyperedge table, e.g. entity_2_hyperedges.
+        :return: (tuple of np.array) Edge IDs and term IDs, sorted by edge_id.
+        """
+        return self.column(table_name, "edge_id"), self.column(table_name, "term_id")
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    start_time = time.time()
+    snapshot = create_snapshot(PostgresConnector(port=args.port), args.output, args.prefixes, args.block_size)
+    print("Exported {} tables in {:.2f} s.".format(len(snapshot.tables), time.time() - start_time))
@@ -0,0 +1,148 @@
+"""
+Embedded query engine for the Implicit Model. Instead of joining term_occurrence with itself for every query, the
+occurrences are loaded once into a positional index, which consists of
+- term -> postings: for every term, the sorted sentences it occurs in, packed as (document_id << 32 | sentence_id),
+- sentence -> terms: for every sentence (in the same packed order), the terms occurring in it (CSR).
+Since the sentences of a document are adjacent in the packed order, the window around every posting is a single
+range of the sentence index, which is found via binary search. The window size is therefore only a query parameter,
+and no hyperedge table has to be materialized for it.
+The results are the same as for the Implicit Model query in Queries.md.
+"""
+
+import numpy as np
+
+from HypergraphCSR import build_csr, gather_ranges, top_counts
+from TermDictionary import TermDictionary
+
+SENTENCE_MASK = 0xFFFFFFFF
+
+
+def pack_sentences(document_ids, sentence_ids):
+    """
+    :param document_ids: (np.array) Document IDs.
+    :param sentence_ids: (np.array) Corresponding (non-negative) sentence IDs.
+    :return: (np.array of int64) Keys that sort by document ID first, and sentence ID second.
+    """
+    return (np.asarray(document_ids, dtype=np.int64) << 32) | np.asarray(sentence_ids, dtype=np.int64)
+
+
+class ImplicitIndex:
+    def __init__(self, document_ids, sentence_ids, term_ids, terms=None):
+        """
+        Builds the positional index from the rows of a term occurrence table.
+        :param document_ids: (np.array) Document ID of every row.
+        :param sentence_ids: (np.array) Sentence ID of every row.
+        :param term_ids: (np.array) Term ID of every row.
+        :param terms: (TermDictionary) Term table. Required to query by text, and for entities_only.
+        """
+        self.terms = terms if terms is not None else TermDictionary()
+        self.terms.compact()
+
+        keys = pack_sentences(document_ids, sentence_ids)
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        self.num_terms = int(max(term_ids.max(initial=-1) + 1, len(self.terms)))
+
+        # sentence -> terms
+        order = np.argsort(keys, kind="stable")
+        keys, term_ids = keys[order], term_ids[order]
+        starts = np.flatnonzero(np.diff(keys, prepend=-1) != 0)
+        self.sentence_keys = keys[starts]
+        self.sentence_pointers = np.r_[starts, len(keys)].astype(np.int64)
+        self.sentence_terms = term_ids
+
+        # term -> postings. The stable sort keeps the postings of every term in sentence order.
+        self.term_pointers, sentence_index = build_csr(term_ids, np.repeat(np.arange(len(starts)),
+                                                                           np.diff(self.sentence_pointers)),
+                                                       self.num_terms)
+        self.term_postings = self.sentence_keys[sentence_index]
+
+        # rank of every term in alphabetical order, to break ties in the frequencies.
+        self.term_ranks = np.zeros(self.num_terms, dtype=np.int64)
+        self.term_ranks[self.terms.order] = np.arange(len(self.terms.order))
+        self.entities = np.zeros(self.num_terms, dtype=bool)
+        self.entities[:len(self.terms.is_entity)] = self.terms.is_entity
+
+    @classmethod
+    def from_postgres(cls, pc, term_occurrence_table_name="term_occurrence", term_table_name="terms",
+                      block_size=1000000):
+        """
+        Loads a term occurrence table, as well as the term table.
+        :param pc: (PostgresConnector) Object for communication.
+        :param term_occurrence_table_name: (str) Name of the term occurrence table.
+        :param term_table_name: (str) Name of the term table.
+        :param block_size: (int) Number of rows that are fetched at once.
+        :return: (ImplicitIndex) Query engine for the table.
+        """
+        with pc as open_pc:
+            blocks = list(open_pc.stream_blocks("SELECT document_id, sentence_id, term_id FROM {}"
+                                                .format(term_occurrence_table_name),
+                                                block_size=block_size, dtype=np.int32))
+
+        rows = np.concatenate(blocks) if blocks else np.zeros((0, 3), dtype=np.int32)
+        return cls(rows[:, 0], rows[:, 1], rows[:, 2], TermDictionary.from_postgres(pc, term_table_name))
+
+    @classmethod
+    def from_snapshot(cls, snapshot, term_occurrence_table_name="term_occurrence"):
+        """
+        Builds the index from a snapshot (see HypergraphSnapshot.py).
+        :param snapshot: (Snapshot) Opened snapshot.
+        :param term_occurrence_table_name: (str) Name of the term occurrence table in the snapshot.
+        :return: (ImplicitIndex) Query engine for the table.
+        """
+        table = snapshot.table(term_occurrence_table_name)
+        return cls(table["document_id"], table["sentence_id"], table["term_id"], snapshot.terms)
+
+    def counts(self, term_id, window, entities_only=False):
+        """
+        Counts the occurrences of all terms within a window around the occurrences of a term. As in the SQL query,
+        sentences in the windows of several occurrences are counted several times.
+        :param term_id: (int) ID of the term.
+        :param window: (int) Window size, i.e. number of sentences in each direction.
+        :param entities_only: (boolean) Whether only entities are counted.
+        :return: (np.array) Frequency of every term ID, zero for the term itself.
+        """
+        if not 0 <= term_id < self.num_terms:
+            return np.zeros(self.num_terms, dtype=np.int64)
+
+        postings = self.term_postings[self.term_pointers[term_id]:self.term_pointers[term_id + 1]]
+        # windows must not reach into the neighbouring documents.
+        documents = postings & ~SENTENCE_MASK
+        lower = np.maximum(postings - window, documents)
+        upper = np.minimum(postings + window, documents | SENTENCE_MASK)
+
+        first = np.searchsorted(self.sentence_keys, lower, side="left")
+        last = np.searchsorted(self.sentence_keys, upper, side="right")
+        members = gather_ranges(self.sentence_terms, self.sentence_pointers[first], self.sentence_pointers[last])
+
+        counts = np.bincount(members, minlength=self.num_terms)
+        counts[term_id] = 0
+        if entities_only:
+            counts[~self.entities] = 0
+        return counts
+
+    def top_ids(self, term_id, window, limit=None, entities_only=False):
+        """
+        Retrieves the IDs of the terms co-occurring with a given term.
+        :param term_id: (int) ID of the term.
+        :param window: (int) Window size, i.e. number of sentences in each direction.
+        :param limit: (int) Maximum number of returned terms. All terms are returned if not specified.
+        :param entities_only: (boolean) Whether only co-occurring entities are returned.
+        :return: (tuple of np.array) Term IDs and their frequencies, ordered by descending frequency and term text.
+        """
+        return top_counts(self.counts(term_id, window, entities_only), self.term_ranks, limit)
+
+    def query(self, term, window, limit=None, entities_only=False):
+        """
+        Retrieves the terms co-occurring with a given term, same as Cooccurrence.query() for the implicit model.
+        :param term: (str) Text of the term.
+        :param window: (int) Window size, i.e. number of sentences in each direction.
+        :param limit: (int) Maximum number of returned terms. All terms are returned if not specified.
+        :param entities_only: (boolean) Whether only co-occurring entities are returned.
+        :return: (list) Tuples of (term_text, freq), ordered by descending frequency.
+        """
+        term_id = self.terms.get(term)
+        if term_id is None:
+            return []
+
+        ids, freqs = self.top_ids(term_id, window, limit, entities_only)
+        return [(self.terms.text(i), freq) for i, freq in zip(ids.tolist(), freqs.tolist())]
@@ -0,0 +1,77 @@
+"""
+Compact accumulator for term occurrences, i.e. (document_id, sentence_id, term_id) triples.
+Instead of one Python tuple per occurrence, the values are stored in three separate int32 columns (array.array), which
+need 12 bytes per occurrence. The columns can be viewed as NumPy arrays without copying, which allows vectorized
+post-processing and direct serialization for binary COPY (see utils.copy_columns_into_table()).
+"""
+
+from array import array
+
+import numpy as np
+
+
+class OccurrenceBuffer:
+    def __init__(self):
+        """
+        Creates an empty buffer.
+        """
+        self.document_ids = array("i")
+        self.sentence_ids = array("i")
+        self.term_ids = array("i")
+
+    def __len__(self):
+        return len(self.term_ids)
+
+    def append(self, document_id, sentence_id, term_id):
+        """
+        Adds a single occurrence.
+        :param document_id: (int) ID of the document.
+        :param sentence_id: (int) ID of the sentence within the document.
+        :param term_id: (int) ID of the term.
+        :return: None
+        """
+        self.document_ids.append(document_id)
+        self.sentence_ids.append(sentence_id)
+        self.term_ids.append(term_id)
+
+    def columns(self):
+        """
+        Returns the buffer contents as NumPy arrays. These are views on the underlying arrays, so no data is copied.
+        Note that the buffer can not be appended to as long as these views exist.
+        :return: (tuple of np.array) Document, sentence and term IDs.
+        """
+        return (np.frombuffer(self.document_ids, dtype=np.int32),
+                np.frombuffer(self.sentence_ids, dtype=np.int32),
+                np.frombuffer(self.term_ids, dtype=np.int32))
+
+    def remap(self, mapping):
+        """
+        Replaces all term IDs via a lookup table, e.g. to switch from provisional to final term IDs.
+        :param mapping: (np.array) Array with the new ID at the position of the old ID.
+        :return: None
+        """
+        terms = np.frombuffer(self.term_ids, dtype=np.int32)
+        self.term_ids = array("i", np.asarray(mapping, dtype=np.int32)[terms].tobytes())
+
+    def unique(self):
+        """
+        Removes duplicate occurrences, and sorts the remaining ones by document, sentence and term ID.
+        :return: None
+        """
+        documents, sentences, terms = self.columns()
+        order = np.lexsort((terms, sentences, documents))
+        documents, sentences, terms = documents[order], sentences[order], terms[order]
+
+        # keep the first of each run of identical rows.
+        keep = np.ones(len(order), dtype=np.bool_)
+        keep[1:] = (documents[1:] != documents[:-1]) | (sentences[1:] != sentences[:-1]) | (terms[1:] != terms[:-1])
+
+        self.document_ids = array("i", documents[keep].tobytes())
+        self.sentence_ids = array("i", sentences[keep].tobytes())
+        self.term_ids = array("i", terms[keep].tobytes())
+
+    def rows(self):
+        """
+        :return: (generator) Yields the occurrences as (document_id, sentence_id, term_id) tuples.
+        """
+        return zip(self.document_ids, self.sentence_ids, self.term_ids)
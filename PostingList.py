@@ -0,0 +1,439 @@
+"""
+Compressed posting lists as an alternative representation of term_occurrence.
+For every term, the sentences it occurs in are stored as sorted keys (document_id << 32 | sentence_id, see
+ImplicitIndex.pack_sentences()), which are split into blocks of a fixed number of postings:
+- the first key of every block is stored uncompressed in a skip list, together with the byte offset of the block,
+- all following keys of a block are stored as the difference to their predecessor, encoded as variable-length
+  integers (7 bits per byte, the highest bit marks that another byte follows).
+Since the postings of a term are mostly close to each other, most differences only take a single byte. Single blocks
+can be decoded without touching the rest of the list, which is used to skip over blocks during intersections.
+Posting lists of all terms can be stored in files (PostingStore.save()) or in a Postgres table with one bytea value
+per term (push_posting_lists()).
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from HypergraphCSR import gather_ranges
+from ImplicitIndex import pack_sentences, SENTENCE_MASK
+from PostgresConnector import PostgresConnector
+from utils import check_table_existence, copy_into_table, set_up_logger
+
+# version of the serialized format, stored in the header of every posting list and every store.
+VERSION = 1
+
+
+def get_parser():
+    """
+    Creates an argument parser with the relevant options.
+    :return: (argparser) Argument handle.
+    """
+    args = argparse.ArgumentParser(description="Compress the term occurrences into posting lists.")
+
+    args.add_argument("-p", "--port", type=int, default=5436,
+                      help="Port of the Postgres container.")
+    args.add_argument("-t", "--table", type=str, default="term_postings",
+                      help="Name of the Postgres table for the posting lists.")
+    args.add_argument("-o", "--output", type=str, default=None,
+                      help="Directory to additionally store the posting lists in.")
+    args.add_argument("-b", "--block-size", type=int, default=128,
+                      help="Number of postings per block.")
+
+    return args
+
+
+def encode_varint(values):
+    """
+    Encodes unsigned integers as variable-length integers, least significant 7 bits first.
+    :param values: (np.array) Non-negative integers.
+    :return: (tuple of np.array) Encoded bytes (uint8), and the byte offset of every value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        lengths += values >= np.uint64(1 << (7 * k))
+
+    offsets = np.cumsum(lengths) - lengths
+    data = np.empty(int(lengths.sum()), dtype=np.uint8)
+    for k in range(int(lengths.max(initial=0))):
+        selected = lengths > k
+        chunk = (values[selected] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        # all but the last byte of a value have the continuation bit set.
+        chunk |= np.where(lengths[selected] - 1 > k, np.uint64(0x80), np.uint64(0))
+        data[offsets[selected] + k] = chunk
+
+    return data, offsets
+
+
+def decode_varint(data):
+    """
+    Decodes a sequence of variable-length integers, see encode_varint().
+    :param data: (np.array) Encoded bytes (uint8).
+    :return: (np.array of uint64) Decoded values.
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.r_[0, ends[:-1] + 1]
+    # position of every byte within its value.
+    positions = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7F).astype(np.uint64) << (7 * positions).astype(np.uint64)
+    # the parts of a value occupy distinct bits, so OR-ing them is the same as adding them.
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+def block_lengths(size, block_size, blocks):
+    """
+    :param size: (int) Number of postings in the list.
+    :param block_size: (int) Number of postings per block.
+    :param blocks: (np.array) Block indices.
+    :return: (np.array) Number of postings in each of the blocks. Only the last block can be shorter.
+    """
+    return np.minimum(block_size, size - blocks * block_size)
+
+
+class PostingList:
+    def __init__(self, data, skip_keys, skip_offsets, size, block_size=128):
+        """
+        Wraps an encoded posting list. Use PostingList.encode() to create one from keys.
+        :param data: (np.array of uint8) Encoded differences of all blocks.
+        :param skip_keys: (np.array of int64) First key of every block.
+        :param skip_offsets: (np.array of int64) Byte offset of every block in data, plus the total length at the end.
+        :param size: (int) Number of postings.
+        :param block_size: (int) Number of postings per block.
+        """
+        self.data = data
+        self.skip_keys = skip_keys
+        self.skip_offsets = skip_offsets
+        self.size = int(size)
+        self.block_size = int(block_size)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def nbytes(self):
+        """
+        :return: (int) Size of the encoded list in bytes.
+        """
+        return self.data.nbytes + self.skip_keys.nbytes + self.skip_offsets.nbytes
+
+    @classmethod
+    def encode(cls, keys, block_size=128):
+        """
+        :param keys: (np.array) Sorted, unique keys of the postings.
+        :param block_size: (int) Number of postings per block.
+        :return: (PostingList) Encoded list.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        block_starts = np.arange(0, len(keys), block_size)
+        is_start = np.zeros(len(keys), dtype=bool)
+        is_start[block_starts] = True
+
+        deltas = np.diff(keys, prepend=0)[~is_start]
+        data, offsets = encode_varint(deltas)
+        # every block before a block start lacks one difference, namely that of its own first key.
+        skip_offsets = np.r_[offsets, len(data)][block_starts - np.arange(len(block_starts))]
+        return cls(data, keys[block_starts], np.r_[skip_offsets, len(data)].astype(np.int64), len(keys), block_size)
+
+    def decode_blocks(self, blocks):
+        """
+        Decodes only the given blocks.
+        :param blocks: (np.array) Sorted indices of the blocks.
+        :return: (np.array of int64) Keys of all postings in the blocks.
+        """
+        blocks = np.asarray(blocks, dtype=np.int64)
+        lengths = block_lengths(self.size, self.block_size, blocks)
+        deltas = decode_varint(gather_ranges(self.data, self.skip_offsets[blocks], self.skip_offsets[blocks + 1]))
+
+        values = np.empty(int(lengths.sum()), dtype=np.uint64)
+        starts = np.cumsum(lengths) - lengths
+        is_start = np.zeros(len(values), dtype=bool)
+        is_start[starts] = True
+        values[starts] = self.skip_keys[blocks]
+        values[~is_start] = deltas
+
+        # cumulative sum within every block. Overflows of the global sum cancel out, since uint64 wraps around.
+        sums = np.cumsum(values)
+        return (sums - np.repeat(sums[starts] - values[starts], lengths)).view(np.int64)
+
+    def decode(self):
+        """
+        :return: (np.array of int64) Keys of all postings.
+        """
+        return self.decode_blocks(np.arange(len(self.skip_keys)))
+
+    def between(self, lower, upper):
+        """
+        Decodes only the postings in a range of keys.
+        :param lower: (int) Smallest key, inclusive.
+        :param upper: (int) Largest key, inclusive.
+        :return: (np.array of int64) Keys of the postings in the range.
+        """
+        first = max(np.searchsorted(self.skip_keys, lower, side="right") - 1, 0)
+        last = np.searchsorted(self.skip_keys, upper, side="right")
+        keys = self.decode_blocks(np.arange(first, last))
+        return keys[(keys >= lower) & (keys <= upper)]
+
+    def document(self, document_id):
+        """
+        :param document_id: (int) ID of the document.
+        :return: (np.array) Sentence IDs of all postings in the document.
+        """
+        lower = int(document_id) << 32
+        return self.between(lower, lower | SENTENCE_MASK) & SENTENCE_MASK
+
+    def intersect_keys(self, keys):
+        """
+        Intersects the list with a sorted array of keys. Only the blocks that can contain any of the keys are decoded.
+        :param keys: (np.array) Sorted keys.
+        :return: (np.array of int64) Keys that are part of the list.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        blocks = np.unique(np.searchsorted(self.skip_keys, keys, side="right") - 1)
+        blocks = blocks[blocks >= 0]
+        return np.intersect1d(keys, self.decode_blocks(blocks), assume_unique=True)
+
+    def intersect(self, other):
+        """
+        :param other: (PostingList) List to intersect with.
+        :return: (np.array of int64) Keys that are part of both lists.
+        """
+        return intersect([self, other])
+
+    def to_bytes(self):
+        """
+        :return: (bytes) Serialized list, e.g. for a bytea column.
+        """
+        header = np.array([VERSION, self.size, self.block_size, len(self.skip_keys)], dtype=np.int64)
+        return b"".join([header.tobytes(), self.skip_keys.astype(np.int64).tobytes(),
+                         self.skip_offsets.astype(np.int64).tobytes(), self.data.tobytes()])
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        """
+        :param buffer: (bytes) Serialized list, see to_bytes().
+        :return: (PostingList) Deserialized list. The arrays share the memory of the buffer.
+        """
+        version, size, block_size, num_blocks = np.frombuffer(buffer, dtype=np.int64, count=4).tolist()
+        if version != VERSION:
+            raise ValueError("Unsupported posting list version {}!".format(version))
+
+        skip_keys = np.frombuffer(buffer, dtype=np.int64, count=num_blocks, offset=32)
+        skip_offsets = np.frombuffer(buffer, dtype=np.int64, count=num_blocks + 1, offset=32 + 8 * num_blocks)
+        data = np.frombuffer(buffer, dtype=np.uint8, offset=32 + 8 * (2 * num_blocks + 1))
+        return cls(data, skip_keys, skip_offsets, size, block_size)
+
+
+def intersect(posting_lists):
+    """
+    Retrieves the sentences that contain all of the given terms. Starts with the shortest list, so that only few blocks
+    of the longer lists have to be decoded.
+    :param posting_lists: (list of PostingList) Lists to intersect.
+    :return: (np.array of int64) Keys that are part of all lists.
+    """
+    posting_lists = sorted(posting_lists, key=len)
+    keys = posting_lists[0].decode()
+    for posting_list in posting_lists[1:]:
+        if len(keys) == 0:
+            break
+        keys = posting_list.intersect_keys(keys)
+
+    return keys
+
+
+class PostingStore:
+    def __init__(self, data, skip_keys, skip_offsets, block_pointers, sizes, block_size=128):
+        """
+        Posting lists of all terms, stored in shared arrays. Use PostingStore.build() to create one.
+        :param data: (np.array of uint8) Encoded differences of all blocks of all terms.
+        :param skip_keys: (np.array of int64) First key of every block.
+        :param skip_offsets: (np.array of int64) Byte offset of every block in data, plus the total length at the end.
+        :param block_pointers: (np.array of int64) Index of the first block of every term, plus the number of blocks.
+        :param sizes: (np.array of int64) Number of postings of every term.
+        :param block_size: (int) Number of postings per block.
+        """
+        self.data = data
+        self.skip_keys = skip_keys
+        self.skip_offsets = skip_offsets
+        self.block_pointers = block_pointers
+        self.sizes = sizes
+        self.block_size = int(block_size)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def __getitem__(self, term_id):
+        """
+        :param term_id: (int) ID of the term.
+        :return: (PostingList) Posting list of the term, as a view of the shared arrays.
+        """
+        if not 0 <= term_id < len(self.sizes):
+            return PostingList.encode(np.zeros(0, dtype=np.int64), self.block_size)
+
+        first, last = self.block_pointers[term_id], self.block_pointers[term_id + 1]
+        start, end = self.skip_offsets[first], self.skip_offsets[last]
+        return PostingList(self.data[start:end], self.skip_keys[first:last],
+                           self.skip_offsets[first:last + 1] - start, self.sizes[term_id], self.block_size)
+
+    @property
+    def nbytes(self):
+        """
+        :return: (int) Size of all encoded lists in bytes.
+        """
+        return sum(array.nbytes for array in [self.data, self.skip_keys, self.skip_offsets, self.block_pointers,
+                                              self.sizes])
+
+    @classmethod
+    def build(cls, document_ids, sentence_ids, term_ids, block_size=128):
+        """
+        Encodes the posting lists of all terms at once, from the rows of a term occurrence table.
+        :param document_ids: (np.array) Document ID of every row.
+        :param sentence_ids: (np.array) Sentence ID of every row.
+        :param term_ids: (np.array) Term ID of every row.
+        :param block_size: (int) Number of postings per block.
+        :return: (PostingStore) Encoded lists.
+        """
+        keys = pack_sentences(document_ids, sentence_ids)
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.lexsort((keys, term_ids))
+        keys, term_ids = keys[order], term_ids[order]
+        unique = (np.diff(keys, prepend=-1) != 0) | (np.diff(term_ids, prepend=-1) != 0)
+        keys, term_ids = keys[unique], term_ids[unique]
+
+        sizes = np.bincount(term_ids, minlength=int(term_ids.max(initial=-1)) + 1).astype(np.int64)
+        term_starts = np.cumsum(sizes) - sizes
+        positions = np.arange(len(keys)) - np.repeat(term_starts, sizes)
+        is_start = positions % block_size == 0
+        block_starts = np.flatnonzero(is_start)
+
+        deltas = np.diff(keys, prepend=0)[~is_start]
+        data, offsets = encode_varint(deltas)
+        skip_offsets = np.r_[offsets, len(data)][block_starts - np.arange(len(block_starts))]
+
+        block_pointers = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(-(-sizes // block_size), out=block_pointers[1:])
+        return cls(data, keys[block_starts], np.r_[skip_offsets, len(data)].astype(np.int64), block_pointers, sizes,
+                   block_size)
+
+    @classmethod
+    def from_postgres(cls, pc, term_occurrence_table_name="term_occurrence", block_size=128, stream_size=1000000):
+        """
+        Encodes the posting lists from a term occurrence table.
+        :param pc: (PostgresConnector) Object for communication.
+        :param term_occurrence_table_name: (str) Name of the term occurrence table.
+        :param block_size: (int) Number of postings per block.
+        :param stream_size: (int) Number of rows that are fetched at once.
+        :return: (PostingStore) Encoded lists.
+        """
+        with pc as open_pc:
+            blocks = list(open_pc.stream_blocks("SELECT document_id, sentence_id, term_id FROM {}"
+                                                .format(term_occurrence_table_name),
+                                                block_size=stream_size, dtype=np.int32))
+
+        rows = np.concatenate(blocks) if blocks else np.zeros((0, 3), dtype=np.int32)
+        return cls.build(rows[:, 0], rows[:, 1], rows[:, 2], block_size)
+
+    @classmethod
+    def from_snapshot(cls, snapshot, term_occurrence_table_name="term_occurrence", block_size=128):
+        """
+        Encodes the posting lists from a snapshot (see HypergraphSnapshot.py).
+        :param snapshot: (Snapshot) Opened snapshot.
+        :param term_occurrence_table_name: (str) Name of the term occurrence table in the snapshot.
+        :param block_size: (int) Number of postings per block.
+        :return: (PostingStore) Encoded lists.
+        """
+        table = snapshot.table(term_occurrence_table_name)
+        return cls.build(table["document_id"], table["sentence_id"], table["term_id"], block_size)
+
+    def save(self, path):
+        """
+        Stores the lists in a directory, as one .npy file per array plus a small JSON header.
+        :param path: (os.path) Directory to store the lists in. Will be created if necessary.
+        :return: (None)
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ["data", "skip_keys", "skip_offsets", "block_pointers", "sizes"]:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+        with open(os.path.join(path, "header.json"), "w") as f:
+            json.dump({"version": VERSION, "block_size": self.block_size, "terms": len(self)}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads lists that were previously stored with save().
+        :param path: (os.path) Directory containing the lists.
+        :param mmap: (boolean) Whether to memory-map the arrays instead of reading them into memory.
+        :return: (PostingStore) Loaded lists.
+        """
+        with open(os.path.join(path, "header.json"), "r") as f:
+            header = json.load(f)
+        if header["version"] != VERSION:
+            raise ValueError("Unsupported posting store version {}!".format(header["version"]))
+
+        mmap_mode = "r" if mmap else None
+        arrays = [np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+                  for name in ["data", "skip_keys", "skip_offsets", "block_pointers", "sizes"]]
+        return cls(*arrays, block_size=header["block_size"])
+
+
+def push_posting_lists(pc, store, table_name="term_postings", logger=None):
+    """
+    Stores the posting lists of all terms in a Postgres table, with one bytea value per term.
+    :param pc: (PostgresConnector) Object for communication.
+    :param store: (PostingStore) Encoded lists.
+    :param table_name: (str) Name of the table. Will be created if necessary, and existing lists are replaced.
+    :param logger: (logging.Logger) Logger to report to.
+    :return: (int) 1 if successful, 0 otherwise.
+    """
+    if logger is None:
+        logger = set_up_logger(__name__, os.path.join(os.path.dirname(__file__), "logs/PostingList.log"))
+
+    with pc as open_pc:
+        if not check_table_existence(logger, open_pc, table_name):
+            open_pc.cursor.execute("CREATE TABLE {} ( "
+                                   "term_id integer PRIMARY KEY, "
+                                   "size integer, "
+                                   "postings bytea, "
+                                   "FOREIGN KEY (term_id) REFERENCES terms(term_id) ON DELETE CASCADE"
+                                   ");".format(table_name))
+        open_pc.cursor.execute("TRUNCATE {}".format(table_name))
+
+        rows = ((term_id, int(store.sizes[term_id]), store[term_id].to_bytes())
+                for term_id in np.flatnonzero(store.sizes).tolist())
+        return copy_into_table(open_pc, table_name, "term_id, size, postings", rows, logger, binary=True)
+
+
+def load_posting_list(open_pc, term_id, table_name="term_postings"):
+    """
+    Loads the posting list of a single term from Postgres.
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :param term_id: (int) ID of the term.
+    :param table_name: (str) Name of the table, see push_posting_lists().
+    :return: (PostingList) Posting list of the term. Empty if the term does not occur.
+    """
+    open_pc.cursor.execute("SELECT postings FROM {} WHERE term_id = %s".format(table_name), (term_id,))
+    row = open_pc.cursor.fetchone()
+    if row is None:
+        return PostingList.encode(np.zeros(0, dtype=np.int64))
+    return PostingList.from_bytes(bytes(row[0]))
+
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    pc = PostgresConnector(port=args.port)
+
+    start_time = time.time()
+    store = PostingStore.from_postgres(pc, block_size=args.block_size)
+    print("Encoded {} postings of {} terms into {:.2f} MB in {:.2f} s."
+          .format(int(store.sizes.sum()), len(store), store.nbytes / 2**20, time.time() - start_time))
+
+    push_posting_lists(pc, store, args.table)
+    if args.output is not None:
+        store.save(args.output)
@@ -1,9 +1,15 @@
 """
 Reads a file that was generated by GenerateDyadicGraph.py, and returns a reduced form, to account for aggregation.
 So far only works with simple aggregation (multiplicities = 1), and no fractional/weighted values
+Since the full edge list does not fit into memory, the aggregation is done with an external sort: The edges are packed
+into int64 keys, sorted (and pre-aggregated) in fixed-size chunks that are spilled to disk, and the sorted chunks are
+then merged to sum up the weights of identical edges.
 """
 
+import itertools
+import multiprocessing
 import os
+import tempfile
 
 import pandas as pd
 import numpy as np
@@ -17,30 +23,184 @@ def write(out, fn="./data/dyadic_edges.csv", sep="\t"):
         np.savetxt(fn, out, delimiter=sep, fmt="%i")
 
 
-def processInBatch(outFilename, separatorInputFile, separatorOutputFile, inFilename="./data/dyadic_edges.csv"):
+def pack(sources, targets):
     """
-    Does the same thing, but iteratively, since the full edge list is 47 GB...
-    :param outFilename:
-    :param separatorInputFile:
-    :param separatorOutputFile:
-    :param fn: Name of the file to be read.
-    :return: (None)
+    Packs edges into a single int64 key per edge, which preserves the order of (source, target).
+    :param sources: (np.array) Source IDs. Have to be non-negative and smaller than 2^31.
+    :param targets: (np.array) Target IDs, with the same restrictions.
+    :return: (np.array) Packed keys.
+    """
+    return (sources.astype(np.int64) << 32) | targets.astype(np.int64)
+
+
+def unpack(keys):
+    """
+    Inverse of pack().
+    :param keys: (np.array) Packed keys.
+    :return: (tuple of np.array) Source and target IDs.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    return keys >> 32, keys & 0xFFFFFFFF
+
+
+def read_chunks(fn, sep=" ", chunk_size=10000000):
+    """
+    Parses an edge list in chunks.
+    :param fn: (string) Name of the file to be read. Files ending in .bin are read as raw int32 (source, target) pairs,
+           as written by GenerateDyadicGraph.append_edges().
+    :param sep: (string) Separator of the source and target columns.
+    :param chunk_size: (int) Number of edges per chunk.
+    :return: (generator) Yields the packed keys of each chunk.
+    """
+    if fn.endswith(".bin"):
+        # empty files can not be memory-mapped.
+        if os.path.getsize(fn) == 0:
+            return None
+        edges = np.memmap(fn, dtype=np.int32, mode="r").reshape(-1, 2)
+        for start in range(0, len(edges), chunk_size):
+            yield pack(edges[start:start + chunk_size, 0], edges[start:start + chunk_size, 1])
+        return None
+
+    try:
+        chunks = pd.read_csv(fn, sep=sep, header=None, usecols=[0, 1], dtype=np.int64, chunksize=chunk_size)
+    except pd.errors.EmptyDataError:
+        # e.g. no hyperedge contained more than one term.
+        return None
+
+    for chunk in chunks:
+        yield pack(chunk[0].values, chunk[1].values)
+
+
+def sort_chunk(keys, path):
+    """
+    Sorts a chunk, aggregates identical edges within it, and spills the result to disk.
+    :param keys: (np.array) Packed keys of the chunk.
+    :param path: (os.path) Prefix of the files the sorted chunk is stored in.
+    :return: (os.path) Prefix of the stored chunk.
+    """
+    unique, counts = np.unique(keys, return_counts=True)
+    np.save(path + "_keys.npy", unique)
+    np.save(path + "_counts.npy", counts.astype(np.int64))
+    return path
+
+
+def aggregate(keys, counts):
+    """
+    Sums up the counts of identical keys.
+    :param keys: (np.array) Packed keys, in any order.
+    :param counts: (np.array) Count of every key.
+    :return: (tuple of np.array) Sorted unique keys, and their summed counts.
+    """
+    order = np.argsort(keys, kind="stable")
+    keys, counts = keys[order], counts[order]
+    starts = np.flatnonzero(np.diff(keys, prepend=-1) != 0)
+    if not len(keys):
+        return keys, counts
+    return keys[starts], np.add.reduceat(counts, starts)
+
+
+def merge_chunks(paths, block_size=1000000):
+    """
+    K-way merges sorted chunks, and sums up the counts of identical edges. The merge works on whole blocks: the current
+    blocks of all chunks are concatenated, and every key up to the smallest last key of an unfinished chunk's block is
+    final, since no later block of any chunk can contain it. The remaining keys are carried over to the next round.
+    :param paths: (list) Prefixes of the stored chunks.
+    :param block_size: (int) Number of edges per chunk that are held in memory at once.
+    :return: (generator) Yields (keys, weights) blocks in sorted order, with unique keys across all blocks.
+    """
+    keys = [np.load(path + "_keys.npy", mmap_mode="r") for path in paths]
+    counts = [np.load(path + "_counts.npy", mmap_mode="r") for path in paths]
+    positions = [0] * len(paths)
+
+    while True:
+        active = [i for i in range(len(paths)) if positions[i] < len(keys[i])]
+        if not active:
+            return None
+
+        blocks = {i: keys[i][positions[i]:positions[i] + block_size] for i in active}
+        unfinished = [blocks[i][-1] for i in active if positions[i] + block_size < len(keys[i])]
+        bound = min(unfinished) if unfinished else None
+
+        merged_keys, merged_counts = [], []
+        for i in active:
+            end = len(blocks[i]) if bound is None else int(np.searchsorted(blocks[i], bound, side="right"))
+            merged_keys.append(blocks[i][:end])
+            merged_counts.append(counts[i][positions[i]:positions[i] + end])
+            positions[i] += end
+
+        yield aggregate(np.concatenate(merged_keys), np.concatenate(merged_counts))
+
+
+def sort_chunks(chunks, folder, n_process=1):
+    """
+    Sorts and spills all chunks, optionally with several processes. At most two chunks per process are in flight at
+    the same time, so that the memory stays bounded even if reading is faster than sorting.
+    :param chunks: (iterable) Packed keys per chunk.
+    :param folder: (os.path) Directory to spill the chunks to.
+    :param n_process: (int) Number of processes used for sorting.
+    :return: (list) Prefixes of the stored chunks, in input order.
+    """
+    paths = (os.path.join(folder, "chunk_{}".format(i)) for i in itertools.count())
+    if n_process <= 1:
+        return [sort_chunk(keys, path) for keys, path in zip(chunks, paths)]
+
+    results = []
+    with multiprocessing.Pool(n_process) as pool:
+        for keys, path in zip(chunks, paths):
+            # wait for the oldest pending chunk before submitting further ones.
+            pending = [result for result in results if not result.ready()]
+            if len(pending) >= 2 * n_process:
+                pending[0].wait()
+            results.append(pool.apply_async(sort_chunk, (keys, path)))
+
+        return [result.get() for result in results]
+
+
+def reduce_external(inFilename, outFilename, separatorInputFile=" ", separatorOutputFile="\t", chunk_size=10000000,
+                    block_size=1000000, n_process=1, tmp_dir=None):
+    """
+    Aggregates an edge list of arbitrary size into weighted edges, with bounded memory. The output is sorted by
+    (source, target).
+    :param inFilename: (string) Name of the file to be read, with one "source target" edge per line.
+    :param outFilename: (string) Name of the output file. Weighted edges are appended to it.
+    :param separatorInputFile: (string) Separator of the input file.
+    :param separatorOutputFile: (string) Separator of the output file.
+    :param chunk_size: (int) Number of edges that are sorted in memory at once (8 bytes per edge).
+    :param block_size: (int) Number of edges that are read at once during the merge, split evenly among the chunks.
+    :param n_process: (int) Number of processes used for sorting the chunks.
+    :param tmp_dir: (os.path) Directory for the spilled chunks. Defaults to the system's temporary directory.
+    :return: (int) Number of unique edges.
     """
+    num_edges = 0
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as folder:
+        paths = sort_chunks(read_chunks(inFilename, separatorInputFile, chunk_size), folder, n_process)
+
+        with open(outFilename, "a") as f:
+            for keys, weights in merge_chunks(paths, max(block_size // max(len(paths), 1), 1)):
+                sources, targets = unpack(keys)
+                np.savetxt(f, np.column_stack([sources, targets, weights]), delimiter=separatorOutputFile, fmt="%i")
+                num_edges += len(keys)
 
-    uniqueEdgeList = {}
-    with open(inFilename, "r") as f:
-        for line in f:
-            currentEdge = uniqueEdgeList.get(line.strip("\n"), 0)
-            uniqueEdgeList[line.strip("\n")] = currentEdge+1
+    return num_edges
 
-    with open(outFilename, "a") as f:
-        for edge, weight in uniqueEdgeList.items():
-            weightedEdge = separatorOutputFile.join(edge.split(separatorInputFile)) + separatorOutputFile + str(weight) + "\n"
-            f.write(weightedEdge)
+
+def processInBatch(outFilename, separatorInputFile, separatorOutputFile, inFilename="./data/dyadic_edges.csv",
+                   n_process=1):
+    """
+    Does the same thing, but iteratively, since the full edge list is 47 GB...
+    Uses the external sort of reduce_external(), so the memory consumption is independent of the input size.
+    :param outFilename: (string) Name of the output file. Weighted edges are appended to it.
+    :param separatorInputFile: (string) Separator of the input file.
+    :param separatorOutputFile: (string) Separator of the output file.
+    :param inFilename: (string) Name of the file to be read.
+    :param n_process: (int) Number of processes used for sorting.
+    :return: (None)
+    """
+    reduce_external(inFilename, outFilename, separatorInputFile, separatorOutputFile, n_process=n_process)
 
 
 if __name__ == "__main__":
-    # TODO: DOES NOT WORK FOR THE FULL GRAPH!
+    # The in-memory variant below does not work for the full graph, use processInBatch() instead.
     # folder = os.path.dirname(os.path.abspath(__file__))
     # fn = os.path.join(folder, "data/dyadic_full_edges.csv")
     # data = read(fn=fn)
@@ -5,14 +5,62 @@ so there might be some changes introduced since the inception of this file.
 
 Essentially bringing up all the necessary connection stuff, and reducing the interface to the necessary project
 stuff. Building connection, pushing new data, and committing that.
+Connections are taken from a pool that is shared by all connectors with the same connection details, so that
+entering a context does not establish a new connection (TCP, authentication, backend startup) every time.
 """
 
+import itertools
+import threading
+
+import numpy as np
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+# shared pools, one per set of connection details.
+POOLS = {}
+POOLS_LOCK = threading.Lock()
+
+COMMIT_MODES = ("always", "on_success", "never")
+# unique names for server-side cursors, so that several of them can be open on the same connection.
+CURSOR_IDS = itertools.count()
+
+
+def get_pool(database, user, password, host, port, min_connections=1, max_connections=8):
+    """
+    Returns the connection pool for the given connection details, and creates it if necessary.
+    :param database: (str) database name.
+    :param user: (str) User name to get access to the Postgres database.
+    :param password: (str) Corresponding user password.
+    :param host: (IP) IP address (in string format) for the host of the postgres database.
+    :param port: (integer) Port at which to access the database.
+    :param min_connections: (int) Number of connections that are kept open, once the pool is created.
+    :param max_connections: (int) Maximum number of connections that are handed out at the same time.
+    :return: (ThreadedConnectionPool) Pool for the connection details.
+    """
+    key = (database, user, password, host, port)
+    with POOLS_LOCK:
+        if key not in POOLS or POOLS[key].closed:
+            POOLS[key] = ThreadedConnectionPool(min_connections, max_connections, database=database, user=user,
+                                                password=password, host=host, port=port)
+        return POOLS[key]
+
+
+def close_pools():
+    """
+    Closes all connections of all pools, e.g. before shutting down the database container.
+    :return: (None)
+    """
+    with POOLS_LOCK:
+        for pool in POOLS.values():
+            if not pool.closed:
+                pool.closeall()
+        POOLS.clear()
 
 
 class PostgresConnector:
 
-    def __init__(self, database="postgres", user="postgres", password="postgres", host="127.0.0.1", port=5434):
+    def __init__(self, database="postgres", user="postgres", password="postgres", host="127.0.0.1", port=5434,
+                 pooled=True, commit="always", max_connections=8):
         """
         Sets up database connection properties via psycopg2. Also wrapping this in a __enter__ / __exit__, so we do
         not lose any important information later.
@@ -21,23 +69,59 @@ class PostgresConnector:
         :param password: (str) Corresponding user password.
         :param host: (IP) IP address (in string format) for the host of the postgres database.
         :param port: (integer) Port at which to access the database.
+        :param pooled: (boolean) Whether connections are taken from the shared pool, instead of being established
+               (and closed) for every context.
+        :param commit: (str) When to commit on leaving the context: "always" (also on errors, as previously),
+               "on_success" (roll back on errors), or "never" (roll back, unless .commit() was called explicitly).
+        :param max_connections: (int) Maximum number of connections in the pool, if it is created by this connector.
         """
+        if commit not in COMMIT_MODES:
+            raise ValueError("Commit mode has to be one of {}!".format(COMMIT_MODES))
+
         self.database = database
         self.user = user
         self.password = password
         self.host = host
         self.port = port
+        self.pooled = pooled
+        self.commit_mode = commit
+        self.max_connections = max_connections
+
+        self.connection = None
+        self.cursor = None
+        # nested contexts re-use the same connection, and only the outermost one commits.
+        self.depth = 0
+
+    def session(self, commit=None):
+        """
+        Creates a separate connector with the same connection details. Since a connector holds at most one connection
+        at a time, this is required to use several connections in parallel, e.g. from multiple threads.
+        :param commit: (str) Commit mode of the new session. Same as for this connector, if not specified.
+        :return: (PostgresConnector) New connector, which can be used as a context.
+        """
+        return PostgresConnector(self.database, self.user, self.password, self.host, self.port, pooled=self.pooled,
+                                 commit=commit if commit is not None else self.commit_mode,
+                                 max_connections=self.max_connections)
 
     def __enter__(self):
         """
         Establishes context and then returns self
         :return: self
         """
-        self.connection = psycopg2.connect(database=self.database,
-                                           user=self.user,
-                                           password=self.password,
-                                           host=self.host,
-                                           port=self.port)
+        self.depth += 1
+        if self.depth > 1:
+            return self
+
+        if self.pooled:
+            pool = get_pool(self.database, self.user, self.password, self.host, self.port,
+                            max_connections=self.max_connections)
+            self.connection = pool.getconn()
+        else:
+            self.connection = psycopg2.connect(database=self.database,
+                                               user=self.user,
+                                               password=self.password,
+                                               host=self.host,
+                                               port=self.port)
 
         self.cursor = self.connection.cursor()
 
@@ -46,16 +130,86 @@ class PostgresConnector:
     # Thinking about adding a separate .push() or .get() function, but that would simply be an abstraction layer
     # for functions already available in Psycopg2, which I don't see a reason for...
 
+    def stream(self, query, params=None, itersize=10000):
+        """
+        Executes a query through a named (server-side) cursor, and iterates over the result. Only itersize rows are
+        transferred at once, so the result does not have to fit into memory. Has to be called within the context,
+        and the result has to be consumed before the transaction is committed.
+        :param query: (str) Query to execute.
+        :param params: (tuple) Optional query parameters.
+        :param itersize: (int) Number of rows that are fetched from the server at once.
+        :return: (generator) Yields the result rows as tuples.
+        """
+        cursor = self.connection.cursor(name="stream_{}".format(next(CURSOR_IDS)))
+        cursor.itersize = itersize
+        try:
+            cursor.execute(query, params)
+            for row in cursor:
+                yield row
+        finally:
+            cursor.close()
+
+    def stream_blocks(self, query, params=None, block_size=100000, dtype=np.int64):
+        """
+        Same as stream(), but returns the result in blocks of NumPy arrays. Only suitable for numeric results.
+        :param query: (str) Query to execute.
+        :param params: (tuple) Optional query parameters.
+        :param block_size: (int) Number of rows per block, which are also fetched from the server at once.
+        :param dtype: (np.dtype) Type of the arrays.
+        :return: (generator) Yields arrays of shape (rows, columns).
+        """
+        cursor = self.connection.cursor(name="stream_{}".format(next(CURSOR_IDS)))
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(block_size)
+                if not rows:
+                    break
+                yield np.array(rows, dtype=dtype)
+        finally:
+            cursor.close()
+
+    def commit(self):
+        """
+        Commits the current transaction, without leaving the context.
+        :return: (None)
+        """
+        self.connection.commit()
+
+    def rollback(self):
+        """
+        Rolls back the current transaction, without leaving the context.
+        :return: (None)
+        """
+        self.connection.rollback()
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
-        Leaving the context will store the results and try to save every transaction before shutting down.
+        Leaving the context will store the results (depending on the commit mode) before returning the connection.
         :param exc_type: Exception type
         :param exc_val: Exception value
         :param exc_tb: Exception traceback
         :return: (None)
         """
-        # persist
-        self.connection.commit()
-        # clean up
-        self.cursor.close()
-        self.connection.close()
+        self.depth -= 1
+        if self.depth > 0:
+            return None
+
+        try:
+            # persist
+            if not self.connection.closed:
+                if self.commit_mode == "always" or (self.commit_mode == "on_success" and exc_type is None):
+                    self.connection.commit()
+                else:
+                    self.connection.rollback()
+        finally:
+            # clean up
+            self.cursor.close()
+            if self.pooled:
+                pool = get_pool(self.database, self.user, self.password, self.host, self.port)
+                # broken connections are discarded instead of being handed out again.
+                pool.putconn(self.connection, close=bool(self.connection.closed))
+            else:
+                self.connection.close()
+            self.connection = None
+            self.cursor = None
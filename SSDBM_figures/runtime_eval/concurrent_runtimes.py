@@ -0,0 +1,176 @@
+"""
+Evaluates the co-occurrence queries of all storage models under concurrent load.
+In contrast to the add_*_runtimes.py scripts, which run one query after another through a single client, this runs
+the entity x window x model matrix with several concurrent clients (asyncio + asyncpg), and records the latency of
+every query as observed by the client, as well as the throughput of every configuration.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import asyncpg
+import numpy as np
+
+# the queries are shared with the library in the repository root.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from Cooccurrence import QUERIES
+
+
+# query template (see Cooccurrence.QUERIES), table and entity filter of every evaluated model. The templates already
+# take the entity (and window) as query parameters.
+MODELS = {
+    "implicit": ("implicit", "term_occurrence", ""),
+    "implicit_entity": ("implicit", "term_occurrence", "AND t.is_entity = true"),
+    "explicit": ("explicit", "full_{window}_hyperedges", ""),
+    "explicit_entity": ("explicit", "entity_{window}_hyperedges", ""),
+    "dyadic_entity": ("dyadic", "entity_{window}_dyadic", "")
+}
+# models whose query takes the window size as a parameter, instead of a separate table per window size.
+PARAMETRIZED_WINDOW = {model for model, (template, _, _) in MODELS.items() if template == "implicit"}
+
+
+def get_parser():
+    """
+    Creates an argument parser with the relevant options.
+    :return: (argparser) Argument handle.
+    """
+    args = argparse.ArgumentParser(description="Evaluate the query runtimes under concurrent load.")
+
+    args.add_argument("-p", "--port", type=int, default=5436,
+                      help="Port of the Postgres container.")
+    args.add_argument("-m", "--models", type=str, nargs="+", default=sorted(MODELS.keys()),
+                      choices=sorted(MODELS.keys()), help="Storage models to evaluate.")
+    args.add_argument("-w", "--windows", type=int, nargs="+", default=[0, 1, 2, 5],
+                      help="Window sizes to evaluate.")
+    args.add_argument("-c", "--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                      help="Numbers of concurrent clients to evaluate.")
+    args.add_argument("-i", "--iterations", type=int, default=3,
+                      help="Measured iterations over all entities. One additional round is used for cache warm-up.")
+    args.add_argument("-e", "--entities", type=str, default="./entities.json",
+                      help="Entities to query, as generated by get_entities.py.")
+    args.add_argument("-o", "--output", type=str, default="./concurrent_runtimes.json",
+                      help="File to store the results in.")
+
+    return args
+
+
+def get_query(model, window):
+    """
+    :param model: (str) Evaluated model, i.e. a key of MODELS.
+    :param window: (int) Window size.
+    :return: (str) Query for the model and window size, with the entity (and window) as parameters.
+    """
+    template, table, entity_filter = MODELS[model]
+    return QUERIES[template].format(table=table.format(window=window), entity_filter=entity_filter)
+
+
+async def run_query(pool, query, arguments):
+    """
+    Executes a single query and measures its latency as observed by the client, including the result transfer.
+    :param pool: (asyncpg.Pool) Connection pool.
+    :param query: (str) Query to execute.
+    :param arguments: (tuple) Query parameters.
+    :return: (float) Latency in ms.
+    """
+    async with pool.acquire() as connection:
+        start_time = time.perf_counter()
+        await connection.fetch(query, *arguments)
+        return (time.perf_counter() - start_time) * 1000
+
+
+async def run_configuration(pool, query, arguments, concurrency):
+    """
+    Runs all queries with a fixed number of concurrent clients. Every client takes the next open query, so there are
+    always (at most) concurrency queries in flight.
+    :param pool: (asyncpg.Pool) Connection pool with at least concurrency connections.
+    :param query: (str) Query to execute.
+    :param arguments: (list of tuples) Parameters of every query.
+    :param concurrency: (int) Number of concurrent clients.
+    :return: (tuple) Latencies in ms (in order of the arguments), and the total wall-clock time in s.
+    """
+    latencies = [None] * len(arguments)
+    queue = asyncio.Queue()
+    for i, query_arguments in enumerate(arguments):
+        queue.put_nowait((i, query_arguments))
+
+    async def client():
+        while not queue.empty():
+            i, query_arguments = queue.get_nowait()
+            latencies[i] = await run_query(pool, query, query_arguments)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return latencies, time.perf_counter() - start_time
+
+
+def summarize(latencies, wall_time):
+    """
+    :param latencies: (list) Latencies of all queries in ms.
+    :param wall_time: (float) Total time in s.
+    :return: (dict) Latency percentiles and throughput, plus the raw latencies.
+    """
+    return {"throughput": len(latencies) / wall_time,
+            "mean": float(np.mean(latencies)),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "p99": float(np.percentile(latencies, 99)),
+            "latencies": latencies}
+
+
+async def evaluate(opts, entities):
+    """
+    Runs the whole evaluation matrix.
+    :param opts: (argparse.Namespace) Parsed command line options.
+    :param entities: (list) Entity labels to query.
+    :return: (dict) Results per model, window size and concurrency.
+    """
+    results = {}
+    pool = await asyncpg.create_pool(host="127.0.0.1", port=opts.port, user="postgres", password="postgres",
+                                     database="postgres", min_size=max(opts.concurrency),
+                                     max_size=max(opts.concurrency))
+    try:
+        for model in opts.models:
+            for window in opts.windows:
+                query = get_query(model, window)
+                if model in PARAMETRIZED_WINDOW:
+                    arguments = [(entity, window) for entity in entities]
+                else:
+                    arguments = [(entity,) for entity in entities]
+
+                # take one round of cache warm-up
+                await run_configuration(pool, query, arguments, max(opts.concurrency))
+
+                for concurrency in opts.concurrency:
+                    latencies, wall_time = [], 0
+                    for iteration in range(opts.iterations):
+                        iteration_latencies, iteration_time = await run_configuration(pool, query, arguments,
+                                                                                      concurrency)
+                        latencies.extend(iteration_latencies)
+                        wall_time += iteration_time
+
+                    summary = summarize(latencies, wall_time)
+                    results.setdefault(model, {}).setdefault(str(window), {})[str(concurrency)] = summary
+                    print("{} (window {}, {} clients): {:.1f} queries/s, p50 {:.1f} ms, p95 {:.1f} ms"
+                          .format(model, window, concurrency, summary["throughput"], summary["p50"],
+                                  summary["p95"]), flush=True)
+    finally:
+        await pool.close()
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    opts = parser.parse_args()
+
+    with open(opts.entities) as f:
+        entities = list(json.load(f).keys())
+
+    results = asyncio.run(evaluate(opts, entities))
+
+    with open(opts.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
@@ -4,4 +4,5 @@ python3 add_explicit_entity_runtimes.py
 python3 add_implicit_runtimes.py
 python3 add_explicit_runtimes.py
 python3 add_dyadic_entity_runtimes.py
-python3 add_implicit_entity_runtimes.py
\ No newline at end of file
+python3 add_implicit_entity_runtimes.py
+python3 concurrent_runtimes.py
@@ -0,0 +1,239 @@
+"""
+Compact and persistent term dictionary, mapping term texts to their term IDs and back.
+Instead of keeping millions of Python strings in a dict, all terms are stored as one UTF-8 encoded blob, together with
+an offset array (ID order), and a permutation of the IDs by their text (sorted order), which allows lookups via binary
+search. All arrays can be stored on disk as .npy files and memory-mapped when loading, or loaded from the term table in
+Postgres, without re-tokenizing any documents.
+Term IDs are deterministic: new terms are always added in sorted order after the already existing ones.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from collections import OrderedDict
+
+
+class TermDictionary:
+    # version of the on-disk format, stored in the header.
+    version = 1
+
+    def __init__(self, blob=None, offsets=None, order=None, is_entity=None):
+        """
+        Creates a term dictionary, which is empty unless the compact arrays are specified.
+        :param blob: (np.array of uint8) UTF-8 encoded texts of all terms, concatenated in ID order.
+        :param offsets: (np.array of int64) Start of each term in the blob, plus the total length at the end.
+        :param order: (np.array of int32) Term IDs, sorted by their text.
+        :param is_entity: (np.array of bool) Whether the term with the respective ID is an entity.
+        """
+        self.blob = blob if blob is not None else np.zeros(0, dtype=np.uint8)
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self.order = order if order is not None else np.zeros(0, dtype=np.int32)
+        self.is_entity = is_entity if is_entity is not None else np.zeros(0, dtype=np.bool_)
+
+        # terms added since the last compaction. These are simply kept in a dict until compact() is called.
+        self.pending = OrderedDict()
+        self.pending_texts = []
+        self.pending_is_entity = []
+
+    def __len__(self):
+        return len(self.offsets) - 1 + len(self.pending)
+
+    def __contains__(self, text):
+        return self.get(text) is not None
+
+    def __getitem__(self, text):
+        term_id = self.get(text)
+        if term_id is None:
+            raise KeyError(text)
+        return term_id
+
+    def get(self, text, default=None):
+        """
+        Looks up the ID of a term.
+        :param text: (str) Text of the term.
+        :param default: Returned if the term is not present.
+        :return: (int) ID of the term, or default.
+        """
+        if text in self.pending:
+            return self.pending[text]
+
+        # binary search over the compact part. Python's string order is the same as the byte order of UTF-8.
+        encoded = text.encode("utf-8")
+        position = self.search(encoded)
+        if position < len(self.order) and self.encoded(self.order[position]) == encoded:
+            return int(self.order[position])
+
+        return default
+
+    def encoded(self, term_id):
+        """
+        Returns the UTF-8 encoded text of a term in the compact part.
+        :param term_id: (int) ID of the term.
+        :return: (bytes) Encoded text.
+        """
+        return self.blob[self.offsets[term_id]:self.offsets[term_id + 1]].tobytes()
+
+    def text(self, term_id):
+        """
+        Returns the text of a term.
+        :param term_id: (int) ID of the term.
+        :return: (str) Text of the term.
+        """
+        compact_size = len(self.offsets) - 1
+        if term_id >= compact_size:
+            return self.pending_texts[term_id - compact_size]
+
+        return self.encoded(term_id).decode("utf-8")
+
+    def entity(self, term_id):
+        """
+        :param term_id: (int) ID of the term.
+        :return: (boolean) Whether the term is an entity.
+        """
+        compact_size = len(self.offsets) - 1
+        if term_id >= compact_size:
+            return self.pending_is_entity[term_id - compact_size]
+
+        return bool(self.is_entity[term_id])
+
+    def add(self, text, is_entity=False):
+        """
+        Adds a single term, if it is not present yet.
+        :param text: (str) Text of the term.
+        :param is_entity: (boolean) Whether the term is an entity. Ignored for already existing terms.
+        :return: (int) ID of the (new or existing) term.
+        """
+        term_id = self.get(text)
+        if term_id is None:
+            term_id = len(self)
+            self.pending[text] = term_id
+            self.pending_texts.append(text)
+            self.pending_is_entity.append(is_entity)
+
+        return term_id
+
+    def add_all(self, texts, is_entity=None):
+        """
+        Adds several terms at once. Previously unseen terms get consecutive IDs in sorted order, so the resulting IDs
+        only depend on the set of terms, and not on the order in which they were encountered.
+        :param texts: (iterable) Texts of the terms.
+        :param is_entity: (dict) Optional mapping of the texts to their entity property.
+        :return: (None)
+        """
+        for text in sorted(set(texts)):
+            self.add(text, is_entity.get(text, False) if is_entity else False)
+
+    def compact(self):
+        """
+        Moves all pending terms into the compact representation, and rebuilds the sorted order.
+        :return: (None)
+        """
+        if not self.pending:
+            return None
+
+        encoded = [text.encode("utf-8") for text in self.pending_texts]
+        lengths = np.array([len(el) for el in encoded], dtype=np.int64)
+
+        self.blob = np.concatenate([self.blob, np.frombuffer(b"".join(encoded), dtype=np.uint8)])
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+        self.is_entity = np.concatenate([self.is_entity, np.array(self.pending_is_entity, dtype=np.bool_)])
+
+        # merge the new terms into the existing sorted order.
+        new_ids = np.arange(len(self.order), len(self.order) + len(encoded), dtype=np.int32)
+        new_ids = new_ids[np.argsort(np.array(encoded, dtype=object), kind="stable")]
+        positions = [self.search(el) for el in sorted(encoded)]
+        self.order = np.insert(self.order, positions, new_ids).astype(np.int32)
+
+        self.pending = OrderedDict()
+        self.pending_texts = []
+        self.pending_is_entity = []
+
+    def search(self, encoded):
+        """
+        Finds the insertion position of an encoded text in the sorted order of the compact part.
+        :param encoded: (bytes) UTF-8 encoded text.
+        :return: (int) Position in self.order.
+        """
+        low, high = 0, len(self.order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.encoded(self.order[middle]) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def rows(self, start=0):
+        """
+        Returns the terms in the format of the Postgres term table.
+        :param start: (int) First term ID to be returned. Can be used to retrieve only newly added terms.
+        :return: (generator) Tuples of (term_id, term_text, is_entity).
+        """
+        for term_id in range(start, len(self)):
+            yield term_id, self.text(term_id), self.entity(term_id)
+
+    def save(self, path):
+        """
+        Stores the dictionary in a directory, as one .npy file per array plus a small JSON header.
+        :param path: (os.path) Directory to store the dictionary in. Will be created if necessary.
+        :return: (None)
+        """
+        self.compact()
+        os.makedirs(path, exist_ok=True)
+
+        np.save(os.path.join(path, "blob.npy"), self.blob)
+        np.save(os.path.join(path, "offsets.npy"), self.offsets)
+        np.save(os.path.join(path, "order.npy"), self.order)
+        np.save(os.path.join(path, "is_entity.npy"), self.is_entity)
+        with open(os.path.join(path, "header.json"), "w") as f:
+            json.dump({"version": self.version, "size": len(self)}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Loads a dictionary that was previously stored with save().
+        :param path: (os.path) Directory containing the dictionary.
+        :param mmap: (boolean) Whether to memory-map the arrays instead of reading them into memory.
+        :return: (TermDictionary) Loaded dictionary.
+        """
+        with open(os.path.join(path, "header.json"), "r") as f:
+            header = json.load(f)
+        if header["version"] != cls.version:
+            raise ValueError("Unsupported term dictionary version {}!".format(header["version"]))
+
+        mmap_mode = "r" if mmap else None
+        return cls(blob=np.load(os.path.join(path, "blob.npy"), mmap_mode=mmap_mode),
+                   offsets=np.load(os.path.join(path, "offsets.npy"), mmap_mode=mmap_mode),
+                   order=np.load(os.path.join(path, "order.npy"), mmap_mode=mmap_mode),
+                   is_entity=np.load(os.path.join(path, "is_entity.npy"), mmap_mode=mmap_mode))
+
+    @classmethod
+    def from_postgres(cls, pc, term_table_name="terms"):
+        """
+        Loads the dictionary from the term table in Postgres. Term IDs have to be consecutive, starting from 0.
+        :param pc: (PostgresConnector) Connector to the database.
+        :param term_table_name: (str) Name of the term table.
+        :return: (TermDictionary) Loaded dictionary.
+        """
+        encoded = []
+        is_entity = []
+        with pc as open_pc:
+            open_pc.cursor.execute("SELECT term_id, term_text, is_entity FROM {} ORDER BY term_id"
+                                   .format(term_table_name))
+            for i, (term_id, text, entity) in enumerate(open_pc.cursor):
+                if term_id != i:
+                    raise ValueError("Term IDs are not consecutive! Expected {}, found {}.".format(i, term_id))
+                encoded.append(text.encode("utf-8"))
+                is_entity.append(bool(entity))
+
+        lengths = np.array([len(el) for el in encoded], dtype=np.int64)
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        return cls(blob=np.frombuffer(b"".join(encoded), dtype=np.uint8).copy(),
+                   offsets=offsets,
+                   order=np.argsort(np.array(encoded, dtype=object), kind="stable").astype(np.int32),
+                   is_entity=np.array(is_entity, dtype=np.bool_))
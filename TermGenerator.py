@@ -10,18 +10,20 @@ import logging
 import os
 import spacy
 import time
+import numpy as np
 
 from collections import Counter, OrderedDict
+from itertools import groupby, tee
 
-from utils import set_up_logger, check_table_existence
+from utils import set_up_logger, check_table_existence, insert_into_table, copy_columns_into_table
 
-from MongoConnector import MongoConnector
+from DocumentSource import MongoDocumentSource
 from PostgresConnector import PostgresConnector
+from TermDictionary import TermDictionary
+from OccurrenceBuffer import OccurrenceBuffer
 
 from spacy.lang.en.stop_words import STOP_WORDS
 from nltk.corpus import stopwords
-from psycopg2 import ProgrammingError, IntegrityError
-from psycopg2.extras import execute_values
 
 
 class TermGenerator:
@@ -32,6 +34,11 @@ class TermGenerator:
                  remove_stopwords=True,
                  custom_stopwords=[',', '.', '-', '\xa0', '“', '”', '"', '\n', '—', ':', '?', 'I', '(', ')'],
                  analyze=False,
+                 incremental=False,
+                 tokenizer_only=True,
+                 n_process=1,
+                 batch_size=1000,
+                 source=None,
                  document_tabe_name="documents",
                  sentence_table_name="sentences",
                  sentence_fields=OrderedDict({"doc_id":"document_id",
@@ -53,7 +60,7 @@ class TermGenerator:
                  log_level=logging.INFO,
                  log_verbose=True):
         """
-        Initializes various parameters, registers logger and MongoConnector, and sets up the limit.
+        Initializes various parameters, registers logger and document source, and sets up the limit.
         :param num_distinct_documents: (int) The number of distinct documents retrieved from the queries.
                For performance reasons, this should be limited during debugging/development.
                0 (Zero) represents no limit, in accordance with the MongoDB standard for .limit().
@@ -66,6 +73,16 @@ class TermGenerator:
                deciding on the final set, but likely either one (or both) of NLTK and SpaCy's stop word lists.
         :param custom_stopwords: (list of strings) Additional words that will not be considered at adding-time.
         :param analyze: (boolean) Whether or not to include analytically relevant metrics.
+        :param incremental: (boolean) If set, only documents without any inserted sentences are processed. The already
+               existing term dictionary is re-used, so that only previously unseen terms get new (consecutive) IDs,
+               and only these new terms and entities are pushed later.
+        :param tokenizer_only: (boolean) Only builds the spaCy tokenizer from the English language defaults, instead of
+               loading the full statistical model. Since the parser, tagger and NER are disabled anyway, this yields the
+               same tokens (see check_tokenizer_parity()), but starts up much faster and uses less memory.
+        :param n_process: (int) Number of processes used to tokenize the sentences with nlp.pipe(). -1 uses all
+               available cores. Since the results are returned in input order, the output does not depend on this.
+        :param batch_size: (int) Number of sentences that are sent to a tokenizing process at once.
+        :param source: (DocumentSource) Source from which sentences and entities are read. Defaults to the MongoDB.
         :param document_tabe_name: (str) Name of the table where the document information is stored.
         :param sentence_table_name: (str) Name of the table where the sentence information will be stored.
         :param sentence_fields: (OrderedDict) Structure of input to output values from MongoDB to postgres for the
@@ -86,9 +103,9 @@ class TermGenerator:
         self.logger = set_up_logger(__name__, log_file, log_level, log_verbose)
         self.logger.info("Successfully registered logger to TermGenerator.")
 
-        # register a MongoConnector
-        self.mc = MongoConnector()
-        self.logger.info("Successfully registered MongoConnector to TermGenerator.")
+        # register the document source, by default a MongoConnector
+        self.source = source if source is not None else MongoDocumentSource()
+        self.logger.info("Successfully registered {} to TermGenerator.".format(type(self.source).__name__))
 
         # PostgresConnector
         self.pc = PostgresConnector(database, user, password, host, port)
@@ -100,48 +117,64 @@ class TermGenerator:
         # get the distinct IDs for the documents so we can match against them later
         # since we have removed parts of the document collection, we have to make sure to get this from Postgres.
         self.logger.info("Parsing relevant documents from Postgres...")
-        with self.pc as open_pc:
-            open_pc.cursor.execute("SELECT document_id FROM {}".format(self.document_table_name))
-            self.first_distinct_documents = list(open_pc.cursor.fetchall())
-            # extract from the tuple structure
-            self.first_distinct_documents = [el[0] for el in self.first_distinct_documents]
-            self.logger.info("Retrieved all relevant documents from Postgres.")
-
-        # additionally restrict if we want only a number of documents.
+        self.incremental = incremental
+        self.sentence_table_name = sentence_table_name
+        if self.incremental:
+            query = "SELECT d.document_id FROM {} as d WHERE NOT EXISTS " \
+                    "(SELECT 1 FROM {} as s WHERE s.document_id = d.document_id)" \
+                    .format(self.document_table_name, self.sentence_table_name)
+        else:
+            query = "SELECT document_id FROM {}".format(self.document_table_name)
+        # additionally restrict if we want only a number of documents. Done directly in the query, so that the
+        # remaining document IDs are never transferred.
         if self.num_distinct_documents != 0:
             self.logger.info("Non-zero limit detected. Limiting to the first N entries.")
-            self.first_distinct_documents = self.first_distinct_documents[:self.num_distinct_documents]
+            query += " LIMIT {}".format(self.num_distinct_documents)
+
+        with self.pc as open_pc:
+            self.first_distinct_documents = []
+            for block in open_pc.stream_blocks(query):
+                # extract from the tuple structure
+                self.first_distinct_documents.extend(block[:, 0].tolist())
+            self.logger.info("Retrieved all relevant documents from Postgres.")
 
         self.replace_entities = replace_entities
         self.analyze = analyze
 
         self.max_term_length = max_term_length
 
-        self.nlp = spacy.load("en")
+        self.tokenizer_only = tokenizer_only
+        if self.tokenizer_only:
+            self.nlp = spacy.blank("en")
+        else:
+            self.nlp = spacy.load("en")
+        self.n_process = n_process
+        self.batch_size = batch_size
 
-        # construct dictionary with the entries per document/sentence id pair. Thus, we can later check whether
-        # there are any entities in the current sentence with higher efficiency.
-        self.occurrence_dict = {}
-        self.occurring_entities = []
+        # number of entity occurrences that were aligned with the retrieved sentences.
+        self.num_occurring_entities = 0
 
         # start building the term dictionary/set, as well as an occurence map. Since terms will be "post-processed",
-        # it is first created as a list and later cast to Counter and set.
-        self.terms = [] # cast into a set later on.
-        self.term_in_sentence = set()
+        # every text first gets a provisional ID (in order of first occurrence), which is replaced later on.
+        self.terms = set()
+        self.provisional_term_id = {}
+        self.term_in_sentence = OccurrenceBuffer()
         self.term_id = {}
         self.term_is_entity = {}
+        # persistent dictionary of all terms (only pre-filled in incremental mode), and the first ID of new terms.
+        self.dictionary = TermDictionary()
+        self.first_new_term_id = 0
         if self.analyze:
             self.term_count = Counter()
             self.entity_count = Counter()
 
         self.entities = []
-        self.sentences = []
+        self.num_sentences = 0
         self.processed_sentences = []
 
         # Postgres tables
         if not sentence_fields:
             self.logger.error("No sentence fields specified!")
-        self.sentence_table_name = sentence_table_name
         self.sentence_fields = sentence_fields
         if not term_sql_format:
             self.logger.error("No term fields specified!")
@@ -157,10 +190,7 @@ class TermGenerator:
         self.entity_sql_format = ", ".join(entity_sql_format)
 
         # value retrieving parse:
-        self.sentence_values_to_retrieve = {key: 1 for key in self.sentence_fields.keys()}
-        # suppress _id if not present:
-        if "_id" not in self.sentence_values_to_retrieve.keys():
-            self.sentence_values_to_retrieve["_id"] = 0
+        self.sentence_values_to_retrieve = list(self.sentence_fields.keys())
         self.sentence_sql_format = ", ".join([value for value in self.sentence_fields.values()])
 
         # create union of stop words, and add potentially custom stop words
@@ -171,96 +201,141 @@ class TermGenerator:
         for word in custom_stopwords:
             self.stopwords.add(word)
 
+        if self.incremental:
+            self.load_terms()
+
         self.logger.info("Successfully initialized TermGenerator.")
 
-    def get_relevant_documents_and_entities(self):
+    def load_terms(self):
         """
-        TODO!
-        :return:
+        Loads the already inserted terms from Postgres, so that their IDs can be re-used for incremental insertion.
+        :return: (None) Internally fills the term dictionary.
         """
-        with self.mc as open_mc:
-            sentences = open_mc.client[open_mc.news].sentences
-            # distinction for (un)limited documents:
-            if self.first_distinct_documents:
-                self.sentences = list(sentences.find({"doc_id": {"$in": self.first_distinct_documents}},
-                                                     self.sentence_values_to_retrieve))
-            else:
-                self.sentences = list(sentences.find({}, self.sentence_values_to_retrieve))
+        self.logger.info("Loading existing terms from Postgres...")
+        with self.pc as open_pc:
+            if not check_table_existence(self.logger, open_pc, self.term_table_name):
+                return 0
 
-            # get entities only if we actually want to replace them.
-            if self.replace_entities:
-                self.replace_procedure(open_mc)
+        self.dictionary = TermDictionary.from_postgres(self.pc, self.term_table_name)
+        self.logger.info("Loaded {} existing terms.".format(len(self.dictionary)))
 
-    def replace_procedure(self, open_mc):
+    def stream_sentences(self, open_source):
         """
-        TODO!
-        :param open_mc:
-        :return:
+        Opens a cursor over the relevant sentences, so they never have to be loaded all at once. Sorted in the same
+        order as the entities, so that both can be merge-joined.
+        :param open_source: (DocumentSource) Open document source.
+        :return: (generator) Iterator over the relevant sentences.
         """
-        entities = open_mc.client[open_mc.news].entities
-        # potentially RAM-hazardous for larger results:
-        if self.first_distinct_documents:
-            self.occurring_entities = list(entities.find({"doc_id": {"$in": self.first_distinct_documents}}))
-        else:
-            self.occurring_entities = list(entities.find({}))
-
-        self.logger.info("Retrieved relevant entities. Found a total of {} occurrences.".
-                         format(len(self.occurring_entities)))
+        # an empty list of documents means no restriction.
+        return open_source.find("sentences", doc_ids=self.first_distinct_documents,
+                                fields=self.sentence_values_to_retrieve,
+                                sort=["doc_id", "sen_id"], batch_size=self.batch_size)
 
-        # do "blind pass" through the dict to collect all possible keys. The alternative is a single pass,
-        # but requires a "for x in dict.keys()" check for every element, which is more costly,
-        # especially for large results.
-        for ent in self.occurring_entities:
-            self.occurrence_dict[(ent["doc_id"], ent["sen_id"])] = []
-        # now insert in the second pass
-        for ent in self.occurring_entities:
-            self.occurrence_dict[(ent["doc_id"], ent["sen_id"])].append(ent)
+    def replace_procedure(self, open_source):
+        """
+        Opens a cursor over the entities of the relevant documents. The entities are sorted in the same order as the
+        sentences, and additionally by their start position within the sentence, so they can be streamed alongside
+        the sentences without ever loading the whole collection. For larger collections, this requires an index on
+        (doc_id, sen_id, start_sen) in MongoDB, or a correspondingly sorted local export.
+        :param open_source: (DocumentSource) Open document source.
+        :return: (generator) Iterator over the relevant entities.
+        """
+        # no further sort keys, since the sort could otherwise not be served by the index.
+        return open_source.find("entities", doc_ids=self.first_distinct_documents,
+                                sort=["doc_id", "sen_id", "start_sen"], batch_size=self.batch_size)
 
     def process_unreplaced(self):
         """
         TODO
         :return:
         """
-        for doc in self.sentences:
-            parsed = self.nlp(doc["content"], disable=['parser', 'tagger', 'ner'])
-
-            for token in parsed:
-                self.add_token(doc["doc_id"], doc["sen_id"], token.text, False)
+        with self.source as open_source:
+            for parsed, doc in self.tokenize(self.stream_sentences(open_source)):
+                for token in parsed:
+                    self.add_token(doc["doc_id"], doc["sen_id"], token.text, False)
 
     def process_replaced(self):
         """
         TODO!
         :return:
         """
-        for doc in self.sentences:
-            parsed = self.nlp(doc["content"], disable=['parser', 'tagger', 'ner'])
+        with self.source as open_source:
+            entities = self.replace_procedure(open_source)
+            # both tokenize() and the alignment preserve the order of the sentences, so the alignment can simply
+            # follow the tokenized sentences.
+            tokenized, to_align = tee(self.tokenize(self.stream_sentences(open_source)))
+            aligned = align_entities((doc for _, doc in to_align), entities)
+            for (parsed, doc), current_entities in zip(tokenized, aligned):
+                self.num_occurring_entities += len(current_entities)
+                # check whether there are any entities in the current sentence:
+                if current_entities:
+                    self.process_document(doc, parsed, current_entities)
 
-            # check whether there are any entities in the current sentence:
-            try:
-                self.process_document(doc, parsed)
+                # no entities in the current sentence means we can "proceed as normal"
+                else:
+                    for token in parsed:
+                        self.add_token(doc["doc_id"], doc["sen_id"], token.text)
 
-            # no entities in the current sentence means we can "proceed as normal"
-            except KeyError:
-                for token in parsed:
-                    self.add_token(doc["doc_id"], doc["sen_id"], token.text)
+        self.logger.info("Aligned a total of {} entity occurrences.".format(self.num_occurring_entities))
 
-    def process_document(self, doc, parsed):
+    def tokenize(self, sentences):
         """
-        TODO!
-        :param doc:
-        :param parsed:
-        :return:
+        Tokenizes the given sentences. With n_process > 1, the sentences are split into batches that are
+        processed in parallel, but the results are still returned in the original order, so the subsequently
+        generated terms and term IDs are the same as for sequential processing.
+        :param sentences: (iterable) Sentence dictionaries, e.g. from stream_sentences().
+        :return: (generator) Yields tuples of (parsed, doc), where parsed is the spaCy Doc of the sentence doc.
+        """
+        sentences = self.count_sentences(sentences)
+        if self.tokenizer_only and self.n_process == 1:
+            # without any pipeline components, we can directly skip to the tokenizer. tee() only buffers the
+            # sentences of the current batch.
+            sentences, documents = tee(sentences)
+            texts = (doc["content"] for doc in sentences)
+            return zip(self.nlp.tokenizer.pipe(texts, batch_size=self.batch_size), documents)
+
+        texts = ((doc["content"], doc) for doc in sentences)
+        return self.nlp.pipe(texts, as_tuples=True, disable=['parser', 'tagger', 'ner'],
+                             n_process=self.n_process, batch_size=self.batch_size)
+
+    def count_sentences(self, sentences):
         """
-        # Get ascending order of elements
-        current_entities = self.occurrence_dict[(doc["doc_id"], doc["sen_id"])]
-        # Since they aren't quite sorted in ascending order within the document (sorting runs out of memory,
-        # we have to "offline-sort" with respect to the starting position key.
-        # This is probably also smarter, since we know that each sentence only has a very limited number of
-        # entities, whereas the sort on the whole document collection is way way bigger. (Plus, we already
-        # have some sort of sorting, and just need to have the last key.
-        current_entities = sorted(current_entities, key=lambda k: k['start_sen'])
+        Passes the sentences through, and counts them in self.num_sentences.
+        :param sentences: (iterable) Sentence dictionaries.
+        :return: (generator) The same sentences.
+        """
+        for sentence in sentences:
+            self.num_sentences += 1
+            yield sentence
 
-        current_el = current_entities.pop(0)
+    def check_tokenizer_parity(self, texts):
+        """
+        Compares the tokens of the currently used pipeline with the ones of the full spaCy model, which was used
+        before the tokenizer-only mode. Loads the full model, so this is only meant for verification.
+        :param texts: (list of strings) Sample sentences to compare on.
+        :return: (boolean) True if all texts were tokenized identically, False otherwise.
+        """
+        full_nlp = spacy.load("en")
+        identical = True
+        for text in texts:
+            expected = [token.text for token in full_nlp(text, disable=['parser', 'tagger', 'ner'])]
+            actual = [token.text for token in self.nlp.tokenizer(text)]
+            if expected != actual:
+                self.logger.error("Tokenizer mismatch for \"{}\":\n {}\n {}".format(text, expected, actual))
+                identical = False
+
+        return identical
+
+    def process_document(self, doc, parsed, current_entities):
+        """
+        Adds the tokens of a sentence, where all tokens covered by an entity are replaced by the entity label.
+        :param doc: (dict) Sentence as retrieved from MongoDB.
+        :param parsed: (spacy.tokens.Doc) Tokenized sentence.
+        :param current_entities: (list) Non-empty list of entities in the sentence, sorted by their start position.
+        :return: None. Only internally adds the terms.
+        """
+        current_index = 0
+        current_el = current_entities[current_index]
         # character position of start and end.
         current_start = current_el["start_sen"]
         current_end = current_el["end_sen"]
@@ -290,9 +365,10 @@ class TermGenerator:
                 self.add_token(doc["doc_id"], doc["sen_id"], current_entity_text,
                                True, current_el["neClass"])
                 self.add_token(doc["doc_id"], doc["sen_id"], token.text)
-                # reset entity elements. Be careful with popping, as the last element will still reach this.
-                if current_entities:
-                    current_el = current_entities.pop(0)
+                # reset entity elements. Be careful with the index, as the last element will still reach this.
+                current_index += 1
+                if current_index < len(current_entities):
+                    current_el = current_entities[current_index]
                     current_start = current_el["start_sen"]
                     current_end = current_el["end_sen"]
 
@@ -304,21 +380,32 @@ class TermGenerator:
         TODO
         :return:
         """
-        # this allows us to later analyze the term frequency count.
+        # this allows us to later analyze the term frequency count. Occurrences are not de-duplicated yet.
         if self.analyze:
-            self.term_count = Counter(self.terms)
-            self.entity_count = Counter([el for el in self.terms if self.term_is_entity[el][0]])
-        self.terms = set(self.terms)
-        self.term_id = {term: i for i, term in enumerate(self.terms)}
+            counts = np.bincount(self.term_in_sentence.columns()[2], minlength=len(self.provisional_term_id))
+            self.term_count = Counter(dict(zip(self.provisional_term_id.keys(), counts.tolist())))
+            self.entity_count = Counter({k: v for k, v in self.term_count.items() if self.term_is_entity[k][0]})
+        self.terms = set(self.provisional_term_id.keys())
+        # the dictionary stores terms with their limited length, and assigns IDs to new terms in sorted order, so that
+        # the IDs do not depend on the processing order. Previously inserted terms (incremental mode) keep their IDs.
+        self.first_new_term_id = len(self.dictionary)
+        self.term_id = {}
+        mapping = np.zeros(len(self.provisional_term_id), dtype=np.int32)
+        for term in sorted(self.terms):
+            self.term_id[term] = self.dictionary.add(term[:self.max_term_length], self.term_is_entity[term][0])
+            mapping[self.provisional_term_id[term]] = self.term_id[term]
 
         # get the corresponding entity information. Since term_id and entity_id have to match, we have to re-iterate
-        self.entities = [(self.term_id[k], v[1]) for k, v in self.term_is_entity.items() if v[0]]
-
-        # replace the words with the indexed term.
-        self.term_in_sentence = [(el[0], el[1], self.term_id[el[2]]) for el in self.term_in_sentence]
+        # Several terms can be shortened to the same text, so make sure to only add each ID once.
+        self.entities = OrderedDict((self.term_id[k], v[1]) for k, v in self.term_is_entity.items()
+                                    if v[0] and self.term_id[k] >= self.first_new_term_id)
+        self.entities = list(self.entities.items())
 
-        # "polish" the raw sentences as tuples that we can fit:
-        self.sentences = [list(sent.values()) for sent in self.sentences]
+        # replace the provisional IDs with the final ones. Only afterwards remove duplicates, since several terms can
+        # be shortened to the same text.
+        self.term_in_sentence.remap(mapping)
+        self.term_in_sentence.unique()
+        self.provisional_term_id = {}
 
     def parse(self):
         """
@@ -330,7 +417,10 @@ class TermGenerator:
         self.logger.info("Starting to parse results...")
         start_time = time.time()
 
-        self.get_relevant_documents_and_entities()
+        # an empty document list would otherwise mean "no limit".
+        if self.incremental and not self.first_distinct_documents:
+            self.logger.info("No new documents found.")
+            return 0
 
         # moved if to the outer part, since we'd otherwise do a re-check every iteration, even if it causes some
         # minor code duplication.
@@ -350,7 +440,7 @@ class TermGenerator:
 
     def add_token(self, doc_id, sen_id, text, is_entity=False, entity_type=None):
         """
-        Helper function that adds the given text to the set of terms, and term_in_sentence dictionary
+        Helper function that adds the given text to the set of terms, and the term_in_sentence buffer
         :param doc_id: (int) Document ID from the document containing the current sentence.
         :param sen_id: (int) Sentence position of the current sentence within the article it was processed from.
         :param text: (string) Text of the term to be appended.
@@ -364,12 +454,11 @@ class TermGenerator:
             self.removed_counter += 1
             return None
 
-        self.terms.append(text)
+        term_id = self.provisional_term_id.setdefault(text, len(self.provisional_term_id))
         # fill information on entity
         self.term_is_entity[text] = (is_entity, entity_type)
 
-        # somehow fails if both of that is done in a single line.
-        self.term_in_sentence.add((doc_id, sen_id, text))
+        self.term_in_sentence.append(doc_id, sen_id, term_id)
 
     def push_sentences(self):
         """
@@ -379,7 +468,7 @@ class TermGenerator:
         """
         self.logger.info("Starting to push sentences in Postgres...")
 
-        if not self.sentences:
+        if not self.num_sentences:
             self.logger.error("No data found to be pushed! Please call .parse() first!")
             return 0
 
@@ -393,16 +482,16 @@ class TermGenerator:
 
             # build query
             start_time = time.time()
-            try:
-                execute_values(open_pc.cursor,
-                               "INSERT INTO {} ({}) VALUES %s".format(self.sentence_table_name, self.sentence_sql_format),
-                               self.sentences)
-
-                end_time = time.time()
-                self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
-            except IntegrityError as err:
-                self.logger.error("Values with previously inserted primary key detected!\n {}".format(err))
-                return 0
+            # the sentences are streamed a second time, instead of keeping all of them in memory since parsing.
+            with self.source as open_source:
+                rows = ([sent[field] for field in self.sentence_values_to_retrieve]
+                        for sent in self.stream_sentences(open_source))
+                if not insert_into_table(open_pc, self.sentence_table_name, self.sentence_sql_format, rows,
+                                         self.logger):
+                    return 0
+
+            end_time = time.time()
+            self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
 
     def push_terms(self):
         """
@@ -417,7 +506,7 @@ class TermGenerator:
             return 0
 
         # prepare values for insertion. Also force length for test run.
-        push_terms = [(val, key[:self.max_term_length], self.term_is_entity[key][0]) for key, val in self.term_id.items()]
+        push_terms = self.dictionary.rows(start=self.first_new_term_id)
 
         with self.pc as open_pc:
             # TODO: Maybe check whether number of insertions matches feed.
@@ -429,17 +518,12 @@ class TermGenerator:
 
             # build query
             start_time = time.time()
-            try:
-                execute_values(open_pc.cursor,
-                               "INSERT INTO {} ({}) VALUES %s".format(self.term_table_name, self.term_sql_format),
-                               push_terms)
-
-                end_time = time.time()
-                self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
-            except IntegrityError as err:
-                self.logger.error("Values with previously inserted primary key detected!\n {}".format(err))
+            if not insert_into_table(open_pc, self.term_table_name, self.term_sql_format, push_terms, self.logger):
                 return 0
 
+            end_time = time.time()
+            self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
+
     def push_term_occurrences(self):
         """
         Puts the term occurrences into a Postgres table.
@@ -462,18 +546,23 @@ class TermGenerator:
 
             # build query
             start_time = time.time()
-            try:
-                execute_values(open_pc.cursor,
-                               "INSERT INTO {} ({}) VALUES %s".format(self.term_occurrence_table_name,
-                                                                      self.term_occurrence_sql_format),
-                               self.term_in_sentence)
-
-                end_time = time.time()
-                self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
-            except IntegrityError as err:
-                self.logger.error("Values with previously inserted primary key detected!\n {}".format(err))
+            if not copy_columns_into_table(open_pc, self.term_occurrence_table_name, self.term_occurrence_sql_format,
+                                           self.term_in_sentence.columns(), self.logger):
                 return 0
 
+            end_time = time.time()
+            self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
+
+    def touched_terms(self):
+        """
+        Returns the terms occurring in the parsed documents. In incremental mode, these are the only terms whose
+        co-occurrences have changed, see CooccurrenceCache.invalidate_terms().
+        :return: (np.array) Sorted, unique term IDs.
+        """
+        if not self.term_in_sentence:
+            return np.zeros(0, dtype=np.int32)
+        return np.unique(self.term_in_sentence.columns()[2])
+
     def push_entities(self):
         """
         Puts the entities into a Postgres table.
@@ -498,17 +587,13 @@ class TermGenerator:
 
             # build query
             start_time = time.time()
-            try:
-                execute_values(open_pc.cursor,
-                               "INSERT INTO {} ({}) VALUES %s".format(self.entity_table_name, self.entity_sql_format),
-                               self.entities)
-
-                end_time = time.time()
-                self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
-            except IntegrityError as err:
-                self.logger.error("Values with previously inserted primary key detected!\n {}".format(err))
+            if not insert_into_table(open_pc, self.entity_table_name, self.entity_sql_format,
+                                     self.entities, self.logger):
                 return 0
 
+            end_time = time.time()
+            self.logger.info("Successfully inserted values in {:.4f} s".format(end_time - start_time))
+
     def clear_table(self, table_name):
         """
         Deletes previously inserted values from the specified table.
@@ -527,6 +612,30 @@ class TermGenerator:
             self.logger.info("Successfully deleted all previously inserted {}.".format(table_name))
 
 
+def align_entities(sentences, entities):
+    """
+    Merge-joins sentences with their entities. Both have to be sorted by (doc_id, sen_id), and the entities
+    additionally by their start position. Only the entities of the current sentence are held in memory.
+    :param sentences: (iterable) Sentence dictionaries, containing at least doc_id and sen_id.
+    :param entities: (iterable) Entity dictionaries, containing at least doc_id and sen_id.
+    :return: (generator) Yields the (possibly empty) list of entities for every sentence, in the sentence order.
+    """
+    grouped = groupby(entities, key=lambda ent: (ent["doc_id"], ent["sen_id"]))
+    current_key, current_group = next(grouped, (None, None))
+
+    for sentence in sentences:
+        key = (sentence["doc_id"], sentence["sen_id"])
+        # skip entities of sentences that are not part of the result.
+        while current_key is not None and current_key < key:
+            current_key, current_group = next(grouped, (None, None))
+
+        if current_key == key:
+            yield list(current_group)
+            current_key, current_group = next(grouped, (None, None))
+        else:
+            yield []
+
+
 if __name__ == "__main__":
 
     tg = TermGenerator(num_distinct_documents=0)
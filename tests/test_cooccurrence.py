@@ -0,0 +1,62 @@
+from unittest import TestCase
+
+
+class TestCooccurrence(TestCase):
+    def test_invalid_model(self):
+        from Cooccurrence import Cooccurrence
+        with self.assertRaises(ValueError):
+            Cooccurrence(log_file="test.log").query("London", 2, model="relational")
+
+    def test_query(self):
+        from Cooccurrence import Cooccurrence
+        from PostgresConnector import PostgresConnector
+        cooc = Cooccurrence(PostgresConnector(port=5436), log_file="test.log")
+        # parameter binding, so quotes do not need any sanitizing.
+        for model in ["implicit", "explicit", "dyadic"]:
+            result = cooc.query("People's Party", 2, model=model, entities_only=True, limit=10)
+            self.assertLessEqual(len(result), 10)
+            self.assertEqual([el[1] for el in result], sorted([el[1] for el in result], reverse=True))
+
+    def test_get_representation(self):
+        from Cooccurrence import Cooccurrence
+        cooc = Cooccurrence(log_file="test.log")
+        # known tables, so that no connection is required.
+        cooc.tables = {"term_occurrence", "entity_2_dyadic", "entity_2_cooccurrence", "full_2_dyadic",
+                       "full_2_hyperedges"}
+        self.assertEqual(cooc.get_representation(None, "dyadic", 2, True), ("matrix", "entity_2_cooccurrence", False))
+        self.assertEqual(cooc.get_representation(None, "dyadic", 2, False), ("dyadic", "full_2_dyadic", False))
+        self.assertEqual(cooc.get_representation(None, "explicit", 2, True), ("explicit", "full_2_hyperedges", True))
+        self.assertIsNone(cooc.get_representation(None, "dyadic", 3, False))
+
+    def test_cooccurrence_matrix(self):
+        from Cooccurrence import Cooccurrence
+        from GenerateNewSchema import SchemaCreator
+        from PostgresConnector import PostgresConnector
+        sc = SchemaCreator(prefix="entity", window_size=2, incremental=True, port=5436, log_file="test.log")
+        sc.create_cooccurrence_matrix("entity_2")
+        # without a watermark, the existing weights must not be counted twice.
+        with sc.pc as open_pc:
+            open_pc.cursor.execute("DELETE FROM cooccurrence_watermarks WHERE table_name = 'entity_2_cooccurrence'")
+        sc.create_cooccurrence_matrix("entity_2")
+
+        cooc = Cooccurrence(PostgresConnector(port=5436), log_file="test.log")
+        with cooc.pc as open_pc:
+            self.assertEqual(cooc.get_representation(open_pc, "dyadic", 2, True)[0], "matrix")
+        result = cooc.query("Donald Trump", 2, model="dyadic", entities_only=True)
+        with PostgresConnector(port=5436) as open_pc:
+            open_pc.cursor.execute("SELECT t2.term_text, COUNT(*) FROM entity_2_dyadic d, terms t1, terms t2 "
+                                   "WHERE d.source_id = t1.term_id AND d.target_id = t2.term_id "
+                                   "AND t1.term_text = %s AND t2.term_id != t1.term_id GROUP BY t2.term_text",
+                                   ("Donald Trump",))
+            expected = dict(open_pc.cursor.fetchall())
+        self.assertEqual(dict(result), expected)
+
+    def test_shared_pool(self):
+        from Cooccurrence import Cooccurrence
+        from PostgresConnector import PostgresConnector
+        # both instances are handed the same pooled connection, which must only be prepared once.
+        first = Cooccurrence(PostgresConnector(port=5436), log_file="test.log")
+        second = Cooccurrence(PostgresConnector(port=5436), log_file="test.log")
+        for model in ["implicit", "explicit", "dyadic"]:
+            self.assertEqual(first.query("Donald Trump", 2, model=model, limit=5),
+                             second.query("Donald Trump", 2, model=model, limit=5))
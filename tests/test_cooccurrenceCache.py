@@ -0,0 +1,42 @@
+from unittest import TestCase
+
+
+class TestCooccurrenceCache(TestCase):
+    def test_lru_eviction(self):
+        from CooccurrenceCache import CooccurrenceCache
+        from Cooccurrence import Cooccurrence
+        from PostgresConnector import PostgresConnector
+        # the in-memory tier does not need any database access.
+        cache = CooccurrenceCache(Cooccurrence(PostgresConnector(port=5436), log_file="test.log"), max_size=2,
+                                  create_tables=False)
+        cache.put_memory((1, 2, "explicit", False), [("a", 3)])
+        cache.put_memory((2, 2, "explicit", False), [("b", 2)])
+        self.assertEqual(cache.get_memory((1, 2, "explicit", False)), [("a", 3)])
+        cache.put_memory((3, 2, "explicit", False), [("c", 1)])
+        # the second key was used least recently.
+        self.assertIsNone(cache.get_memory((2, 2, "explicit", False)))
+        cache.invalidate([1])
+        self.assertEqual(len(cache), 1)
+
+    def test_ttl(self):
+        import time
+        from CooccurrenceCache import CooccurrenceCache
+        from Cooccurrence import Cooccurrence
+        from PostgresConnector import PostgresConnector
+        cache = CooccurrenceCache(Cooccurrence(PostgresConnector(port=5436), log_file="test.log"), ttl=0.05,
+                                  create_tables=False)
+        cache.put_memory((1, 2, "explicit", False), [("a", 3)])
+        self.assertEqual(cache.get_memory((1, 2, "explicit", False)), [("a", 3)])
+        time.sleep(0.1)
+        self.assertIsNone(cache.get_memory((1, 2, "explicit", False)))
+        self.assertEqual(len(cache), 0)
+
+    def test_query(self):
+        from CooccurrenceCache import CooccurrenceCache
+        from Cooccurrence import Cooccurrence
+        from PostgresConnector import PostgresConnector
+        cache = CooccurrenceCache(Cooccurrence(PostgresConnector(port=5436), log_file="test.log"), persistent=True)
+        first = cache.query("London", 2, model="explicit", entities_only=True)
+        second = cache.query("London", 2, model="explicit", entities_only=True)
+        self.assertEqual(first, second)
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
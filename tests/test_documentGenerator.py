@@ -19,3 +19,49 @@ class TestDocumentGenerator(TestCase):
         assert dg.data
 
 
+
+    def test_stream_rollback(self):
+        import json
+        import os
+        import tempfile
+        from collections import OrderedDict
+        from DocumentGenerator import DocumentGenerator
+        from DocumentSource import DocumentSource, LocalDocumentSource
+        from PostgresConnector import PostgresConnector
+
+        class FailingSource(DocumentSource):
+            # fails after the first batch has been handed over.
+            def find(self, collection, **kwargs):
+                yield {"_id": 1, "title": "a"}
+                yield {"_id": 2, "title": "b"}
+                raise RuntimeError("Lost connection to the document source!")
+
+        pc = PostgresConnector(port=5436)
+        with pc as open_pc:
+            open_pc.cursor.execute("DROP TABLE IF EXISTS test_stream_documents")
+            open_pc.cursor.execute("CREATE TABLE test_stream_documents (document_id integer PRIMARY KEY, "
+                                   "title text NOT NULL)")
+        fields = OrderedDict({"_id": "document_id", "title": "title"})
+        try:
+            with tempfile.TemporaryDirectory() as path:
+                with open(os.path.join(path, "articles.jsonl"), "w") as f:
+                    # the fourth document violates the NOT NULL constraint, so the second batch fails.
+                    for doc_id, title in [(1, "a"), (2, "b"), (3, "c"), (4, None), (5, "e")]:
+                        f.write(json.dumps({"_id": doc_id, "title": title}) + "\n")
+
+                dg = DocumentGenerator(fields=fields, document_table_name="test_stream_documents", batch_size=2,
+                                       source=LocalDocumentSource(path), port=5436, log_file="test.log")
+                self.assertEqual(dg.stream(), 0)
+
+            dg = DocumentGenerator(fields=fields, document_table_name="test_stream_documents", batch_size=2,
+                                   source=FailingSource(), port=5436, log_file="test.log")
+            with self.assertRaises(RuntimeError):
+                dg.stream()
+
+            # neither the first batch of the failed insertion, nor the one before the failed retrieval is kept.
+            with pc as open_pc:
+                open_pc.cursor.execute("SELECT COUNT(*) FROM test_stream_documents")
+                self.assertEqual(open_pc.cursor.fetchone()[0], 0)
+        finally:
+            with pc as open_pc:
+                open_pc.cursor.execute("DROP TABLE test_stream_documents")
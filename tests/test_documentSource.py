@@ -0,0 +1,34 @@
+from unittest import TestCase
+
+import json
+import os
+import tempfile
+
+
+class TestLocalDocumentSource(TestCase):
+    def test_find_jsonl(self):
+        from DocumentSource import LocalDocumentSource
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, "sentences.jsonl"), "w") as f:
+                for doc_id, sen_id in [(1, 0), (1, 1), (2, 0), (3, 0)]:
+                    f.write(json.dumps({"_id": {"$oid": "abc"}, "doc_id": doc_id, "sen_id": sen_id,
+                                        "content": "Sentence {}.".format(sen_id)}) + "\n")
+
+            with LocalDocumentSource(path) as source:
+                result = list(source.find("sentences", doc_ids=[1, 3], fields=["doc_id", "sen_id"],
+                                          sort=["doc_id", "sen_id"]))
+                self.assertEqual(result, [{"doc_id": 1, "sen_id": 0}, {"doc_id": 1, "sen_id": 1},
+                                          {"doc_id": 3, "sen_id": 0}])
+
+                result = list(source.find("sentences", fields=["sen_id", "doc_id"], greater_than=("doc_id", 1),
+                                          limit=1))
+                self.assertEqual(list(result[0].items()), [("sen_id", 0), ("doc_id", 2)])
+
+                with self.assertRaises(ValueError):
+                    list(source.find("sentences", sort=["sen_id"]))
+
+    def test_extended_json(self):
+        import datetime
+        from DocumentSource import decode_extended_json
+        self.assertEqual(decode_extended_json({"$date": "2016-07-09T10:00:00Z"}), datetime.datetime(2016, 7, 9, 10))
+        self.assertEqual(decode_extended_json({"$date": {"$numberLong": "0"}}), datetime.datetime(1970, 1, 1))
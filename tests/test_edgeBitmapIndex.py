@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+
+class TestEdgeBitmapIndex(TestCase):
+    @staticmethod
+    def get_csr():
+        from HypergraphCSR import HypergraphCSR
+        texts = {0: "London", 1: "Paris", 2: "Berlin", 3: "Rome"}
+        # edge 8 contains Paris at two positions.
+        edges = [(2, 0), (2, 1), (5, 0), (5, 1), (5, 2), (8, 1), (8, 1), (8, 3), (9, 0), (9, 3)]
+        return HypergraphCSR([el[0] for el in edges], [el[1] for el in edges], texts,
+                             {0: True, 1: True, 2: False, 3: True})
+
+    def test_set_operations(self):
+        from EdgeBitmapIndex import EdgeBitmapIndex, bitmap
+        index = EdgeBitmapIndex.from_csr(self.get_csr())
+        self.assertEqual(list(index.edges("London")), [2, 5, 9])
+        self.assertEqual(list(index.all_of(["London", "Paris"])), [2, 5])
+        self.assertEqual(list(index.any_of(["Berlin", "Rome"])), [5, 8, 9])
+        self.assertEqual(index.count(["London", "Paris"], restrict=bitmap([5, 8])), 1)
+        self.assertEqual(len(index.edges("Madrid")), 0)
+
+    def test_cooccurrence(self):
+        from EdgeBitmapIndex import EdgeBitmapIndex, bitmap
+        csr = self.get_csr()
+        index = EdgeBitmapIndex.from_csr(csr)
+        for term in ["London", "Paris", "Rome"]:
+            self.assertEqual(index.cooccurrence(term), csr.query(term))
+            self.assertEqual(index.cooccurrence(term, entities_only=True), csr.query(term, entities_only=True))
+        self.assertEqual(index.cooccurrence(["London", "Paris"]), [("Berlin", 1)])
+        self.assertEqual(index.cooccurrence("Paris", restrict=bitmap([8])), [("Rome", 1)])
+
+    def test_save(self):
+        import tempfile
+        from EdgeBitmapIndex import EdgeBitmapIndex
+        csr = self.get_csr()
+        with tempfile.TemporaryDirectory() as path:
+            EdgeBitmapIndex.from_csr(csr).save(path)
+            index = EdgeBitmapIndex.load(path, csr)
+            self.assertEqual(list(index.edges(3)), [8, 9])
+            self.assertEqual(index.cooccurrence("Paris"), csr.query("Paris"))
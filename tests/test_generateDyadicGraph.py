@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+
+class TestGenerateDyadicGraph(TestCase):
+    def test_expand_cliques(self):
+        import numpy as np
+        from GenerateDyadicGraph import expand_cliques
+        # edge 2 contains term 5 twice, edge 3 only a single term.
+        hyperedges = np.array([[1, 4], [1, 2], [1, 9], [2, 5], [2, 7], [2, 5], [3, 1], [4, 8], [4, 6]], dtype=np.int32)
+        edges, sources, targets = expand_cliques(hyperedges, symmetric=False)
+        result = sorted(zip(edges.tolist(), sources.tolist(), targets.tolist()))
+        self.assertEqual(result, [(1, 2, 4), (1, 2, 9), (1, 4, 9), (2, 5, 7), (4, 6, 8)])
+
+        edges, sources, targets = expand_cliques(hyperedges)
+        self.assertEqual(len(edges), 10)
+        self.assertEqual(sorted(zip(sources.tolist(), targets.tolist())),
+                         sorted([(s, t) for _, s, t in result] + [(t, s) for _, s, t in result]))
+
+    def test_split_batches(self):
+        import numpy as np
+        from GenerateDyadicGraph import split_batches
+        hyperedges = np.array([[1, 1], [1, 2], [2, 1], [2, 2], [2, 3], [3, 1]], dtype=np.int32)
+        batches = list(split_batches(hyperedges, batch_size=3))
+        # the second hyperedge must not be split up.
+        self.assertEqual([batch[:, 0].tolist() for batch in batches], [[1, 1, 2, 2, 2], [3]])
+
+    def test_file_output(self):
+        import logging
+        import os
+        import tempfile
+        import numpy as np
+        from GenerateDyadicGraph import generate_dyadic_edges
+        hyperedges = np.array([[1, 4], [1, 2], [1, 9], [2, 5], [2, 7]], dtype=np.int32)
+        with tempfile.TemporaryDirectory() as path:
+            fn = os.path.join(path, "edges.bin")
+            self.assertEqual(generate_dyadic_edges(hyperedges, None, fn=fn, logger=logging.getLogger()), 4)
+            # only one direction per pair.
+            edges = np.fromfile(fn, dtype=np.int32).reshape(-1, 2)
+            self.assertEqual(sorted(map(tuple, edges.tolist())), [(2, 4), (2, 9), (4, 9), (5, 7)])
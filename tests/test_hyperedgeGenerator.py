@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+
+class TestHyperedgeGenerator(TestCase):
+    def test_iterate_documents(self):
+        from HyperedgeGenerator import iterate_documents
+        sentences = [(1, 0), (1, 1), (1, 2), (3, 0)]
+        occurrences = [(1, 0, 5), (1, 0, 7), (1, 2, 5), (2, 0, 9), (3, 0, 8)]
+
+        documents = list(iterate_documents(sentences, occurrences))
+        self.assertEqual(documents, [(1, [0, 1, 2], {0: [5, 7], 2: [5]}),
+                                     (3, [0], {0: [8]})])
+
+    def test_sliding_window(self):
+        from HyperedgeGenerator import sliding_window
+        sentence_ids = [0, 1, 2, 3, 5, 6]
+        terms = {0: [1], 1: [2, 3], 3: [4], 6: [1]}
+
+        for window_size in [0, 1, 2, 5]:
+            for center, window in sliding_window(sentence_ids, terms, window_size):
+                # compare against the per-sentence query of the naive approach
+                expected = [(s, terms.get(s, [])) for s in sentence_ids
+                            if center - window_size <= s <= center + window_size]
+                self.assertEqual(window, expected)
@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+
+class TestHypergraphCSR(TestCase):
+    def test_query(self):
+        import numpy as np
+        from collections import Counter
+        from HypergraphCSR import HypergraphCSR
+        rng = np.random.RandomState(42)
+        edge_ids = np.repeat(np.arange(0, 400, 2), rng.randint(1, 8, size=200))
+        term_ids = rng.randint(0, 30, size=len(edge_ids))
+        texts = {term_id: "term {}".format(chr(ord("a") + (7 * term_id) % 30)) for term_id in range(30)}
+        entities = {term_id: term_id % 3 == 0 for term_id in range(30)}
+        csr = HypergraphCSR(edge_ids, term_ids, texts, entities)
+
+        for term_id in [0, 5, 17]:
+            # naive version of the explicit model query
+            edges = set(edge_ids[term_ids == term_id])
+            counts = Counter(t for e, t in zip(edge_ids, term_ids) if e in edges and t != term_id)
+            expected = sorted([(texts[t], c) for t, c in counts.items()], key=lambda el: (-el[1], el[0]))
+            self.assertEqual(csr.query(texts[term_id]), expected)
+            self.assertEqual(csr.query(texts[term_id], limit=5), expected[:5])
+            self.assertEqual(csr.query(texts[term_id], entities_only=True),
+                             [el for el in expected if el[0] in {texts[t] for t in range(0, 30, 3)}])
+
+    def test_unknown_term(self):
+        from HypergraphCSR import HypergraphCSR
+        csr = HypergraphCSR([1, 1], [0, 1], {0: "London", 1: "Paris"})
+        self.assertEqual(csr.query("Berlin"), [])
+        self.assertEqual(csr.query("London"), [("Paris", 1)])
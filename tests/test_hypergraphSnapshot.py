@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+
+class TestHypergraphSnapshot(TestCase):
+    def test_version(self):
+        import json
+        import os
+        import tempfile
+        from HypergraphSnapshot import Snapshot
+        with tempfile.TemporaryDirectory() as path:
+            with open(os.path.join(path, "header.json"), "w") as f:
+                json.dump({"version": Snapshot.version + 1, "tables": {}}, f)
+            with self.assertRaises(ValueError):
+                Snapshot(path)
+
+    def test_hyperedges(self):
+        import json
+        import os
+        import tempfile
+        import numpy as np
+        from GenerateDyadicGraph import load_hyperedges
+        from HypergraphSnapshot import Snapshot
+        with tempfile.TemporaryDirectory() as path:
+            os.makedirs(os.path.join(path, "entity_2_hyperedges"))
+            np.save(os.path.join(path, "entity_2_hyperedges", "edge_id.npy"), np.array([1, 1, 2], dtype=np.int32))
+            np.save(os.path.join(path, "entity_2_hyperedges", "term_id.npy"), np.array([3, 4, 5], dtype=np.int32))
+            with open(os.path.join(path, "header.json"), "w") as f:
+                json.dump({"version": Snapshot.version, "tables": {"entity_2_hyperedges": {
+                    "columns": ["edge_id", "term_id"], "order_by": ["edge_id", "term_id"], "rows": 3}}}, f)
+
+            snapshot = Snapshot(path)
+            edge_ids, term_ids = snapshot.hyperedges("entity_2_hyperedges")
+            # the columns are not copied out of the files.
+            self.assertIsInstance(edge_ids, np.memmap)
+            self.assertEqual(load_hyperedges(None, "entity_2_hyperedges", snapshot=snapshot).tolist(),
+                             [[1, 3], [1, 4], [2, 5]])
+
+    def test_create_snapshot(self):
+        import tempfile
+        import numpy as np
+        from GenerateDyadicGraph import load_hyperedges
+        from HypergraphSnapshot import create_snapshot, Snapshot
+        from PostgresConnector import PostgresConnector
+        pc = PostgresConnector(port=5436)
+        with tempfile.TemporaryDirectory() as path:
+            create_snapshot(pc, path, prefixes=["entity_2"])
+            snapshot = Snapshot(path)
+            self.assertIn("entity_2_hyperedges", snapshot)
+            self.assertIn("term_occurrence", snapshot)
+
+            hyperedges = load_hyperedges(pc, "entity_2_hyperedges")
+            from_snapshot = load_hyperedges(pc, "entity_2_hyperedges", snapshot=snapshot)
+            self.assertEqual(len(hyperedges), len(from_snapshot))
+            np.testing.assert_array_equal(hyperedges[:, 0], from_snapshot[:, 0])
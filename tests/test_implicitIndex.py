@@ -0,0 +1,37 @@
+from unittest import TestCase
+
+
+class TestImplicitIndex(TestCase):
+    def test_query(self):
+        import numpy as np
+        from collections import Counter
+        from ImplicitIndex import ImplicitIndex
+        from TermDictionary import TermDictionary
+        rng = np.random.RandomState(42)
+        # one row per (document, sentence, term), as in the primary key of term_occurrence.
+        rows = sorted({(rng.randint(0, 5), rng.randint(0, 20), rng.randint(0, 15)) for _ in range(400)})
+        terms = TermDictionary()
+        terms.add_all(["term {:02d}".format(i) for i in range(15)], {"term {:02d}".format(i): i % 2 == 0
+                                                                       for i in range(15)})
+        index = ImplicitIndex(*zip(*rows), terms=terms)
+
+        for term_id in [0, 3, 10]:
+            for window in [0, 1, 3]:
+                # naive version of the implicit model query
+                counts = Counter(t for d, s, _ in [r for r in rows if r[2] == term_id]
+                                 for d2, s2, t in rows if d2 == d and s - window <= s2 <= s + window and t != term_id)
+                expected = sorted([(terms.text(t), c) for t, c in counts.items()], key=lambda el: (-el[1], el[0]))
+                self.assertEqual(index.query(terms.text(term_id), window), expected)
+                self.assertEqual(index.query(terms.text(term_id), window, limit=3), expected[:3])
+                self.assertEqual(index.query(terms.text(term_id), window, entities_only=True),
+                                 [el for el in expected if terms.entity(terms[el[0]])])
+
+    def test_document_boundaries(self):
+        from ImplicitIndex import ImplicitIndex
+        from TermDictionary import TermDictionary
+        terms = TermDictionary()
+        terms.add_all(["London", "Paris"])
+        # sentence 0 of document 2 must not reach into the last sentence of document 1.
+        index = ImplicitIndex([1, 2], [5, 0], [terms["Paris"], terms["London"]], terms=terms)
+        self.assertEqual(index.query("London", 10), [])
+        self.assertEqual(index.query("Berlin", 10), [])
@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+
+class TestOccurrenceBuffer(TestCase):
+    def test_remap_and_unique(self):
+        from OccurrenceBuffer import OccurrenceBuffer
+        buffer = OccurrenceBuffer()
+        for row in [(2, 0, 1), (1, 3, 0), (1, 3, 2), (2, 0, 1), (1, 0, 0)]:
+            buffer.append(*row)
+
+        # provisional IDs 0 and 2 are mapped to the same final ID.
+        buffer.remap([5, 7, 5])
+        buffer.unique()
+        self.assertEqual(list(buffer.rows()), [(1, 0, 5), (1, 3, 5), (2, 0, 7)])
+
+    def test_binary_columns(self):
+        from OccurrenceBuffer import OccurrenceBuffer
+        from utils import format_copy_binary, format_copy_binary_columns
+        buffer = OccurrenceBuffer()
+        for row in [(1, 0, 3), (1, 2, -4)]:
+            buffer.append(*row)
+
+        self.assertEqual(format_copy_binary_columns(buffer.columns()).tobytes(),
+                         b"".join(format_copy_binary(row) for row in buffer.rows()))
@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+
+class TestPostgresConnector(TestCase):
+    def test_invalid_commit_mode(self):
+        from PostgresConnector import PostgresConnector
+        with self.assertRaises(ValueError):
+            PostgresConnector(commit="sometimes")
+
+    def test_session(self):
+        from PostgresConnector import PostgresConnector
+        pc = PostgresConnector(port=5435, commit="on_success")
+        session = pc.session(commit="never")
+        self.assertIsNot(session, pc)
+        self.assertEqual((session.port, session.pooled, session.commit_mode), (5435, True, "never"))
+        self.assertEqual(pc.session().commit_mode, "on_success")
+
+    def test_pooled_connection_reuse(self):
+        from PostgresConnector import PostgresConnector
+        pc = PostgresConnector(port=5435)
+        with pc as open_pc:
+            first = open_pc.connection
+            # nested contexts share the connection of the outermost one.
+            with pc as nested_pc:
+                self.assertIs(nested_pc.connection, first)
+        with pc.session() as open_pc:
+            self.assertIs(open_pc.connection, first)
+
+    def test_stream_blocks(self):
+        from PostgresConnector import PostgresConnector
+        with PostgresConnector(port=5435) as open_pc:
+            blocks = list(open_pc.stream_blocks("SELECT generate_series(1, 5), 0", block_size=2))
+            self.assertEqual([len(block) for block in blocks], [2, 2, 1])
+            self.assertEqual(list(open_pc.stream("SELECT generate_series(1, 3)", itersize=2)), [(1,), (2,), (3,)])
+
+    def test_exhausted_pool(self):
+        from PostgresConnector import PostgresConnector, close_pools
+        # make sure the pool is created with the reduced size.
+        close_pools()
+        pc = PostgresConnector(port=5435, max_connections=2)
+        sessions = [pc.session() for _ in range(3)]
+        for session in sessions:
+            session.__enter__()
+        connections = [session.connection for session in sessions]
+        try:
+            # the third connector does not wait for the pool, but opens its own connection.
+            self.assertEqual([session.from_pool for session in sessions], [True, True, False])
+            for session in sessions:
+                session.cursor.execute("SELECT 1")
+                self.assertEqual(session.cursor.fetchone(), (1,))
+        finally:
+            for session in sessions:
+                session.__exit__(None, None, None)
+
+        # pooled connections stay open for the next connector, the additional one is closed.
+        self.assertEqual([bool(connection.closed) for connection in connections], [False, False, True])
+        close_pools()
@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+
+class TestPostingList(TestCase):
+    def test_varint(self):
+        import numpy as np
+        from PostingList import encode_varint, decode_varint
+        values = np.array([0, 1, 127, 128, 300, 2**32 + 5, 2**63 - 1], dtype=np.uint64)
+        data, offsets = encode_varint(values)
+        self.assertEqual(offsets.tolist(), [0, 1, 2, 3, 5, 7, 12])
+        np.testing.assert_array_equal(decode_varint(data), values)
+
+    def test_encode(self):
+        import numpy as np
+        from PostingList import PostingList
+        rng = np.random.RandomState(42)
+        keys = np.unique((rng.randint(0, 1000, size=1000).astype(np.int64) << 32) | rng.randint(0, 50, size=1000))
+        for block_size in [1, 7, 128, 2000]:
+            posting_list = PostingList.encode(keys, block_size)
+            np.testing.assert_array_equal(posting_list.decode(), keys)
+            np.testing.assert_array_equal(PostingList.from_bytes(posting_list.to_bytes()).decode(), keys)
+            np.testing.assert_array_equal(posting_list.between(keys[100], keys[200]), keys[100:201])
+            np.testing.assert_array_equal(posting_list.document(keys[0] >> 32), keys[keys >> 32 == keys[0] >> 32]
+                                          & 0xFFFFFFFF)
+        self.assertLess(PostingList.encode(keys).nbytes, keys.nbytes)
+
+    def test_intersect(self):
+        import numpy as np
+        from PostingList import PostingList, intersect
+        rng = np.random.RandomState(42)
+        lists = [np.unique(rng.randint(0, 10**6, size=size)) for size in [50000, 3000, 20000]]
+        expected = np.intersect1d(np.intersect1d(lists[0], lists[1]), lists[2])
+        np.testing.assert_array_equal(intersect([PostingList.encode(keys, 64) for keys in lists]), expected)
+        np.testing.assert_array_equal(PostingList.encode(lists[0]).intersect(PostingList.encode(lists[1])),
+                                      np.intersect1d(lists[0], lists[1]))
+
+    def test_store(self):
+        import tempfile
+        import numpy as np
+        from ImplicitIndex import pack_sentences
+        from PostingList import PostingStore
+        rng = np.random.RandomState(42)
+        rows = rng.randint(0, 40, size=(5000, 3))
+        store = PostingStore.build(rows[:, 0], rows[:, 1], rows[:, 2], block_size=16)
+
+        with tempfile.TemporaryDirectory() as path:
+            store.save(path)
+            loaded = PostingStore.load(path)
+            for term_id in range(42):
+                expected = np.unique(pack_sentences(rows[rows[:, 2] == term_id, 0], rows[rows[:, 2] == term_id, 1]))
+                np.testing.assert_array_equal(loaded[term_id].decode(), expected)
+                self.assertEqual(len(loaded[term_id]), len(expected))
@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+import os
+import tempfile
+
+
+class TestReduceDyadicGraph(TestCase):
+    def test_reduce_external(self):
+        from collections import Counter
+        from ReduceDyadicGraph import reduce_external
+        edges = [(3, 1), (1, 2), (3, 1), (2147483647, 0), (1, 2), (1, 2), (0, 5)]
+        with tempfile.TemporaryDirectory() as folder:
+            in_fn = os.path.join(folder, "edges.csv")
+            out_fn = os.path.join(folder, "reduced.csv")
+            with open(in_fn, "w") as f:
+                f.writelines("{} {}\n".format(*edge) for edge in edges)
+
+            for n_process in [1, 2]:
+                open(out_fn, "w").close()
+                # small chunks, so that several of them have to be merged.
+                num_edges = reduce_external(in_fn, out_fn, chunk_size=2, block_size=2, n_process=n_process)
+                with open(out_fn) as f:
+                    result = [tuple(int(el) for el in line.split("\t")) for line in f]
+
+                expected = sorted((source, target, weight) for (source, target), weight in Counter(edges).items())
+                self.assertEqual(result, expected)
+                self.assertEqual(num_edges, len(expected))
+
+    def test_merge_chunks(self):
+        import numpy as np
+        from ReduceDyadicGraph import merge_chunks, sort_chunk
+        rng = np.random.RandomState(0)
+        chunks = [rng.randint(0, 50, size=size).astype(np.int64) for size in [30, 7, 1, 45]]
+        with tempfile.TemporaryDirectory() as folder:
+            paths = [sort_chunk(keys, os.path.join(folder, "chunk_{}".format(i))) for i, keys in enumerate(chunks)]
+            for block_size in [1, 3, 100]:
+                blocks = list(merge_chunks(paths, block_size))
+                keys = np.concatenate([block[0] for block in blocks])
+                weights = np.concatenate([block[1] for block in blocks])
+
+                expected_keys, expected_weights = np.unique(np.concatenate(chunks), return_counts=True)
+                self.assertEqual(keys.tolist(), expected_keys.tolist())
+                self.assertEqual(weights.tolist(), expected_weights.tolist())
+
+    def test_empty_input(self):
+        from ReduceDyadicGraph import reduce_external
+        with tempfile.TemporaryDirectory() as folder:
+            out_fn = os.path.join(folder, "reduced.csv")
+            for name in ["edges.csv", "edges.bin"]:
+                in_fn = os.path.join(folder, name)
+                open(in_fn, "w").close()
+                open(out_fn, "w").close()
+                self.assertEqual(reduce_external(in_fn, out_fn), 0)
+                self.assertEqual(os.path.getsize(out_fn), 0)
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+import shutil
+import tempfile
+
+
+class TestTermDictionary(TestCase):
+    def test_add_and_get(self):
+        from TermDictionary import TermDictionary
+        td = TermDictionary()
+        td.add_all(["Obama", "said", "Ünicode", "Obama", "and"], is_entity={"Obama": True})
+
+        # new terms are numbered in sorted order
+        self.assertEqual([td.text(i) for i in range(len(td))], ["Obama", "and", "said", "Ünicode"])
+        self.assertTrue(td.entity(td["Obama"]))
+        self.assertIsNone(td.get("Trump"))
+
+        td.compact()
+        self.assertEqual(td["said"], 2)
+        self.assertEqual(td.add("Trump"), 4)
+        self.assertEqual(td.add("said"), 2)
+        self.assertEqual(list(td.rows(start=4)), [(4, "Trump", False)])
+
+    def test_save_and_load(self):
+        from TermDictionary import TermDictionary
+        td = TermDictionary()
+        td.add_all(["b", "a", "d"])
+        td.compact()
+        td.add_all(["c", "e"])
+
+        path = tempfile.mkdtemp()
+        try:
+            td.save(path)
+            loaded = TermDictionary.load(path)
+            self.assertEqual(len(loaded), 5)
+            for text in ["a", "b", "c", "d", "e"]:
+                self.assertEqual(loaded[text], td[text])
+            self.assertEqual(loaded.add("aa"), 5)
+        finally:
+            shutil.rmtree(path)
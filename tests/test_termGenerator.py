@@ -19,3 +19,20 @@ class TestTermGenerator(TestCase):
         from TermGenerator import TermGenerator
         tg = TermGenerator(num_distinct_documents=1, log_file="test.log", custom_stopwords=["Obama"])
         tg.parse()
+
+    def test_tokenizer_parity(self):
+        from TermGenerator import TermGenerator
+        tg = TermGenerator(num_distinct_documents=1, log_file="test.log", tokenizer_only=True)
+        self.assertTrue(tg.check_tokenizer_parity(["Donald Trump met Boris Johnson in the U.S. on 2016-07-09.",
+                                                   "\"It's a hot-dog,\" he said (again) — didn't he?"]))
+
+    def test_align_entities(self):
+        from TermGenerator import align_entities
+        sentences = [{"doc_id": 1, "sen_id": 0}, {"doc_id": 1, "sen_id": 1}, {"doc_id": 3, "sen_id": 0}]
+        entities = [{"doc_id": 0, "sen_id": 0, "start_sen": 0},
+                    {"doc_id": 1, "sen_id": 1, "start_sen": 0},
+                    {"doc_id": 1, "sen_id": 1, "start_sen": 5},
+                    {"doc_id": 2, "sen_id": 4, "start_sen": 0},
+                    {"doc_id": 3, "sen_id": 0, "start_sen": 2}]
+        aligned = list(align_entities(sentences, iter(entities)))
+        self.assertEqual(aligned, [[], entities[1:3], entities[4:]])
@@ -0,0 +1,12 @@
+from unittest import TestCase
+
+
+class TestUtils(TestCase):
+    def test_binary_integers(self):
+        import numpy as np
+        from utils import format_copy_binary
+        self.assertEqual(format_copy_binary((np.int64(7), np.int32(-2), 2**31 - 1)),
+                         format_copy_binary((7, -2, 2147483647)))
+        for value in [2**31, -2**31 - 1, np.int64(2**40)]:
+            with self.assertRaises(ValueError):
+                format_copy_binary((1, value))
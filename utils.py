@@ -2,12 +2,27 @@
 Contains functions that are shared between multiple scripts, like the logger handling or small helper functions.
 """
 
+import io
 import logging
+import numbers
+import struct
+import datetime
 import itertools as itt
+import numpy as np
 
 from psycopg2 import ProgrammingError, IntegrityError
+from psycopg2.errors import UniqueViolation
 from psycopg2.extras import execute_values
 
+# escape sequences of the COPY text format, see https://www.postgresql.org/docs/current/sql-copy.html
+COPY_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+# signature, flags field and header extension length of the COPY binary format
+COPY_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_BINARY_TRAILER = struct.pack("!h", -1)
+# value range of the integer columns written by format_copy_binary()
+INT4_MIN, INT4_MAX = -2**31, 2**31 - 1
+POSTGRES_EPOCH = datetime.datetime(2000, 1, 1)
+
 
 def take(iterable, n):
     """
@@ -70,13 +85,201 @@ def check_table_existence(logger, connector, table_name):
     return connector.cursor.fetchone()[0]
 
 
-def insert_into_table(open_pc, table_name, table_structure, values, logger):
+def format_copy_text(row):
+    """
+    Serializes a single row into a line of the COPY text format.
+    :param row: (tuple) Values of the row, in the order of the table structure.
+    :return: (str) Tab-separated line, including the trailing newline.
+    """
+    fields = []
+    for value in row:
+        if value is None:
+            fields.append("\\N")
+        elif isinstance(value, bool):
+            fields.append("t" if value else "f")
+        elif isinstance(value, (datetime.date, datetime.datetime)):
+            fields.append(value.isoformat())
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            # bytea in hex format, with the backslash escaped for COPY.
+            fields.append("\\\\x" + bytes(value).hex())
+        else:
+            fields.append(str(value).translate(COPY_TEXT_ESCAPES))
+
+    return "\t".join(fields) + "\n"
+
+
+def format_copy_binary(row):
+    """
+    Serializes a single row into the COPY binary format. Integers are written as 4 byte integers, so this is only
+    suitable for tables with integer (not bigint) columns, like the term occurrence or hyper edge tables. Integers
+    outside of that range raise a ValueError.
+    :param row: (tuple) Values of the row, in the order of the table structure.
+    :return: (bytes) Binary tuple, including the field count.
+    """
+    fields = [struct.pack("!h", len(row))]
+    for value in row:
+        if value is None:
+            fields.append(struct.pack("!i", -1))
+        elif isinstance(value, (bool, np.bool_)):
+            fields.append(struct.pack("!i?", 1, value))
+        elif isinstance(value, numbers.Integral):
+            # also covers NumPy integers, which would otherwise end up in the text branch.
+            if not INT4_MIN <= value <= INT4_MAX:
+                raise ValueError("Integer {} does not fit into a 4 byte integer column!".format(value))
+            fields.append(struct.pack("!ii", 4, value))
+        elif isinstance(value, numbers.Real):
+            fields.append(struct.pack("!id", 8, value))
+        elif isinstance(value, datetime.datetime):
+            # timestamps are stored as microseconds since the Postgres epoch.
+            delta = value.replace(tzinfo=None) - POSTGRES_EPOCH
+            fields.append(struct.pack("!iq", 8, (delta.days * 86400 + delta.seconds) * 10**6 + delta.microseconds))
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            fields.append(struct.pack("!i", len(value)) + bytes(value))
+        else:
+            encoded = str(value).encode("utf-8")
+            fields.append(struct.pack("!i", len(encoded)) + encoded)
+
+    return b"".join(fields)
+
+
+def copy_into_table(open_pc, table_name, table_structure, values, logger, binary=False, page_size=100000):
+    """
+    Bulk loads values into a table via COPY ... FROM STDIN. Rows are serialized in pages of page_size into an
+    in-memory buffer, so arbitrarily large iterables can be loaded with bounded memory. Each page is guarded by a
+    savepoint; if it violates a unique constraint, only that page is re-inserted via execute_values, skipping the
+    conflicting rows.
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :param table_name: (str) Name of the table to insert into.
+    :param table_structure: (str) Comma-separated column names, in the order of the values.
+    :param values: (iterable) Tuples of values to be inserted. Can also be a generator.
+    :param logger: (logging.Logger) Logger to report to.
+    :param binary: (boolean) Whether to use the binary instead of the text format. See format_copy_binary().
+    :param page_size: (int) Number of rows per COPY statement.
+    :return: (int) 1 if all values were inserted (or skipped as duplicates), 0 otherwise.
+    """
+    if binary:
+        query = "COPY {} ({}) FROM STDIN WITH (FORMAT binary)".format(table_name, table_structure)
+    else:
+        query = "COPY {} ({}) FROM STDIN".format(table_name, table_structure)
+
+    rows = iter(values)
+    while True:
+        page = take(rows, page_size)
+        if not page:
+            break
+
+        if binary:
+            buffer = io.BytesIO(COPY_BINARY_HEADER + b"".join(format_copy_binary(row) for row in page)
+                                + COPY_BINARY_TRAILER)
+        else:
+            buffer = io.StringIO("".join(format_copy_text(row) for row in page))
+
+        if not copy_page(open_pc, table_name, table_structure, query, buffer, lambda: page, logger):
+            return 0
+
+    return 1
+
+
+def copy_page(open_pc, table_name, table_structure, query, buffer, get_rows, logger):
+    """
+    Runs a single COPY statement, guarded by a savepoint. See copy_into_table() for details.
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :param table_name: (str) Name of the table to insert into.
+    :param table_structure: (str) Comma-separated column names, in the order of the values.
+    :param query: (str) COPY statement to execute.
+    :param buffer: (file-like object) Serialized rows of the page.
+    :param get_rows: (function) Returns the rows of the page as tuples. Only called for the fallback insert.
+    :param logger: (logging.Logger) Logger to report to.
+    :return: (int) 1 if all values were inserted (or skipped as duplicates), 0 otherwise.
+    """
+    open_pc.cursor.execute("SAVEPOINT bulk_load")
     try:
-        execute_values(open_pc.cursor,
-                       "INSERT INTO {} ({}) VALUES %s".format(table_name, table_structure), values)
+        open_pc.cursor.copy_expert(query, buffer)
+
+    except UniqueViolation as err:
+        open_pc.cursor.execute("ROLLBACK TO SAVEPOINT bulk_load")
+        logger.warning("Values with previously inserted primary key detected, falling back to regular insert "
+                       "for this batch!\n {}".format(err))
+        try:
+            execute_values(open_pc.cursor,
+                           "INSERT INTO {} ({}) VALUES %s ON CONFLICT DO NOTHING".format(table_name, table_structure),
+                           get_rows())
+        except IntegrityError as err:
+            open_pc.cursor.execute("ROLLBACK TO SAVEPOINT bulk_load")
+            logger.error("Could not insert values into {}!\n {}".format(table_name, err))
+            return 0
 
     except IntegrityError as err:
-        logger.error("Values with previously inserted primary key detected!\n {}".format(err))
+        open_pc.cursor.execute("ROLLBACK TO SAVEPOINT bulk_load")
+        logger.error("Could not insert values into {}!\n {}".format(table_name, err))
         return 0
 
-    return 1
\ No newline at end of file
+    open_pc.cursor.execute("RELEASE SAVEPOINT bulk_load")
+    return 1
+
+
+def format_copy_binary_columns(columns):
+    """
+    Serializes integer columns into the tuples of the COPY binary format, without creating any Python objects per row.
+    Vectorized equivalent of format_copy_binary() for tables with only (non-null) integer columns.
+    :param columns: (list of np.array) Columns of equal length, in the order of the table structure.
+    :return: (np.array) Structured array, whose raw bytes are the serialized tuples.
+    """
+    fields = [("count", ">i2")]
+    for i in range(len(columns)):
+        fields += [("length_{}".format(i), ">i4"), ("value_{}".format(i), ">i4")]
+
+    tuples = np.empty(len(columns[0]) if columns else 0, dtype=np.dtype(fields))
+    tuples["count"] = len(columns)
+    for i, column in enumerate(columns):
+        tuples["length_{}".format(i)] = 4
+        tuples["value_{}".format(i)] = column
+
+    return tuples
+
+
+def copy_columns_into_table(open_pc, table_name, table_structure, columns, logger, page_size=1000000):
+    """
+    Bulk loads integer columns into a table via binary COPY. Same as copy_into_table(), but takes the values as
+    columns (e.g. NumPy arrays, or array.array objects), which are serialized in one vectorized step per page.
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :param table_name: (str) Name of the table to insert into.
+    :param table_structure: (str) Comma-separated column names, in the order of the columns.
+    :param columns: (list) Integer columns of equal length.
+    :param logger: (logging.Logger) Logger to report to.
+    :param page_size: (int) Number of rows per COPY statement.
+    :return: (int) 1 if all values were inserted (or skipped as duplicates), 0 otherwise.
+    """
+    query = "COPY {} ({}) FROM STDIN WITH (FORMAT binary)".format(table_name, table_structure)
+    # np.asarray() does not copy arrays that support the buffer protocol.
+    columns = [np.asarray(column) for column in columns]
+    num_rows = len(columns[0]) if columns else 0
+
+    for start in range(0, num_rows, page_size):
+        page = [column[start:start + page_size] for column in columns]
+
+        buffer = io.BytesIO()
+        buffer.write(COPY_BINARY_HEADER)
+        buffer.write(format_copy_binary_columns(page).data)
+        buffer.write(COPY_BINARY_TRAILER)
+        buffer.seek(0)
+
+        if not copy_page(open_pc, table_name, table_structure, query, buffer,
+                         lambda: list(zip(*[column.tolist() for column in page])), logger):
+            return 0
+
+    return 1
+
+
+def insert_into_table(open_pc, table_name, table_structure, values, logger, binary=False):
+    """
+    Inserts values into a table. Goes through COPY, see copy_into_table() for details.
+    :param open_pc: (PostgresConnector) Connector with an open connection.
+    :param table_name: (str) Name of the table to insert into.
+    :param table_structure: (str) Comma-separated column names, in the order of the values.
+    :param values: (iterable) Tuples of values to be inserted.
+    :param logger: (logging.Logger) Logger to report to.
+    :param binary: (boolean) Whether to use the COPY binary format. Only for integer-valued tables.
+    :return: (int) 1 if successful, 0 otherwise.
+    """
+    return copy_into_table(open_pc, table_name, table_structure, values, logger, binary=binary)
\ No newline at end of file